@@ -1,23 +1,48 @@
+import asyncio
+import contextvars
+import functools
+import gzip
+import logging
 import os
-import sqlite3
 import json
-import openai
-from fastapi import FastAPI, HTTPException, Body
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
+import kpi_engine
+import metrics
 import nl2sql_app
+import result_stream
+import sql_repair
+from db_pool import get_pool, require_database
+from engines import router_from_env
+from index_advisor import IndexAdvisor, apply_default_indexes
+from llm_cache import cache_from_env
+from log_config import configure_logging
+from metrics import timed
+from query_guard import QueryRejected, guard_from_env
+from result_cache import result_cache_from_env
+from shards import shard_paths, shards_from_env
+from schema_registry import SchemaRegistry
+from value_index import hint_text, value_index_from_env
 from field_mapping import (
     to_tech,
-    to_friendly,
+    friendly_frame,
     TECH_TO_FRIENDLY,
     friendly_name,
-    apply_friendly_labels,
 )
 
+logger = logging.getLogger("api_server")
+
 
 def debug_check_fields(rows, x=None, y=None):
-    """Print debug info about presence of expected fields in the first rows.
+    """Log debug info about presence of expected fields in the first rows.
 
     ``x`` and ``y`` values coming from the LLM can sometimes be lists if the
     model suggests multiple columns for a single axis.  Older versions of this
@@ -42,121 +67,1009 @@ def debug_check_fields(rows, x=None, y=None):
                     (k for k in row.keys() if k.lower() == field_name.lower()), None
                 )
                 if match:
-                    print(
-                        f"[DEBUG] Field name mismatch in row {idx}: expected '{field_name}', found '{match}'"
+                    logger.debug(
+                        "Field name mismatch in row %d: expected '%s', found '%s'", idx, field_name, match
                     )
                 else:
-                    print(f"[DEBUG] Missing field '{field_name}' in row {idx}: {row}")
+                    logger.debug("Missing field '%s' in row %d: %s", field_name, idx, row)
 
 
 load_dotenv()
+configure_logging()
 api_key = os.getenv("OPENAI_API_KEY")
 model = os.getenv("OPENAI_MODEL", "gpt-4-turbo")
 if not api_key:
     raise RuntimeError("Please set the OPENAI_API_KEY environment variable.")
-openai.api_key = api_key
+llm_cache = cache_from_env()
+
+# Dedicated pool for SQLite work so query execution never runs on the event
+# loop and does not compete with FastAPI's default threadpool.
+db_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_MAX_WORKERS", "8")), thread_name_prefix="sqlite"
+)
+# Value index refreshes run one at a time off the request path
+values_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="values")
+_values_refresh = None
+_values_lock = threading.Lock()
+
+# Time, step, row and plan cost limits applied to every generated statement
+query_guard = guard_from_env()
+
+# Server-side row limit for one streamed response and the signer for the
+# continuation tokens used to fetch the following pages.
+STREAM_PAGE_ROWS = int(os.getenv("STREAM_PAGE_ROWS", "10000"))
+stream_tokens = result_stream.ContinuationTokens()
+
+# Largest accepted batch and the number of its questions processed at once
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "100"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+
+# Identifier of the shared result block in version 2 responses
+MAIN_DATA_ID = "main"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+
+# Everything touching the database is created by ``startup`` rather than at
+# import time so workers spawn quickly; see ``lifespan``.
+STARTUP_PREWARM = os.getenv("STARTUP_PREWARM", "1").lower() not in {"0", "false", "no"}
+
+# Read-only connections are pooled per thread. Every thread of
+# ``db_executor`` keeps its own connection which avoids cross-thread
+# errors while keeping SQLite's page cache warm between requests.
+db_pool = None
+
+# Results of recent statements, dropped when the tables they read change
+result_cache = None
 
-app = FastAPI()
+# Shard databases queried as one when ``NL2SQL_SHARDS`` is set; ``db_pool``
+# then belongs to the first shard, which also provides the schema.
+shard_set = None
+
+# Routes aggregate-heavy statements to DuckDB when ``SQL_ENGINE`` is set
+engine_router = None
+
+# The schema is introspected on first use and re-read when
+# ``PRAGMA schema_version`` changes, checked at most every
+# ``SCHEMA_CHECK_INTERVAL`` seconds.
+schema_registry = SchemaRegistry(float(os.getenv("SCHEMA_CHECK_INTERVAL", "1")))
+
+# Only the tables relevant to a question are sent to the LLM when schema
+# retrieval is enabled; the full schema is used when nothing matches.
+SCHEMA_RETRIEVAL = os.getenv("SCHEMA_RETRIEVAL", "1").lower() not in {"0", "false", "no"}
+SCHEMA_TOP_K = int(os.getenv("SCHEMA_TOP_K", "5"))
+
+# Exact spellings of the values a question mentions are added to its prompt
+value_index = None
+
+# Generated SQL is compiled with ``EXPLAIN`` before it runs. Misspelt names
+# are repaired locally, anything else with at most one LLM repair request.
+SQL_REPAIR = os.getenv("SQL_REPAIR", "1").lower() not in {"0", "false", "no"}
+
+# LLM answers are streamed and their SQL runs as soon as it is complete
+LLM_STREAM = os.getenv("LLM_STREAM", "1").lower() not in {"0", "false", "no"}
+
+# The index advisor records the query plan of every generated statement so
+# missing indexes can be proposed from real traffic.
+index_advisor = None
+
+_started = False
+_startup_lock = threading.Lock()
+
+
+def startup():
+    """Open the database and run the configured startup tasks once.
+
+    Called from ``lifespan`` and, as a fallback when the application runs
+    without lifespan events, before the first database access.
+    """
+    global db_pool, result_cache, shard_set, engine_router, value_index, index_advisor, _started
+    if _started:
+        return
+    with _startup_lock:
+        if _started:
+            return
+        paths = shard_paths(os.getenv("NL2SQL_SHARDS", "")) or [nl2sql_app.DB_PATH]
+        # A wrong path must stop the server instead of answering "no such table"
+        for path in paths:
+            require_database(path)
+        # Optionally build the default foreign key and date indexes before serving.
+        if os.getenv("AUTO_INDEX", "0").lower() in {"1", "true", "yes"}:
+            created = sum(len(apply_default_indexes(path)) for path in paths)
+            logger.info("Created %d default indexes", created)
+        # Optionally bring the KPI summary tables up to date before loading
+        # the schema so they are part of the prompt schema.
+        if os.getenv("KPI_REFRESH_ON_STARTUP", "0").lower() in {"1", "true", "yes"}:
+            for path in paths:
+                kpi = kpi_engine.refresh_database(path)
+                logger.info("Refreshed KPI summaries of %s for %d months in %.2fs", path, kpi["months"], kpi["seconds"])
+        shard_set = shards_from_env()
+        db_pool = get_pool(paths[0])
+        # The result cache and DuckDB copy follow a single file, so both are off for shards
+        result_cache = result_cache_from_env(paths[0]) if shard_set is None else None
+        engine_router = router_from_env(paths[0]) if shard_set is None else None
+        if engine_router is not None:
+            nl2sql_app.SQL_DIALECT = engine_router.dialect
+            nl2sql_app.DIALECT_HINT = engine_router.prompt_hint
+        # Shards replicate the dimension tables holding most names
+        value_index = value_index_from_env(paths[0])
+        if os.getenv("INDEX_ADVISOR", "1").lower() not in {"0", "false", "no"}:
+            index_advisor = IndexAdvisor({"tables": []}, log_path=os.getenv("INDEX_ADVISOR_LOG"))
+        _started = True
+
+
+def prewarm():
+    """Load the lazily imported dependencies and build the schema artifacts.
+
+    Without this the first request pays for importing pandas and openai,
+    introspecting the schema and building the retrieval index.
+    """
+    import openai  # noqa: F401
+    import pandas as pd
+    import downsample  # noqa: F401
+
+    snapshot = current_schema()
+    snapshot.overview
+    if SCHEMA_RETRIEVAL:
+        snapshot.index
+    if value_index is not None:
+        value_index.update(snapshot.details)
+    nl2sql_app.get_async_client()
+    with db_pool.connection() as conn:
+        pd.read_sql_query("SELECT 1", conn)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(db_executor, startup)
+    if STARTUP_PREWARM:
+        await loop.run_in_executor(db_executor, prewarm)
+    logger.info("Startup finished in %.2fs", time.perf_counter() - start)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Per-request stage tracing, Server-Timing header and latency histograms
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+def current_schema():
+    """Return the current ``SchemaSnapshot``, following schema changes.
+
+    Blocking, and may run ``startup``; call it through ``run_db`` from handlers.
+    """
+    startup()
+    with db_pool.connection() as conn:
+        snapshot = schema_registry.snapshot(conn)
+    if index_advisor is not None and index_advisor.schema_details is not snapshot.details:
+        index_advisor.set_schema(snapshot.details)
+    return snapshot
+
+
+def repair_sql(sql):
+    """Validate ``sql`` on a pooled connection and repair it locally, see ``sql_repair.repair``."""
+    details = current_schema().details
+    with db_pool.connection() as conn:
+        return sql_repair.repair(conn, sql, details)
+
+
+def validates_sql():
+    # DuckDB SQL does not compile on SQLite
+    return SQL_REPAIR and (engine_router is None or engine_router.mode != "duckdb")
+
+
+async def validate_instruction(question, schema, instruction, context=None, checked=None):
+    """Return ``instruction`` with SQL that compiles whenever it can be repaired.
+
+    Cheap fixes are made locally; otherwise the LLM is asked once with the
+    SQLite error. Repaired answers replace the cached ones. When nothing
+    helps, the original answer is returned and fails on execution as before.
+    ``checked`` is the result of ``repair_sql`` when it already ran.
+    """
+    sql = instruction.get("sql")
+    if not sql or "error" in instruction or not validates_sql():
+        return instruction
+    if checked is None:
+        with timed("validate"):
+            checked = await run_db(repair_sql, sql)
+    fixed, error, fixes = checked
+    if error is None:
+        if fixes:
+            logger.info("Repaired SQL locally: %s", ", ".join(fixes))
+            metrics.SQL_REPAIRS.inc(result="local")
+            instruction = {**instruction, "sql": fixed}
+            nl2sql_app.store_answer(llm_cache, question, schema, model, context, instruction)
+        return instruction
+    logger.info("Generated SQL does not compile (%s), asking the LLM to repair it", error)
+    try:
+        repaired = await nl2sql_app.ask_llm_repair_async(question, schema, model, instruction, error, context)
+    except Exception as e:
+        logger.warning("SQL repair request failed: %s", e)
+        repaired = {}
+    if "error" in repaired or not repaired.get("sql"):
+        metrics.SQL_REPAIRS.inc(result="failed")
+        return instruction
+    with timed("validate"):
+        fixed, error, _ = await run_db(repair_sql, repaired["sql"])
+    repaired = {**repaired, "sql": fixed}
+    if error is not None:
+        metrics.SQL_REPAIRS.inc(result="failed")
+        return repaired
+    metrics.SQL_REPAIRS.inc(result="llm")
+    nl2sql_app.store_answer(llm_cache, question, schema, model, context, repaired)
+    return repaired
+
+
+async def execute_early(sql, execute, stage="execute"):
+    """Validate and run ``sql`` while the rest of the LLM answer streams in.
+
+    Returns ``(checked, result)``: the ``repair_sql`` result (``None`` when
+    validation is off) and the result of ``execute``, or ``None`` when the
+    statement does not compile and has to go through ``validate_instruction``.
+    ``stage`` names the timing of ``execute``.
+    """
+    checked = None
+    if validates_sql():
+        with timed("validate"):
+            checked = await run_db(repair_sql, sql)
+        if checked[1] is not None:
+            return checked, None
+        sql = checked[0]
+    with timed(stage):
+        return checked, await run_db(execute, sql)
+
+
+def discard(task):
+    """Cancel a speculative task whose result is no longer needed."""
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()  # retrieved, so it is not logged as unhandled
+
+
+def refresh_values(details):
+    """Bring ``value_index`` up to date with ``details`` in the background.
+
+    At most one refresh runs; calls made meanwhile are dropped, as the
+    running one already reads the latest rows.
+    """
+    global _values_refresh
+
+    def run():
+        try:
+            value_index.update(details)
+        except sqlite3.Error as e:
+            logger.warning("Value index update failed: %s", e)
 
-# Load the database schema once at startup and use a fresh
-# SQLite connection for each request. Using a connection per
-# request avoids cross-thread errors when the FastAPI server
-# handles requests in different worker threads.
-with sqlite3.connect(nl2sql_app.DB_PATH) as _conn:
-    _cursor = _conn.cursor()
-    schema = nl2sql_app.get_schema(_cursor)
-    raw_schema_details = nl2sql_app.get_schema_details(_cursor)
-    schema_details = apply_friendly_labels(raw_schema_details)
-    # Build a structured list for the /api/schema endpoint
-    # Only table and column names/types are returned to keep the
-    # payload small.  Foreign key information is available from the
-    # more detailed /api/schema/details endpoint.
-    schema_overview = {"tables": []}
-    for table in schema_details["tables"]:
-        table_entry = {"name": table["name"], "columns": []}
-        if "friendly" in table:
-            table_entry["friendly"] = table["friendly"]
-
-        for col in table["columns"]:
-            col_entry = {"name": col["name"], "type": col.get("type")}
-            if "fk" in col:
-                col_entry["fk"] = col["fk"]
-            if "friendly" in col:
-                col_entry["friendly"] = col["friendly"]
-            table_entry["columns"].append(col_entry)
-
-        schema_overview["tables"].append(table_entry)
+    with _values_lock:
+        if _values_refresh is None or _values_refresh.done():
+            _values_refresh = values_executor.submit(run)
+
+
+def value_matches(snapshot, question):
+    """Return the values of the database ``question`` mentions, see ``value_index``.
+
+    Only looks the question up; new rows are indexed by ``refresh_values``
+    and hint later questions.
+    """
+    if value_index is None:
+        return []
+    refresh_values(snapshot.details)
+    try:
+        with timed("values"):
+            return value_index.lookup(question)
+    except sqlite3.Error as e:
+        logger.warning("Value lookup failed: %s", e)
+        return []
+
+
+def prompt_schema(question):
+    """Return the schema text to send to the LLM for ``question``.
+
+    Values the question mentions are appended with their exact spelling and
+    their tables are kept in the retrieved schema. Blocking; run it with
+    ``run_db``.
+    """
+    snapshot = current_schema()
+    matches = value_matches(snapshot, question)
+    if not SCHEMA_RETRIEVAL:
+        text = snapshot.text
+    else:
+        text = snapshot.index.schema_for(question, SCHEMA_TOP_K, fallback=snapshot.text,
+                                         extra=[m.table for m in matches])
+    return text + "\n\n" + hint_text(matches) if matches else text
 
 
 class QueryRequest(BaseModel):
     question: str
     context: list[str] | None = None
+    response_version: int = 1
+
+
+class BatchRequest(BaseModel):
+    questions: list[str]
+    context: list[str] | None = None
+    response_version: int = 1
+    stream: bool = False
+
+
+class StreamRequest(BaseModel):
+    question: str | None = None
+    context: list[str] | None = None
+    token: str | None = None
+    chunk_size: int = 500
+
+
+def label_visuals(visuals, raw_data=None):
+    """Map the axis names of ``visuals`` to friendly labels in place.
+
+    When ``raw_data`` is given the expected fields are checked against the
+    first rows for debugging.
+    """
+    for vis in visuals:
+        vtype = vis.get("type", "table")
+        if vtype != "table" and raw_data is not None:
+            debug_check_fields(raw_data, vis.get("x"), vis.get("y"))
+        if "x" in vis:
+            vis["x"] = friendly_name(vis["x"])
+        if "y" in vis:
+            if isinstance(vis["y"], list):
+                vis["y"] = [friendly_name(y) for y in vis["y"]]
+            else:
+                vis["y"] = friendly_name(vis["y"])
+    return visuals
+
+
+def run_db(fn, *args):
+    """Run ``fn(*args)`` in ``db_executor`` keeping the request's trace context."""
+    startup()
+    ctx = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(db_executor, functools.partial(ctx.run, fn, *args))
+
+
+def run_query(sql):
+    """Execute ``sql`` and return the result DataFrame.
+
+    This runs inside ``db_executor`` so the blocking SQLite and pandas work
+    never happens on the event loop. Results are served from and added to
+    ``result_cache`` when it is enabled. With ``shard_set`` the statement
+    runs on every shard and the partial results are merged; with
+    ``engine_router`` it may run on DuckDB instead of SQLite.
+    """
+    if shard_set is not None:
+        return shard_set.execute(sql, query_guard)
+    if result_cache is not None:
+        key = result_cache.key(sql, query_guard.max_rows)
+        df, snapshot = result_cache.lookup(key)
+        if df is not None:
+            return df
+    df = engine_router.execute(sql, query_guard) if engine_router is not None else None
+    with db_pool.connection() as conn:
+        if df is None:
+            df = nl2sql_app.execute_sql(conn, sql, query_guard)
+            if index_advisor is not None:
+                index_advisor.observe(conn, sql)
+        # A DuckDB copy that is being reloaded may predate ``snapshot``
+        if result_cache is not None and (engine_router is None or engine_router.duckdb.ready):
+            result_cache.store(key, df, result_cache.tables_read(conn, sql), snapshot)
+    return df
+
+
+def run_query_arrow(sql):
+    """Return the result of ``sql`` for an Arrow response.
+
+    Results computed by DuckDB are returned as ``(table, truncated)`` without
+    a DataFrame in between and are not added to ``result_cache``. Everything
+    else is the DataFrame from ``run_query``.
+    """
+    if engine_router is None or shard_set is not None:
+        return run_query(sql)
+    if result_cache is not None:
+        df, _ = result_cache.lookup(result_cache.key(sql, query_guard.max_rows))
+        if df is not None:
+            return df
+    result = engine_router.execute(sql, query_guard, arrow=True)
+    return result if result is not None else run_query(sql)
+
+
+def json_safe(df):
+    """Return ``df`` with missing values replaced by ``None`` for JSON output."""
+    if df.isna().values.any():
+        return df.astype(object).where(df.notna(), None)
+    return df
+
+
+def record_rows(df):
+    """Return the rows of ``df`` as dictionaries keyed by friendly labels."""
+    return friendly_frame(json_safe(df)).to_dict(orient="records")
+
+
+def columnar_block(df):
+    """Return ``df`` as column names plus one value array per column."""
+    df = json_safe(df)
+    return {
+        "columns": [friendly_name(c) for c in df.columns],
+        "arrays": [df[c].tolist() for c in df.columns],
+        "rows": len(df),
+    }
+
+
+def arrow_payload(df, sql, visuals, truncated=False):
+    """Serialise ``df`` as an Arrow IPC stream.
+
+    ``df`` may also be a ``pyarrow.Table``, as returned by the DuckDB engine.
+    ``sql`` and ``visuals`` are stored as JSON in the schema metadata, plus
+    ``truncated`` when the query guard cut the result, so the client
+    receives the whole response in a single buffer.
+    """
+    import pyarrow as pa
+
+    with timed("serialize"):
+        if isinstance(df, pa.Table):
+            table = df.rename_columns([friendly_name(c) for c in df.column_names])
+        else:
+            table = pa.Table.from_pandas(friendly_frame(df), preserve_index=False)
+        metadata = {"sql": sql, "visuals": json.dumps(visuals, ensure_ascii=False)}
+        if truncated:
+            metadata["truncated"] = "true"
+        table = table.replace_schema_metadata(metadata)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def compress_body(body: bytes, accept_encoding: str):
+    """Return ``(body, encoding)`` compressed for the client when worthwhile.
+
+    Brotli is preferred when the optional ``brotli`` package is installed,
+    otherwise gzip is used. Small bodies are returned unchanged.
+    """
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    accepted = {e.split(";")[0].strip() for e in accept_encoding.split(",")}
+    if "br" in accepted:
+        try:
+            import brotli
+
+            return brotli.compress(body, quality=5), "br"
+        except ImportError:
+            pass
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
+
+
+def visual_frames(df, visuals):
+    """Return the frame shown by each visual, reduced by ``reduce_for_visual``.
+
+    Visuals whose data was reduced get a ``downsampled`` entry describing it.
+    """
+    columns = {friendly_name(c): c for c in df.columns}
+    columns.update((c, c) for c in df.columns)
+
+    def column(name):
+        return columns.get(name, name) if isinstance(name, str) else name
+
+    frames = []
+    from downsample import reduce_for_visual
+
+    with timed("downsample"):
+        for vis in visuals:
+            y = vis.get("y")
+            y = [column(v) for v in y] if isinstance(y, list) else column(y)
+            frame, info = reduce_for_visual(df, vis.get("type", "table"), column(vis.get("x")), y)
+            if info is not None:
+                vis["downsampled"] = info
+            frames.append(frame)
+    return frames
+
+
+def response_body(df, sql, visuals, version):
+    """Return the response for ``df`` in the requested format as a dict.
+
+    Version 1 embeds the rows in every visual. Version 2 stores each distinct
+    result once as a columnar block under ``data`` and each visual references
+    its block through ``data_ref``: the full result is ``main`` and reduced
+    chart data gets a block of its own. ``truncated`` is added when the query
+    guard cut the result at its row limit.
+    """
+    frames = visual_frames(df, visuals)
+    with timed("rows"):
+        if version >= 2:
+            data = {}
+            for i, (vis, frame) in enumerate(zip(visuals, frames)):
+                ref = MAIN_DATA_ID if frame is df else f"{MAIN_DATA_ID}_{i}"
+                if ref not in data:
+                    data[ref] = columnar_block(frame)
+                vis["data_ref"] = ref
+            response = {
+                "version": 2,
+                "sql": sql,
+                "data": data or {MAIN_DATA_ID: columnar_block(df)},
+                "visuals": visuals,
+            }
+        else:
+            rows = {}
+            for vis, frame in zip(visuals, frames):
+                if id(frame) not in rows:
+                    rows[id(frame)] = record_rows(frame)
+                vis["data"] = rows[id(frame)]
+            response = {"sql": sql, "visuals": visuals}
+        if df.attrs.get("truncated"):
+            response["truncated"] = True
+    return response
+
+
+def build_response(df, sql, visuals, version):
+    """Return the JSON response body for ``df``, see ``response_body``."""
+    response = response_body(df, sql, visuals, version)
+    with timed("serialize"):
+        return json.dumps(response, ensure_ascii=False, default=str)
 
 
 @app.post("/api/query")
-async def query_database(req: QueryRequest = Body(...)):
-    """Run LLM-generated SQL and return rows for visualisation."""
+async def query_database(request: Request, req: QueryRequest = Body(...)):
+    """Run LLM-generated SQL and return rows for visualisation.
+
+    ``response_version`` selects the payload format, see ``build_response``.
+    Version 2 clients sending ``Accept: application/vnd.apache.arrow.stream``
+    receive an Arrow IPC stream instead of JSON when pyarrow is installed.
+    """
+    import openai
+
     # Log the structured request for debugging
-    print("[API] Received payload:", req.model_dump())
+    logger.info("Received payload: %s", req.model_dump())
+
+    with timed("normalize"):
+        question = nl2sql_app.normalize_turkish_text(req.question)
+        context = [nl2sql_app.normalize_turkish_text(c) for c in (req.context or [])]
+    with timed("to_tech"):
+        question = to_tech(question)
+        context = [to_tech(c) for c in context]
+    arrow = req.response_version >= 2 and ARROW_MEDIA_TYPE in request.headers.get("accept", "")
+    execute = run_query_arrow if arrow else run_query
+    # SQL streamed by the LLM starts running before the visuals have arrived
+    early = {}
+
+    def on_sql(sql):
+        early[sql] = asyncio.ensure_future(execute_early(sql, execute))
 
-    question = nl2sql_app.normalize_turkish_text(req.question)
-    question = to_tech(question)
-    context = [to_tech(nl2sql_app.normalize_turkish_text(c)) for c in (req.context or [])]
     try:
-        instruction = nl2sql_app.ask_llm(question, schema, model, context)
-        if "error" in instruction:
-            raise HTTPException(status_code=400, detail=instruction["error"])
+        try:
+            schema = await run_db(prompt_schema, question)
+            if LLM_STREAM:
+                instruction = await nl2sql_app.ask_llm_stream_async(
+                    question, schema, model, context, cache=llm_cache, on_sql=on_sql)
+            else:
+                instruction = await nl2sql_app.ask_llm_async(question, schema, model, context, cache=llm_cache)
+            if "error" in instruction:
+                raise HTTPException(status_code=400, detail=instruction["error"])
+            task = early.pop(instruction.get("sql"), None)
+            checked, result = await task if task is not None else (None, None)
+            instruction = await validate_instruction(question, schema, instruction, context, checked)
+        except openai.APITimeoutError:
+            raise HTTPException(status_code=504, detail="LLM yanıtı zaman aşımına uğradı")
 
         sql = instruction.get("sql")
         visuals = instruction.get("visuals", [])
 
-        # Open a new connection for this request so the connection
-        # is created and used within the same thread.
-        with sqlite3.connect(nl2sql_app.DB_PATH) as conn:
-            df = nl2sql_app.execute_sql(conn, sql)
-            raw_data = df.to_dict(orient="records")
-            data = [to_friendly(r) for r in raw_data]
+        if result is None:
+            with timed("execute"):
+                result = await run_db(execute, sql)
+        if isinstance(result, tuple):
+            # Arrow table straight from DuckDB
+            table, truncated = result
+            label_visuals(visuals, table.slice(0, 5).to_pylist())
+            body = await run_db(arrow_payload, table, sql, visuals, truncated)
+            metrics.RESPONSE_BYTES.observe(len(body), encoding="arrow")
+            return Response(content=body, media_type=ARROW_MEDIA_TYPE)
+        df = result
+        label_visuals(visuals, df.head().to_dict(orient="records"))
 
-        for vis in visuals:
-            vtype = vis.get("type", "table")
-            if vtype != "table":
-                debug_check_fields(raw_data, vis.get("x"), vis.get("y"))
-            if "x" in vis:
-                vis["x"] = friendly_name(vis["x"])
-            if "y" in vis:
-                if isinstance(vis["y"], list):
-                    vis["y"] = [friendly_name(y) for y in vis["y"]]
-                else:
-                    vis["y"] = friendly_name(vis["y"])
-            vis["data"] = data
+        if arrow:
+            try:
+                body = await run_db(arrow_payload, df, sql, visuals, df.attrs.get("truncated", False))
+                metrics.RESPONSE_BYTES.observe(len(body), encoding="arrow")
+                return Response(content=body, media_type=ARROW_MEDIA_TYPE)
+            except ImportError:
+                logger.warning("pyarrow is not installed, falling back to JSON")
 
-        response = {"sql": sql, "visuals": visuals}
-        # Log the full API response for transparency
-        print("[API RESPONSE]:", json.dumps(response, ensure_ascii=False))
-        return response
+        # Serialise once and reuse the same text for logging and the response
+        body = await run_db(build_response, df, sql, visuals, req.response_version)
+        # Full response dumps are expensive at volume and only logged at debug level
+        logger.debug("API response: %s", body)
+        with timed("compress"):
+            content, encoding = compress_body(body.encode("utf-8"), request.headers.get("accept-encoding", ""))
+        metrics.RESPONSE_BYTES.observe(len(content), encoding=encoding or "identity")
+        headers = {"Content-Encoding": encoding} if encoding else None
+        return Response(content=content, media_type="application/json", headers=headers)
+    except HTTPException:
+        raise
+    except QueryRejected as e:
+        logger.warning("Query rejected: %s", e.to_dict())
+        raise HTTPException(status_code=422, detail=e.to_dict())
     except ValueError as e:
-        print("[ERROR]", e)
+        logger.error("Invalid LLM answer: %s", e)
         raise HTTPException(status_code=500, detail="LLM yanıtı geçersiz veya desteklenmeyen formatta")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for task in early.values():
+            discard(task)
+
+
+def batch_error(exc):
+    """Return the structured error of a failed batch item."""
+    import openai
+
+    if isinstance(exc, QueryRejected):
+        return exc.to_dict()
+    if isinstance(exc, openai.APITimeoutError):
+        return {"code": "llm_timeout", "detail": "LLM yanıtı zaman aşımına uğradı"}
+    if isinstance(exc, ValueError):
+        return {"code": "invalid_answer", "detail": "LLM yanıtı geçersiz veya desteklenmeyen formatta"}
+    return {"code": "error", "detail": str(exc)}
+
+
+def batch_entries(item, questions, version):
+    """Return the per-question result dicts of one finished batch item.
+
+    Runs in ``db_executor`` because it converts the result rows.
+    """
+    instruction, error = item["instruction"], item["error"]
+    if error is not None:
+        body = {"error": batch_error(error)}
+    elif "error" in instruction:
+        body = {"error": {"code": "llm_error", "detail": instruction["error"]}}
+    else:
+        df = item["result"]
+        visuals = label_visuals(instruction.get("visuals", []), df.head().to_dict(orient="records"))
+        body = response_body(df, instruction.get("sql"), visuals, version)
+    # Duplicate questions share the same body
+    return [{"index": i, "question": questions[i], **body} for i in item["indexes"]]
+
+
+@app.post("/api/query/batch")
+async def query_database_batch(request: Request, req: BatchRequest = Body(...)):
+    """Answer a list of questions in one request.
+
+    Identical questions (after normalisation) are answered once and the
+    distinct ones run concurrently, so the batch takes about as long as its
+    slowest question. Results come back in input order with per-item
+    ``error`` objects, or with ``stream`` as NDJSON lines in completion order
+    followed by an ``end`` line.
+    """
+    if not req.questions:
+        raise HTTPException(status_code=400, detail="questions boş olamaz")
+    if len(req.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"En fazla {BATCH_MAX_QUESTIONS} soru gönderilebilir")
+    logger.info("Received batch of %d questions", len(req.questions))
+
+    context = [to_tech(nl2sql_app.normalize_turkish_text(c)) for c in (req.context or [])]
+    batch = nl2sql_app.run_batch(
+        req.questions,
+        model,
+        lambda q: run_db(prompt_schema, q),
+        lambda sql: run_db(run_query, sql),
+        context,
+        cache=llm_cache,
+        concurrency=BATCH_CONCURRENCY,
+        prepare=lambda q: to_tech(nl2sql_app.normalize_turkish_text(q)),
+        validate=lambda q, schema, instruction: validate_instruction(q, schema, instruction, context),
+    )
+
+    if req.stream:
+        async def lines():
+            count = 0
+            try:
+                async for item in batch:
+                    for entry in await run_db(batch_entries, item, req.questions, req.response_version):
+                        count += 1
+                        yield result_stream.ndjson_line({"type": "result", **entry})
+            finally:
+                await batch.aclose()
+            yield result_stream.ndjson_line({"type": "end", "results": count})
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    results = []
+    unique = 0
+    async for item in batch:
+        unique += 1
+        results.extend(await run_db(batch_entries, item, req.questions, req.response_version))
+    results.sort(key=lambda r: r["index"])
+    with timed("serialize"):
+        body = json.dumps({"results": results, "unique": unique}, ensure_ascii=False, default=str)
+    content, encoding = compress_body(body.encode("utf-8"), request.headers.get("accept-encoding", ""))
+    metrics.RESPONSE_BYTES.observe(len(content), encoding=encoding or "identity")
+    headers = {"Content-Encoding": encoding} if encoding else None
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def check_plan(sql):
+    """Run the query guard's plan cost check for ``sql``."""
+    if engine_router is not None and engine_router.mode == "duckdb":
+        return  # SQLite cannot plan DuckDB SQL and DuckDB has no nested loop scans to catch
+    with db_pool.connection() as conn:
+        query_guard.check_plan(conn, sql)
+
+
+def chart_lines(sql, visuals):
+    """Yield a ``visual`` line with the data of every chart in ``visuals``.
+
+    Charts show the whole result reduced by ``visual_frames`` rather than the
+    streamed page, so they are complete on the first page and never resent.
+    """
+    charts = [(i, dict(vis)) for i, vis in enumerate(visuals) if vis.get("type", "table") != "table"]
+    if not charts:
+        return
+    frames = visual_frames(run_query(sql), [vis for _, vis in charts])
+    for (i, vis), frame in zip(charts, frames):
+        frame = json_safe(frame)
+        line = {
+            "type": "visual",
+            "index": i,
+            "columns": [friendly_name(c) for c in frame.columns],
+            "rows": frame.values.tolist(),
+        }
+        if "downsampled" in vis:
+            line["downsampled"] = vis["downsampled"]
+        yield result_stream.ndjson_line(line)
+
+
+def stream_rows(sql, offset, meta, chunk_size, trailer=None):
+    """Yield NDJSON lines for one page of ``sql`` using a private connection."""
+    if shard_set is not None or (engine_router is not None and engine_router.mode == "duckdb"):
+        yield from stream_materialized_rows(sql, offset, meta, chunk_size, trailer)
+        return
+    with db_pool.dedicated() as conn, query_guard.budget(conn) as budget:
+        yield from result_stream.stream_result(
+            conn,
+            sql,
+            stream_tokens,
+            meta,
+            offset=offset,
+            page_rows=STREAM_PAGE_ROWS,
+            chunk_size=max(1, min(chunk_size, STREAM_PAGE_ROWS)),
+            label=friendly_name,
+            budget=budget,
+            trailer=trailer,
+        )
+
+
+def materialize_result(sql):
+    """Return an in-memory SQLite connection holding ``run_query(sql)`` as ``result``."""
+    df = run_query(sql)
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    df.to_sql("result", conn, index=False)
+    return conn
+
+
+def stream_materialized_rows(sql, offset, meta, chunk_size, trailer=None):
+    """Stream ``sql`` from an in-memory copy of its result.
+
+    Used when the statement cannot run on the SQLite file directly: merged
+    shard results and DuckDB SQL. The copy is limited to the guard's
+    ``max_rows`` and rebuilt for every page.
+    """
+    try:
+        conn = materialize_result(sql)
+    except Exception as e:
+        yield result_stream.error_line(e)
+        return
+    try:
+        yield from result_stream.stream_result(
+            conn,
+            "SELECT * FROM result",
+            stream_tokens,
+            meta,
+            offset=offset,
+            page_rows=STREAM_PAGE_ROWS,
+            chunk_size=max(1, min(chunk_size, STREAM_PAGE_ROWS)),
+            label=friendly_name,
+            query=sql,
+            trailer=trailer,
+        )
+    finally:
+        conn.close()
+
+
+@app.post("/api/query/stream")
+async def query_database_stream(req: StreamRequest = Body(...)):
+    """Stream LLM-generated query results as NDJSON.
+
+    Either ``question`` or a continuation ``token`` from a previous response
+    must be given. Each response returns at most ``STREAM_PAGE_ROWS`` rows.
+    The first page also carries the reduced data of the chart visuals, see
+    ``chart_lines``. With ``LLM_STREAM`` the SQL is repaired and plan checked
+    while the LLM still writes the visuals, as in ``query_database``.
+    """
+    import openai
+
+    # The statement whose plan was already checked, if any
+    planned = None
+    if req.token:
+        try:
+            sql, offset = stream_tokens.decode(req.token)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        meta = {}
+        trailer = None
+    elif req.question:
+        question = to_tech(nl2sql_app.normalize_turkish_text(req.question))
+        context = [to_tech(nl2sql_app.normalize_turkish_text(c)) for c in (req.context or [])]
+        # SQL streamed by the LLM is validated and plan checked before the visuals have arrived
+        early = {}
+
+        def on_sql(sql):
+            early[sql] = asyncio.ensure_future(execute_early(sql, check_plan, "plan"))
+
+        try:
+            schema = await run_db(prompt_schema, question)
+            if LLM_STREAM:
+                instruction = await nl2sql_app.ask_llm_stream_async(
+                    question, schema, model, context, cache=llm_cache, on_sql=on_sql)
+            else:
+                instruction = await nl2sql_app.ask_llm_async(question, schema, model, context, cache=llm_cache)
+            if "error" in instruction:
+                raise HTTPException(status_code=400, detail=instruction["error"])
+            task = early.pop(instruction.get("sql"), None)
+            checked = None
+            if task is not None:
+                checked, _ = await task
+                # Statements that compiled were plan checked as well
+                if checked is None or checked[1] is None:
+                    planned = checked[0] if checked else instruction.get("sql")
+            instruction = await validate_instruction(question, schema, instruction, context, checked)
+        except openai.APITimeoutError:
+            raise HTTPException(status_code=504, detail="LLM yanıtı zaman aşımına uğradı")
+        except QueryRejected as e:
+            logger.warning("Query rejected: %s", e.to_dict())
+            raise HTTPException(status_code=422, detail=e.to_dict())
+        except ValueError as e:
+            logger.error("Invalid LLM answer: %s", e)
+            raise HTTPException(status_code=500, detail="LLM yanıtı geçersiz veya desteklenmeyen formatta")
+        finally:
+            for task in early.values():
+                discard(task)
+        sql = instruction.get("sql")
+        offset = 0
+        meta = {"visuals": label_visuals(instruction.get("visuals", []))}
+        trailer = functools.partial(chart_lines, sql, meta["visuals"])
+    else:
+        raise HTTPException(status_code=400, detail="question veya token gerekli")
+
+    # Refuse expensive plans before the response starts
+    if sql != planned:
+        try:
+            await run_db(check_plan, sql)
+        except QueryRejected as e:
+            logger.warning("Query rejected: %s", e.to_dict())
+            raise HTTPException(status_code=422, detail=e.to_dict())
+
+    return StreamingResponse(
+        stream_rows(sql, offset, meta, req.chunk_size, trailer), media_type="application/x-ndjson"
+    )
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Return hit/miss counters of the LLM answer cache and the result cache."""
+    results = {"enabled": False} if result_cache is None else {"enabled": True, **result_cache.stats()}
+    if llm_cache is None:
+        return {"enabled": False, "results": results}
+    return {"enabled": True, **llm_cache.stats(), "results": results}
+
+
+def collect_runtime_stats():
+    """Report cache, guard and connection pool state as gauges for ``/metrics``."""
+    entries = []
+    if llm_cache is not None:
+        stats = llm_cache.stats()
+        entries.append(("nl2sql_llm_cache_lookups", "LLM answer cache lookups by result.", {
+            (("result", "hit"),): stats["hits"],
+            (("result", "miss"),): stats["misses"],
+            (("result", "disk_hit"),): stats["disk_hits"],
+        }))
+        entries.append(("nl2sql_llm_cache_hit_rate", "LLM answer cache hit rate.", {(): stats["hit_rate"]}))
+        entries.append(("nl2sql_llm_cache_entries", "Entries in the LLM answer cache memory tier.", {(): stats["entries"]}))
+    if result_cache is not None:
+        stats = result_cache.stats()
+        entries.append(("nl2sql_result_cache_lookups", "SQL result cache lookups by result.", {
+            (("result", "hit"),): stats["hits"],
+            (("result", "miss"),): stats["misses"],
+        }))
+        entries.append(("nl2sql_result_cache_bytes", "Memory held by cached SQL results.", {(): stats["bytes"]}))
+        entries.append(("nl2sql_result_cache_invalidations", "Cached results dropped after table changes.",
+                        {(): stats["invalidations"]}))
+    entries.append(("nl2sql_query_rejections", "Statements refused or aborted by the query guard.", {
+        (("code", code),): n for code, n in query_guard.stats()["rejected"].items()
+    }))
+    snapshot = schema_registry.current
+    if snapshot is not None:
+        entries.append(("nl2sql_schema_version", "Version of the introspected schema, increased on every change.",
+                        {(): snapshot.version}))
+    if engine_router is not None:
+        stats = engine_router.stats()
+        entries.append(("nl2sql_engine_queries", "Statements by the engine that ran them.", {
+            (("engine", engine),): n for engine, n in stats["queries"].items()
+        }))
+        entries.append(("nl2sql_duckdb_rows", "Rows held by the DuckDB copy.", {(): stats["duckdb"]["rows"]}))
+    if shard_set is not None:
+        stats = shard_set.stats()
+        entries.append(("nl2sql_shard_plans", "Statements run on shards by execution plan.", {
+            (("plan", plan),): n for plan, n in stats["plans"].items()
+        }))
+    if db_pool is not None:
+        pool = db_pool.stats()
+        entries.append(("nl2sql_db_connections", "Open pooled SQLite connections.", {(): pool["open_connections"]}))
+    return entries
+
+
+metrics.REGISTRY.add_collector(collect_runtime_stats)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Return stage latencies, request counters and runtime gauges for Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/engine/stats")
+async def get_engine_stats():
+    """Return the engine routing mode, per-engine counters and DuckDB copy state."""
+    if engine_router is None:
+        return {"mode": "sqlite"}
+    return engine_router.stats()
+
+
+@app.get("/api/values/stats")
+async def get_value_stats():
+    """Return the size and lookup counters of the value index."""
+    if value_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **value_index.stats()}
+
+
+@app.get("/api/guard/stats")
+async def get_guard_stats():
+    """Return the query guard limits and rejection counters."""
+    return query_guard.stats()
+
+
+@app.get("/api/indexes/advice")
+async def get_index_advice():
+    """Return index proposals based on the schema and observed query plans."""
+    if index_advisor is None:
+        return {"enabled": False, "proposals": []}
+    return {
+        "enabled": True,
+        "observed_queries": index_advisor.queries,
+        "proposals": index_advisor.proposals(),
+    }
 
 
 @app.get("/api/schema")
 async def get_schema_endpoint():
     """Return tables and column names/types for the demo DB."""
-    return schema_overview
+    # The snapshot builds ``overview`` on first use, so read it in the executor too
+    return await run_db(lambda: current_schema().overview)
 
 
 @app.get("/api/schema/details")
 async def get_schema_details_endpoint():
     """Return full schema details including foreign keys."""
-    return schema_details
+    return await run_db(lambda: current_schema().friendly_details)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+"""Rendering the charts of the corpus answers for a batch report.
+
+Every chart visual of the corpus is drawn from its query result on the
+generated demo database, ``--copies`` times with distinct data so the cache
+does not help, in four ways:
+
+- ``seaborn``: the former CLI code path (``df.melt`` plus seaborn's
+  high-level functions through pyplot), one figure after another; skipped
+  when seaborn is not installed;
+- ``serial``: ``chart_render.draw`` in this process, one after another;
+- ``workers``: ``ChartRenderer.export`` on a pool of ``--workers`` processes;
+- ``cached``: the same export again, served from the figure cache::
+
+    python -m benchmarks.bench_charts --scale 1 --copies 4 --workers 4
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.bench_e2e import ROOT, prepare_database
+from benchmarks.fake_llm import load_corpus
+from chart_render import CHART_TYPES, ChartRenderer, chart_data, draw
+from db_pool import sqlite_uri
+
+
+def seaborn_png(df, chart_type, x, y) -> bytes:
+    """Render one chart the way ``nl2sql_app.display_result`` used to."""
+    import io
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from downsample import reduce_for_visual
+
+    df, _ = reduce_for_visual(df, chart_type, x, y)
+    sns.set(style="whitegrid")
+    plt.figure(figsize=(10, 6))
+    if isinstance(y, (list, tuple)) and chart_type in ("bar", "line"):
+        df_melt = df.melt(id_vars=[x], value_vars=list(y), var_name="series", value_name="value")
+        plot = sns.barplot if chart_type == "bar" else sns.lineplot
+        plot(data=df_melt, x=x, y="value", hue="series")
+    elif chart_type == "bar":
+        sns.barplot(data=df, x=x, y=y)
+    elif chart_type == "line":
+        sns.lineplot(data=df, x=x, y=y, marker="o")
+    else:
+        sns.scatterplot(data=df, x=x, y=y)
+    plt.xticks(rotation=45, ha="right")
+    plt.tight_layout()
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format="png")
+    plt.close()
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure chart rendering for batch reports.")
+    parser.add_argument("--scale", type=float, default=1.0, help="scale of the generated demo database")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--copies", type=int, default=4, help="renders of every chart with distinct data")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--format", default="png", choices=["png", "svg"])
+    args = parser.parse_args()
+
+    workdir = os.path.join(ROOT, "benchmarks", ".data")
+    os.makedirs(workdir, exist_ok=True)
+    db_path = prepare_database(workdir, args.scale, args.seed, False)
+    conn = sqlite3.connect(sqlite_uri(db_path), uri=True)
+    items = []
+    for n, entry in enumerate(load_corpus()):
+        charts = [v for v in entry["answer"].get("visuals", []) if v.get("type") in CHART_TYPES]
+        if not charts:
+            continue
+        df = pd.read_sql_query(entry["answer"]["sql"], conn)
+        for copy in range(args.copies):
+            # Scaled copies hash differently but draw the same amount of work
+            scaled = df.copy()
+            for column in scaled.select_dtypes("number").columns:
+                scaled[column] = scaled[column] * (1 + copy / 100)
+            items.append((f"q{n}_{copy}", scaled, charts))
+    conn.close()
+    count = sum(len(charts) for _, _, charts in items)
+    print(f"{count} charts ({len(items)} results), format {args.format}")
+
+    timings = {}
+    try:
+        import seaborn  # noqa: F401
+        # seaborn has no pie chart
+        drawn = [(df, v) for _, df, charts in items for v in charts if v["type"] != "pie"]
+        start = time.perf_counter()
+        for df, visual in drawn:
+            seaborn_png(df, visual["type"], visual.get("x"), visual.get("y"))
+        timings["seaborn"] = (time.perf_counter() - start, len(drawn))
+    except ImportError:
+        print("seaborn is not installed, skipping the former code path")
+
+    start = time.perf_counter()
+    for _, df, charts in items:
+        for visual in charts:
+            chart = chart_data(df, visual)
+            if chart is not None:
+                draw(chart, args.format)
+    timings["serial"] = (time.perf_counter() - start, count)
+
+    directory = tempfile.mkdtemp(prefix="charts_")
+    renderer = ChartRenderer(args.workers)
+    try:
+        # Start the workers outside the measurement, as a long-running report would
+        renderer.export(items[:1], directory, args.format)
+        renderer.clear()
+        start = time.perf_counter()
+        paths = renderer.export(items, directory, args.format)
+        timings["workers"] = (time.perf_counter() - start, count)
+        start = time.perf_counter()
+        renderer.export(items, directory, args.format)
+        timings["cached"] = (time.perf_counter() - start, count)
+        stats = renderer.stats()
+    finally:
+        renderer.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    for name, (seconds, charts) in timings.items():
+        print(f"{name:<8} {charts:>4} charts {seconds:>7.2f}s  {charts / seconds:>8.1f} charts/s")
+    print(f"{len(paths)} files written, cache {stats['entries']} entries {stats['bytes'] / 2**20:.1f} MiB, "
+          f"hit rate {stats['hit_rate']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""End-to-end benchmark suite running fully offline.
+
+For every database scale the suite
+
+1. generates a seeded demo database with ``create_demo_db.generate`` (reused
+   on later runs unless ``--regenerate`` is given);
+2. times the functions under ``/api/query`` in-process for every question in
+   the corpus: normalisation plus ``to_tech``, ``parse_llm_response``,
+   ``execute_sql`` and the conversion and serialisation of the rows;
+3. starts the API server with ``uvicorn`` against that database and the
+   ``benchmarks.fake_llm`` stand-in, then drives ``/api/query`` at several
+   concurrency levels.
+
+It reports p50/p95/p99 latency, throughput and peak RSS. The results are
+written as JSON, and ``--baseline`` compares them with an earlier run::
+
+    python -m benchmarks.bench_e2e --scales 0.1,1 --output after.json --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMServer, load_corpus
+from benchmarks.load_test import percentile, run_level
+from create_demo_db import generate
+from db_pool import sqlite_uri
+from field_mapping import friendly_frame, to_tech
+from nl2sql_app import execute_sql, normalize_turkish_text, parse_llm_response
+from query_guard import QueryGuard
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(samples) -> dict:
+    """Return call count and p50/p95/p99 in milliseconds for ``samples`` (seconds)."""
+    return {
+        "calls": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "total_ms": round(sum(samples) * 1000, 3),
+    }
+
+
+def timed_calls(fn, args_list, repeat: int) -> dict:
+    """Call ``fn`` with every entry of ``args_list`` ``repeat`` times and summarise."""
+    samples = []
+    for _ in range(repeat):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def prepare_database(workdir: str, scale: float, seed: int, regenerate: bool) -> str:
+    path = os.path.join(workdir, f"demo_scale_{scale:g}_seed_{seed}.db")
+    if regenerate or not os.path.exists(path):
+        generate(db_path=path, scale=scale, seed=seed, force=True)
+    return path
+
+
+def table_rows(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        tables = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        return sum(conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables)
+
+
+def bench_functions(db_path: str, corpus: list, repeat: int) -> dict:
+    """Time the stages of the query pipeline without HTTP or LLM."""
+    questions = [(e["question"],) for e in corpus]
+    answers = [(json.dumps(e["answer"], ensure_ascii=False),) for e in corpus]
+    guard = QueryGuard()
+    conn = sqlite3.connect(sqlite_uri(db_path), uri=True)
+    frames = [execute_sql(conn, e["answer"]["sql"], guard) for e in corpus]
+    results = {
+        "normalize_to_tech": timed_calls(lambda q: to_tech(normalize_turkish_text(q)), questions, repeat),
+        "parse_llm_response": timed_calls(parse_llm_response, answers, repeat),
+        "execute_sql": timed_calls(
+            lambda sql: execute_sql(conn, sql, guard), [(e["answer"]["sql"],) for e in corpus], repeat),
+        "record_rows": timed_calls(
+            lambda df: friendly_frame(df).to_dict(orient="records"), [(df,) for df in frames], repeat),
+        "serialize": timed_calls(
+            lambda rows: json.dumps(rows, ensure_ascii=False, default=str),
+            [(friendly_frame(df).to_dict(orient="records"),) for df in frames], repeat),
+    }
+    conn.close()
+    return results
+
+
+def peak_rss_mb(pid: int) -> float | None:
+    """Return the peak resident set size of ``pid`` in MiB (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def start_server(db_path: str, llm_url: str, port: int, extra_env: dict) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "NL2SQL_DB_PATH": db_path,
+        "OPENAI_BASE_URL": llm_url,
+        "OPENAI_API_KEY": "benchmark",
+        "LLM_CACHE_ENABLED": "0",
+        "LOG_LEVEL": "WARNING",
+        **extra_env,
+    }
+    cmd = [sys.executable, "-m", "uvicorn", "api_server:app", "--host", "127.0.0.1",
+           "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=ROOT, env=env)
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API server exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"{url}/api/schema", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API server did not become ready")
+
+
+def bench_http(db_path: str, llm: FakeLLMServer, questions: list, levels, requests: int,
+               port: int, timeout: float, extra_env: dict) -> dict:
+    url = f"http://127.0.0.1:{port}"
+    proc = start_server(db_path, llm.url, port, extra_env)
+    try:
+        start = time.perf_counter()
+        wait_ready(url, proc)
+        startup = time.perf_counter() - start
+        # One pass over the corpus warms connections and SQLite's page cache
+        asyncio.run(run_level(url, questions, 1, len(questions), timeout))
+        runs = [asyncio.run(run_level(url, questions, level, requests, timeout)) for level in levels]
+        return {"startup_s": round(startup, 3), "levels": runs, "server_peak_rss_mb": peak_rss_mb(proc.pid)}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def change(new, old) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(result: dict, baseline: dict) -> None:
+    """Print the relative change of the main metrics against ``baseline``."""
+    old_scales = {s["scale"]: s for s in baseline.get("scales", [])}
+    for entry in result["scales"]:
+        old = old_scales.get(entry["scale"])
+        if old is None:
+            continue
+        print(f"\nscale {entry['scale']:g} vs baseline {baseline['meta'].get('revision')}")
+        for name, stats in entry["functions"].items():
+            prev = old["functions"].get(name)
+            if prev:
+                print(f"  {name:<20} p50 {change(stats['p50_ms'], prev['p50_ms']):>8}  "
+                      f"p95 {change(stats['p95_ms'], prev['p95_ms']):>8}")
+        old_levels = {r["concurrency"]: r for r in old.get("http", {}).get("levels", [])}
+        for run in entry.get("http", {}).get("levels", []):
+            prev = old_levels.get(run["concurrency"])
+            if prev:
+                print(f"  http c={run['concurrency']:<4}          p50 {change(run['p50_ms'], prev['p50_ms']):>8}  "
+                      f"p99 {change(run['p99_ms'], prev['p99_ms']):>8}  rps {change(run['rps'], prev['rps']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark suite.")
+    parser.add_argument("--scales", default="0.1,1", help="comma separated database scales")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=os.path.join(ROOT, "benchmarks", ".data"),
+                        help="directory for the generated databases")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild existing databases")
+    parser.add_argument("--corpus", default=None, help="question/answer corpus JSON")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions of the function benchmarks")
+    parser.add_argument("--levels", default="1,10,50", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="HTTP requests per level")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated LLM latency")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="simulated delay between streamed tokens")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--no-http", action="store_true", help="only run the function benchmarks")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the API server, may be repeated")
+    parser.add_argument("--output", default="bench_e2e.json", help="result JSON file")
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else load_corpus()
+    questions = [e["question"] for e in corpus]
+    levels = [int(x) for x in args.levels.split(",")]
+    extra_env = dict(item.split("=", 1) for item in args.server_env)
+    os.makedirs(args.workdir, exist_ok=True)
+
+    result = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "scales": [],
+    }
+    llm = None if args.no_http else FakeLLMServer(corpus, args.latency_ms / 1000,
+                                                      token_latency=args.token_ms / 1000).start()
+    try:
+        for scale in (float(x) for x in args.scales.split(",")):
+            db_path = prepare_database(args.workdir, scale, args.seed, args.regenerate)
+            entry = {
+                "scale": scale,
+                "rows": table_rows(db_path),
+                "db_mb": round(os.path.getsize(db_path) / 2**20, 1),
+                "functions": bench_functions(db_path, corpus, args.repeat),
+            }
+            print(f"\nscale {scale:g}: {entry['rows']} rows, {entry['db_mb']} MiB")
+            for name, stats in entry["functions"].items():
+                print(f"  {name:<20} p50={stats['p50_ms']:>9.3f}ms  p95={stats['p95_ms']:>9.3f}ms  "
+                      f"p99={stats['p99_ms']:>9.3f}ms")
+            if llm is not None:
+                entry["http"] = bench_http(db_path, llm, questions, levels, args.requests,
+                                           args.port, args.timeout, extra_env)
+                for run in entry["http"]["levels"]:
+                    print(f"  http c={run['concurrency']:<4} rps={run['rps']:>8}  p50={run['p50_ms']}ms  "
+                          f"p95={run['p95_ms']}ms  p99={run['p99_ms']}ms  errors={run['errors']}")
+                print(f"  server peak RSS {entry['http']['server_peak_rss_mb']} MiB, "
+                      f"startup {entry['http']['startup_s']}s")
+            result["scales"].append(entry)
+    finally:
+        if llm is not None:
+            llm.stop()
+
+    # ru_maxrss is reported in KiB on Linux
+    result["harness_peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""SQLite versus DuckDB on the KPI queries of ``LLM_Guide.md``.
+
+The queries compute overhead, sales, SMM and profit the way the LLM is asked
+to, with CTEs and JOINs over the fact tables, in SQL both engines accept.
+For every query the result of ``engines.DuckDBEngine`` is checked against
+SQLite and both are timed (best of ``--repeat``). The engine ``auto`` routing
+would pick is shown as well, and ``SQLITE_ONLY`` statements, whose results
+differ silently on DuckDB, must be routed to SQLite::
+
+    python -m benchmarks.bench_engines --scale 10
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+from benchmarks.bench_e2e import ROOT, prepare_database
+from db_pool import sqlite_uri
+from engines import DuckDBEngine, EngineRouter
+
+MONTHLY = """
+WITH gg AS (
+    SELECT strftime('%Y-%m', tarih) AS ay, SUM(tutar) AS genel_gider
+    FROM Finans WHERE tip = 'Genel Gider' GROUP BY ay
+), uretim_ay AS (
+    SELECT strftime('%Y-%m', tarih) AS ay, urun_id, SUM(adet) AS uretim_adet
+    FROM Uretim GROUP BY ay, urun_id
+), satis_ay AS (
+    SELECT strftime('%Y-%m', tarih) AS ay, urun_id, SUM(adet) AS satis_adet, SUM(toplam_fiyat) AS satis_tutar
+    FROM Satislar GROUP BY ay, urun_id
+), alim_ay AS (
+    SELECT strftime('%Y-%m', tarih) AS ay, urun_id, SUM(toplam_tutar) AS alim_tutar
+    FROM SatinAlma GROUP BY ay, urun_id
+)
+"""
+
+QUERIES = {
+    "genel_gider_aylik": "SELECT strftime('%Y-%m', tarih) AS ay, SUM(tutar) AS genel_gider FROM Finans "
+                         "WHERE tip = 'Genel Gider' GROUP BY ay ORDER BY ay",
+    "satis_urun_aylik": "SELECT strftime('%Y-%m', tarih) AS ay, urun_id, SUM(adet) AS adet, "
+                        "SUM(toplam_fiyat) AS tutar FROM Satislar GROUP BY ay, urun_id ORDER BY ay, urun_id",
+    "smm_urun_aylik": MONTHLY + """
+SELECT s.ay, s.urun_id, s.satis_tutar,
+       COALESCE(a.alim_tutar, 0) + COALESCE(gg.genel_gider * u.w_carpani / ur.uretim_adet, 0) * s.satis_adet AS smm
+FROM satis_ay s
+JOIN Urunler u ON u.id = s.urun_id
+LEFT JOIN uretim_ay ur ON ur.ay = s.ay AND ur.urun_id = s.urun_id
+LEFT JOIN alim_ay a ON a.ay = s.ay AND a.urun_id = s.urun_id
+LEFT JOIN gg ON gg.ay = s.ay
+ORDER BY s.ay, s.urun_id""",
+    "kar_yillik": MONTHLY + """
+SELECT substr(s.ay, 1, 4) AS yil,
+       SUM(s.satis_tutar) AS satis,
+       SUM(s.satis_tutar - COALESCE(a.alim_tutar, 0)
+           - COALESCE(gg.genel_gider * u.w_carpani / ur.uretim_adet, 0) * s.satis_adet) AS kar
+FROM satis_ay s
+JOIN Urunler u ON u.id = s.urun_id
+LEFT JOIN uretim_ay ur ON ur.ay = s.ay AND ur.urun_id = s.urun_id
+LEFT JOIN alim_ay a ON a.ay = s.ay AND a.urun_id = s.urun_id
+LEFT JOIN gg ON gg.ay = s.ay
+GROUP BY yil ORDER BY yil""",
+    "musteri_satis": "SELECT M.lokasyon, M.sektor, COUNT(*) AS siparis, SUM(S.toplam_fiyat) AS tutar, "
+                     "AVG(S.adet) AS ortalama_adet FROM Satislar S JOIN Musteriler M ON M.id = S.musteri_id "
+                     "GROUP BY M.lokasyon, M.sektor ORDER BY tutar DESC",
+    "hata_orani": "SELECT strftime('%Y', U.tarih) AS yil, R.kategori, SUM(U.hata_sayisi) * 1.0 / SUM(U.adet) AS oran "
+                  "FROM Uretim U JOIN Urunler R ON R.id = U.urun_id GROUP BY yil, R.kategori ORDER BY yil, R.kategori",
+    # Integer division truncates on SQLite; DuckDB must do the same on every cursor
+    "ortalama_adet_tam": "SELECT urun_id, SUM(adet) / COUNT(*) AS ortalama FROM Satislar GROUP BY urun_id "
+                         "ORDER BY urun_id",
+}
+
+# Unicode case folding, dates as text and DuckDB's names for un-aliased columns
+SQLITE_ONLY = [
+    "SELECT COUNT(*) FROM Izinler WHERE UPPER(izin_tipi) = 'YILLIK'",
+    "SELECT LOWER(izin_tipi) AS tip, COUNT(*) AS n FROM Izinler GROUP BY tip",
+    "SELECT AVG(bitis - baslangic) AS gun FROM Izinler",
+    "SELECT date(bitis) - date(baslangic) AS fark, COUNT(*) AS n FROM Izinler GROUP BY fark",
+    "SELECT urun_id, SUM(adet) FROM Satislar GROUP BY urun_id",
+    "SELECT COUNT(*) FROM Satislar",
+]
+
+
+def best_of(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SQLite and DuckDB on the KPI queries.")
+    parser.add_argument("--scale", type=float, default=10.0, help="scale of the generated demo database")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=0, help="DuckDB threads (0 = all cores)")
+    args = parser.parse_args()
+
+    workdir = os.path.join(ROOT, "benchmarks", ".data")
+    os.makedirs(workdir, exist_ok=True)
+    db_path = prepare_database(workdir, args.scale, args.seed, False)
+    engine = DuckDBEngine(db_path, threads=args.threads or None)
+    engine.refresh(wait=True)
+    stats = engine.stats()
+    print(f"scale {args.scale:g}: DuckDB copy of {stats['rows']} rows loaded in {stats['load_seconds']:.2f}s")
+    router = EngineRouter(db_path, engine, "auto")
+
+    conn = sqlite3.connect(sqlite_uri(db_path), uri=True)
+    failures = 0
+    print(f"{'query':<20} {'sqlite':>10} {'duckdb':>10} {'speedup':>8}  auto    result")
+    for name, sql in QUERIES.items():
+        expected = pd.read_sql_query(sql, conn)
+        actual = engine.execute(sql)
+        try:
+            pd.testing.assert_frame_equal(expected, actual, check_dtype=False, rtol=1e-6)
+            status = "ok"
+        except AssertionError:
+            status = "MISMATCH"
+            failures += 1
+        sqlite_s = best_of(lambda: pd.read_sql_query(sql, conn), args.repeat)
+        duckdb_s = best_of(lambda: engine.execute_arrow(sql), args.repeat)
+        print(f"{name:<20} {sqlite_s * 1000:>8.1f}ms {duckdb_s * 1000:>8.1f}ms {sqlite_s / duckdb_s:>7.1f}x  "
+              f"{router.choose(sql):<7} {status}")
+    conn.close()
+    routing = EngineRouter(db_path, engine, "auto", min_rows=0)
+    for sql in SQLITE_ONLY:
+        if routing.choose(sql) != "sqlite":
+            print(f"routed to DuckDB: {sql}")
+            failures += 1
+    if failures:
+        raise SystemExit(f"{failures} queries returned different results")
+
+
+if __name__ == "__main__":
+    main()
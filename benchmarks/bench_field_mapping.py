@@ -0,0 +1,81 @@
+"""Micro-benchmark for the friendly label translation in ``field_mapping``.
+
+Compares the previous per-label ``str.replace`` loop with ``LabelTranslator``
+on a synthetic map of 10k labels, and per-row ``to_friendly`` with the
+column rename done by ``friendly_frame``::
+
+    python -m benchmarks.bench_field_mapping --labels 10000
+"""
+
+import argparse
+import random
+import timeit
+
+import pandas as pd
+
+from field_mapping import (
+    FRIENDLY_TO_TECH,
+    LabelTranslator,
+    friendly_frame,
+    to_friendly,
+)
+
+WORDS = ["satış", "ürün", "müşteri", "tarih", "toplam", "adet", "aylık", "stok", "maliyet", "gider"]
+
+
+def legacy_to_tech(question: str, mapping: dict) -> str:
+    """The original implementation: sort every call, replace every label."""
+    result = question
+    for friendly, tech in sorted(mapping.items(), key=lambda x: -len(x[0])):
+        result = result.replace(friendly, tech)
+    return result
+
+
+def synthetic_labels(count: int, seed: int = 1) -> dict:
+    """Return ``count`` multi-word labels plus the real label map."""
+    rng = random.Random(seed)
+    mapping = dict(FRIENDLY_TO_TECH)
+    while len(mapping) < count:
+        label = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {len(mapping)}"
+        mapping[label] = f"col_{len(mapping)}"
+    return mapping
+
+
+def best_of(stmt, number, repeat=5):
+    return min(timeit.repeat(stmt, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark label translation.")
+    parser.add_argument("--labels", type=int, default=10000)
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    mapping = synthetic_labels(args.labels)
+    question = "aylık toplam satış tutarı ürün id ve müşteri id bazında izin tipi ile tarih 2024 yılı için"
+    translator_build = best_of(lambda: LabelTranslator(mapping), number=3, repeat=3)
+    translator = LabelTranslator(mapping)
+    assert translator.translate("ürün id") == "urun_id"
+
+    legacy = best_of(lambda: legacy_to_tech(question, mapping), number=5)
+    compiled = best_of(lambda: translator.translate(question), number=2000)
+    print(f"labels={len(mapping)}")
+    print(f"  build translator   {translator_build * 1e3:10.2f} ms (once)")
+    print(f"  legacy to_tech     {legacy * 1e6:10.1f} us/call")
+    print(f"  LabelTranslator    {compiled * 1e6:10.1f} us/call  ({legacy / compiled:,.0f}x)")
+
+    df = pd.DataFrame({
+        "urun_id": range(args.rows),
+        "musteri_id": range(args.rows),
+        "tarih": ["2024-01-01"] * args.rows,
+        "toplam_fiyat": [1.5] * args.rows,
+    })
+    per_row = best_of(lambda: [to_friendly(r) for r in df.to_dict(orient="records")], number=3)
+    frame = best_of(lambda: friendly_frame(df).to_dict(orient="records"), number=3)
+    print(f"rows={args.rows}")
+    print(f"  to_friendly per row {per_row * 1e3:9.2f} ms")
+    print(f"  friendly_frame      {frame * 1e3:9.2f} ms  ({per_row / frame:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Bytes read and time of time-range aggregates on SQLite and the Parquet mirror.
+
+The generated demo database is mirrored with ``parquet_mirror.ParquetMirror``
+(a full sync, then an incremental one after new rows were appended to a copy).
+Each query aggregates a few columns of a fact table over a date range; it
+runs on SQLite and on ``engines.DuckDBEngine`` reading the mirror, and the
+results are compared. The bytes column compares the pages of the table in
+SQLite (``dbstat``) with the compressed column chunks of the months the
+mirror has to read::
+
+    python -m benchmarks.bench_mirror --scale 10
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import time
+
+import pandas as pd
+
+from benchmarks.bench_e2e import ROOT, prepare_database
+from benchmarks.bench_engines import best_of
+from db_pool import sqlite_uri
+from engines import DuckDBEngine
+from parquet_mirror import ParquetMirror
+
+# (table, columns, start, end, sql)
+QUERIES = [
+    ("Satislar", ["tarih", "toplam_fiyat"], "2024-01-01", "2025-01-01",
+     "SELECT SUM(toplam_fiyat) AS ciro FROM Satislar WHERE tarih >= '2024-01-01' AND tarih < '2025-01-01'"),
+    ("Satislar", ["tarih", "urun_id", "adet"], "2023-01-01", "2026-01-01",
+     "SELECT urun_id, SUM(adet) AS adet FROM Satislar WHERE tarih >= '2023-01-01' AND tarih < '2026-01-01' "
+     "GROUP BY urun_id ORDER BY urun_id"),
+    ("Uretim", ["tarih", "adet", "hata_sayisi"], "2025-01-01", "2025-04-01",
+     "SELECT SUM(hata_sayisi) * 1.0 / SUM(adet) AS oran FROM Uretim WHERE tarih >= '2025-01-01' AND tarih < '2025-04-01'"),
+    ("Finans", ["tarih", "tip", "tutar"], "2022-01-01", "2027-01-01",
+     "SELECT tip, SUM(tutar) AS tutar FROM Finans WHERE tarih >= '2022-01-01' AND tarih < '2027-01-01' "
+     "GROUP BY tip ORDER BY tip"),
+]
+
+
+def sqlite_bytes(conn, table: str) -> int:
+    return conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (table,)).fetchone()[0]
+
+
+def mirror_bytes(mirror: ParquetMirror, table: str, columns, start: str, end: str) -> int:
+    """Compressed size of ``columns`` in the months ``[start, end)`` overlaps."""
+    import pyarrow.parquet as pq
+
+    total = 0
+    for month, files in mirror.parts(table).items():
+        if not start[:7] <= month <= end[:7]:
+            continue
+        for path in files:
+            meta = pq.ParquetFile(path).metadata
+            for g in range(meta.num_row_groups):
+                group = meta.row_group(g)
+                for c in range(group.num_columns):
+                    chunk = group.column(c)
+                    if chunk.path_in_schema in columns:
+                        total += chunk.total_compressed_size
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SQLite and the Parquet mirror on range aggregates.")
+    parser.add_argument("--scale", type=float, default=10.0, help="scale of the generated demo database")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = os.path.join(ROOT, "benchmarks", ".data")
+    os.makedirs(workdir, exist_ok=True)
+    source = prepare_database(workdir, args.scale, args.seed, False)
+    db_path = os.path.join(workdir, f"mirror_{os.path.basename(source)}")
+    root = db_path + ".parquet"
+    shutil.copyfile(source, db_path)
+    shutil.rmtree(root, ignore_errors=True)
+
+    mirror = ParquetMirror(root)
+    stats = mirror.sync(db_path)
+    print(f"full sync: {sum(stats['rows'].values())} rows in {stats['seconds']:.2f}s")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO Satislar (urun_id, musteri_id, calisan_id, tarih, adet, birim, toplam_fiyat, "
+                     "para_birimi) SELECT urun_id, musteri_id, calisan_id, date(tarih, '+1 day'), adet, birim, "
+                     "toplam_fiyat, para_birimi FROM Satislar ORDER BY id DESC LIMIT 1000")
+    stats = mirror.sync(db_path)
+    print(f"incremental sync: {sum(stats['rows'].values())} rows in {stats['seconds']:.2f}s")
+
+    engine = DuckDBEngine(db_path, mirror=mirror)
+    engine.refresh(wait=True)
+    conn = sqlite3.connect(sqlite_uri(db_path), uri=True)
+    failures = 0
+    print(f"{'table':<10} {'range':<23} {'sqlite':>9} {'mirror':>9} {'bytes':>7} {'sqlite':>9} {'mirror':>9}  result")
+    for table, columns, start, end, sql in QUERIES:
+        expected = pd.read_sql_query(sql, conn)
+        try:
+            pd.testing.assert_frame_equal(expected, engine.execute(sql), check_dtype=False, rtol=1e-6)
+            status = "ok"
+        except AssertionError:
+            status = "MISMATCH"
+            failures += 1
+        full = sqlite_bytes(conn, table)
+        read = mirror_bytes(mirror, table, columns, start, end)
+        sqlite_s = best_of(lambda: conn.execute(sql).fetchall(), args.repeat)
+        mirror_s = best_of(lambda: engine.execute_arrow(sql), args.repeat)
+        print(f"{table:<10} {start}..{end} {full / 1e6:>7.2f}MB {read / 1e6:>7.2f}MB {read / full:>6.1%} "
+              f"{sqlite_s * 1000:>7.1f}ms {mirror_s * 1000:>7.1f}ms  {status}")
+    start = time.perf_counter()
+    scanned = mirror.scan("Satislar", ["toplam_fiyat"], "2024-01-01", "2025-01-01")
+    print(f"ParquetMirror.scan of one year of Satislar.toplam_fiyat: {scanned.num_rows} rows in "
+          f"{(time.perf_counter() - start) * 1000:.1f}ms")
+    conn.close()
+    if failures:
+        raise SystemExit(f"{failures} queries returned different results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Compare prompt size with the full schema and with schema retrieval.
+
+For each question the prompt built by ``nl2sql_app.build_messages`` is
+measured once with the full ``get_schema()`` text and once with the tables
+selected by ``SchemaIndex``. ``--extra-tables`` adds synthetic tables to
+simulate a large warehouse. With ``--live`` both prompts are also sent to the
+configured OpenAI model and the round-trip latency is reported::
+
+    python -m benchmarks.bench_prompt_size --extra-tables 300
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+import nl2sql_app
+from db_pool import sqlite_uri
+from field_mapping import to_tech
+from schema_index import SchemaIndex
+
+QUESTIONS = [
+    "aylara göre toplam satış",
+    "en çok satan 10 ürün",
+    "departmanlara göre çalışan sayısı",
+    "müşteri lokasyonlarına göre satış adedi",
+    "ürün bazında kar ve smm",
+    "izin tipine göre toplam gün",
+    "tedarikçilerden satın alma tutarı",
+    "vardiya bazında hata sayısı",
+    "en yüksek maaşlı 5 çalışan",
+    "stok devir hızı",
+]
+
+
+def count_tokens(text: str) -> int:
+    """Return the token count of ``text`` (tiktoken if installed, else ~4 chars/token)."""
+    try:
+        import tiktoken
+
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except ImportError:
+        return len(text) // 4
+
+
+def synthetic_tables(count: int) -> list:
+    """Return ``count`` unrelated tables resembling a warehouse schema."""
+    return [
+        {
+            "name": f"Depo{i:04d}Kayit",
+            "columns": [
+                {"name": "id", "type": "INTEGER"},
+                {"name": f"alan_{i}_kod", "type": "TEXT"},
+                {"name": f"olcum_{i}_deger", "type": "REAL"},
+                {"name": "kayit_zamani", "type": "DATE"},
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def prompt_tokens(question, schema_text):
+    messages = nl2sql_app.build_messages(question, schema_text)
+    return sum(count_tokens(m["content"]) for m in messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure prompt size with schema retrieval.")
+    parser.add_argument("--db", default=nl2sql_app.DB_PATH)
+    parser.add_argument("--extra-tables", type=int, default=0)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="also time real LLM calls")
+    args = parser.parse_args()
+
+    with sqlite3.connect(sqlite_uri(args.db), uri=True) as conn:
+        details = nl2sql_app.get_schema_details(conn.cursor())
+    details = {"tables": details["tables"] + synthetic_tables(args.extra_tables)}
+    index = SchemaIndex(details)
+    full_schema = index.schema_text(index.tables)
+
+    if args.live:
+        import openai
+
+        load_dotenv()
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        model = os.getenv("OPENAI_MODEL", "gpt-4-turbo")
+
+    rows = []
+    for q in QUESTIONS:
+        question = to_tech(nl2sql_app.normalize_turkish_text(q))
+        start = time.perf_counter()
+        reduced = index.schema_for(question, args.top_k, fallback=full_schema)
+        select_ms = (time.perf_counter() - start) * 1000
+        row = {
+            "question": q,
+            "tables": len(index.select(question, args.top_k)) or len(index.tables),
+            "full": prompt_tokens(question, full_schema),
+            "reduced": prompt_tokens(question, reduced),
+            "select_ms": select_ms,
+        }
+        if args.live:
+            for key, text in (("full_s", full_schema), ("reduced_s", reduced)):
+                start = time.perf_counter()
+                nl2sql_app.ask_llm(question, text, model)
+                row[key] = time.perf_counter() - start
+        rows.append(row)
+
+    print(f"tables in schema: {len(index.tables)}")
+    header = f"{'full':>7} {'reduced':>7} {'tables':>6} {'select':>8}"
+    if args.live:
+        header += f" {'full s':>7} {'red. s':>7}"
+    print(header + "  question")
+    for r in rows:
+        line = f"{r['full']:>7} {r['reduced']:>7} {r['tables']:>6} {r['select_ms']:>6.2f}ms"
+        if args.live:
+            line += f" {r['full_s']:>7.2f} {r['reduced_s']:>7.2f}"
+        print(line + f"  {r['question']}")
+    full = statistics.mean(r["full"] for r in rows)
+    reduced = statistics.mean(r["reduced"] for r in rows)
+    print(f"mean prompt tokens: full={full:.0f} reduced={reduced:.0f} ({1 - reduced / full:.0%} smaller)")
+    if args.live:
+        print(f"mean latency: full={statistics.mean(r['full_s'] for r in rows):.2f}s "
+              f"reduced={statistics.mean(r['reduced_s'] for r in rows):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Local SQL repair on misspelt corpus statements.
+
+Every table and column name in the corpus SQL is misspelt in a few typical
+ways (Turkish letters, a dropped or swapped letter, a singular table name)
+one at a time. ``sql_repair.repair`` then has to make the statement compile
+again. A repair counts as ``ok`` when the result matches the original
+statement and ``wrong`` when it compiles to something else. Statements it
+leaves broken would go to the LLM repair request; misspelt ``_id`` columns
+and swapped letters in short names always do::
+
+    python -m benchmarks.bench_repair --scale 1
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+
+from benchmarks.bench_e2e import ROOT, prepare_database
+from benchmarks.fake_llm import load_corpus
+from db_pool import sqlite_uri
+from schema_registry import registry_for
+from sql_repair import repair
+
+_TURKISH = str.maketrans("cgiosuCGIOSU", "çğıöşüÇĞİÖŞÜ")
+
+
+def misspellings(name: str) -> list:
+    """Return typical misspellings of the identifier ``name``."""
+    variants = {name.translate(_TURKISH)}
+    if len(name) >= 5:
+        middle = len(name) // 2
+        variants.add(name[:middle] + name[middle + 1:])
+        variants.add(name[:middle] + name[middle + 1] + name[middle] + name[middle + 2:])
+    for suffix in ("lar", "ler"):
+        if name.endswith(suffix) and len(name) > len(suffix) + 3:
+            variants.add(name[:-len(suffix)])
+    variants.discard(name)
+    return sorted(variants)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure local repair of misspelt SQL.")
+    parser.add_argument("--scale", type=float, default=1.0, help="scale of the generated demo database")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = os.path.join(ROOT, "benchmarks", ".data")
+    os.makedirs(workdir, exist_ok=True)
+    db_path = prepare_database(workdir, args.scale, args.seed, False)
+    conn = sqlite3.connect(sqlite_uri(db_path), uri=True)
+    details = registry_for(conn).snapshot(conn).details
+    names = {t["name"] for t in details["tables"]} | {c["name"] for t in details["tables"] for c in t["columns"]}
+
+    outcomes = Counter()
+    seconds = []
+    for entry in load_corpus():
+        sql = entry["answer"]["sql"]
+        expected = conn.execute(sql).fetchall()
+        used = {n for n in names if re.search(rf"\b{re.escape(n)}\b", sql)}
+        for name in sorted(used):
+            for variant in misspellings(name):
+                broken = re.sub(rf"\b{re.escape(name)}\b", variant, sql)
+                start = time.perf_counter()
+                fixed, error, _ = repair(conn, broken, details)
+                seconds.append(time.perf_counter() - start)
+                if error is not None:
+                    outcomes["llm"] += 1
+                elif conn.execute(fixed).fetchall() == expected:
+                    outcomes["ok"] += 1
+                else:
+                    outcomes["wrong"] += 1
+                    print(f"wrong: {broken!r} -> {fixed!r}")
+    total = sum(outcomes.values())
+    seconds.sort()
+    print(f"{total} misspelt statements: {outcomes['ok']} repaired locally ({outcomes['ok'] / total:.0%}), "
+          f"{outcomes['llm']} left for the LLM, {outcomes['wrong']} wrong")
+    print(f"repair time p50 {seconds[len(seconds) // 2] * 1000:.2f}ms  "
+          f"p95 {seconds[int(len(seconds) * 0.95)] * 1000:.2f}ms")
+    if outcomes["wrong"]:
+        raise SystemExit(f"{outcomes['wrong']} statements were repaired to different results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Sharded execution benchmark and correctness check.
+
+The generated demo database is split into ``--shards`` files: tables with a
+``tarih`` column (sales, production, purchases, ...) are partitioned by
+``rowid``, all other tables are copied to every shard. Every corpus query
+then runs on the single database and on the ``shards.ShardSet`` and the
+results are compared after sorting, since shards may return equal rows in a
+different order. Queries whose ``LIMIT`` cuts through ties in the ``ORDER BY``
+may legitimately pick different rows and are reported as ``ties``::
+
+    python -m benchmarks.bench_shards --scale 1 --shards 4
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import time
+
+import pandas as pd
+
+from benchmarks.bench_e2e import ROOT, prepare_database
+from benchmarks.fake_llm import load_corpus
+from shards import ShardSet
+from db_pool import sqlite_uri
+
+EXTRA_QUERIES = [
+    "SELECT COUNT(*) AS adet, AVG(adet) AS ortalama, MIN(tarih) AS ilk, MAX(tarih) AS son FROM Uretim",
+    "SELECT vardiya, AVG(hata_sayisi) AS ortalama FROM Uretim GROUP BY vardiya HAVING COUNT(*) > 10 ORDER BY 2 DESC",
+    "SELECT DISTINCT tip FROM Finans ORDER BY tip",
+    # Names that look like the merge placeholders of partial aggregates
+    "SELECT urun_id, SUM(adet) AS p1, 'p0' AS etiket FROM Satislar GROUP BY urun_id ORDER BY p1 DESC, urun_id LIMIT 5",
+    "SELECT COUNT(DISTINCT musteri_id) AS musteri FROM Satislar",
+    "SELECT urun_id, SUM(adet) AS adet FROM Satislar WHERE adet > (SELECT AVG(adet) FROM Satislar) GROUP BY urun_id",
+]
+
+
+def split_database(path: str, count: int, workdir: str) -> list:
+    """Write ``count`` shards of ``path`` and return their paths."""
+    with sqlite3.connect(path) as conn:
+        partitioned = [
+            name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+            if any(col[1] == "tarih" for col in conn.execute(f'PRAGMA table_info("{name}")'))
+        ]
+    base = os.path.splitext(os.path.basename(path))[0]
+    paths = []
+    for i in range(count):
+        shard = os.path.join(workdir, f"{base}_shard_{i}_of_{count}.db")
+        if not os.path.exists(shard):
+            tmp = shard + ".tmp"
+            shutil.copyfile(path, tmp)
+            with sqlite3.connect(tmp) as conn:
+                conn.execute("PRAGMA journal_mode=DELETE")
+                for table in partitioned:
+                    conn.execute(f'DELETE FROM "{table}" WHERE rowid % ? != ?', (count, i))
+                conn.commit()
+                conn.execute("VACUUM")
+            os.replace(tmp, shard)
+        paths.append(shard)
+    return paths
+
+
+def best_of(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def same_rows(a, b) -> bool:
+    if list(a.columns) != list(b.columns) or len(a) != len(b):
+        return False
+    a = a.sort_values(list(a.columns), ignore_index=True)
+    b = b.sort_values(list(b.columns), ignore_index=True)
+    try:
+        pd.testing.assert_frame_equal(a, b, check_dtype=False, rtol=1e-9)
+        return True
+    except AssertionError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single database and sharded execution.")
+    parser.add_argument("--scale", type=float, default=1.0, help="scale of the generated demo database")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = os.path.join(ROOT, "benchmarks", ".data")
+    os.makedirs(workdir, exist_ok=True)
+    db_path = prepare_database(workdir, args.scale, args.seed, False)
+    shard_set = ShardSet(split_database(db_path, args.shards, workdir))
+    print(f"{args.shards} shards, replicated: {', '.join(sorted(shard_set.replicated))}")
+
+    single = sqlite3.connect(sqlite_uri(db_path), uri=True, check_same_thread=False)
+    queries = [e["answer"]["sql"] for e in load_corpus()] + EXTRA_QUERIES
+    failures = 0
+    for sql in queries:
+        plan = shard_set.plan(sql)
+        expected = pd.read_sql_query(sql, single)
+        actual = shard_set.execute(sql)
+        if same_rows(expected, actual):
+            status = "ok"
+        elif "LIMIT" in sql.upper() and len(expected) == len(actual):
+            status = "ties"
+        else:
+            status = "MISMATCH"
+            failures += 1
+        single_s = best_of(lambda: pd.read_sql_query(sql, single), args.repeat)
+        sharded_s = best_of(lambda: shard_set.execute(sql), args.repeat)
+        print(f"{status:<8} {plan.kind:<6} single {single_s * 1000:>8.2f}ms  sharded {sharded_s * 1000:>8.2f}ms  "
+              f"{sql[:70]}")
+    print(f"plans: {shard_set.stats()['plans']}")
+    if failures:
+        raise SystemExit(f"{failures} queries returned different results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Startup time benchmark and import budget check.
+
+Two things are measured:
+
+1. the cumulative ``python -X importtime`` cost of importing ``nl2sql_app``
+   and ``api_server`` in a fresh interpreter (best of ``--repeat`` runs),
+   plus the heavy modules each import pulls in;
+2. for the API server, the time from spawning ``uvicorn`` until it answers
+   and the latency of the first ``/api/query`` afterwards, once with
+   ``STARTUP_PREWARM=1`` and once with ``STARTUP_PREWARM=0``.
+
+The import numbers are checked against ``benchmarks/startup_budgets.json``;
+the command exits with status 1 when a budget is exceeded or a module listed
+under ``forbidden`` is imported, so it can guard CI::
+
+    python -m benchmarks.bench_startup --no-server
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.bench_e2e import ROOT, prepare_database, start_server, wait_ready
+from benchmarks.fake_llm import FakeLLMServer, load_corpus
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), "startup_budgets.json")
+HEAVY_MODULES = ["pandas", "numpy", "openai", "matplotlib", "pyarrow"]
+
+
+def import_env(db_path: str | None = None) -> dict:
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark")}
+    if db_path:
+        env["NL2SQL_DB_PATH"] = db_path
+    return env
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Return ``{module: (self_us, cumulative_us)}`` from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if not parts[0].isdigit():
+            continue
+        modules[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+    return modules
+
+
+def import_profile(module: str, repeat: int, env: dict) -> dict:
+    """Import ``module`` in ``repeat`` fresh interpreters and keep the fastest run."""
+    code = (f"import json, sys; import {module}; "
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        modules = parse_importtime(out.stderr)
+        total = modules[module][1]
+        if best is None or total < best["total_us"]:
+            best = {"total_us": total, "modules": modules, "heavy": json.loads(out.stdout.strip().splitlines()[-1])}
+    top = sorted(best["modules"].items(), key=lambda item: item[1][0], reverse=True)[:10]
+    return {
+        "import_ms": round(best["total_us"] / 1000, 1),
+        "heavy_modules": best["heavy"],
+        "top_self_ms": {name: round(us / 1000, 1) for name, (us, _) in top},
+    }
+
+
+def check_budgets(results: dict, budgets: dict) -> list:
+    """Return the budget violations of ``results`` as messages."""
+    problems = []
+    for module, limit in budgets.get("import_ms", {}).items():
+        if module in results and results[module]["import_ms"] > limit:
+            problems.append(f"{module}: import took {results[module]['import_ms']}ms, budget {limit}ms")
+    for module, names in budgets.get("forbidden", {}).items():
+        loaded = sorted(set(names) & set(results.get(module, {}).get("heavy_modules", [])))
+        if loaded:
+            problems.append(f"{module}: imports {', '.join(loaded)} at load time")
+    return problems
+
+
+def server_startup(db_path: str, llm: FakeLLMServer, question: str, port: int, prewarm: bool) -> dict:
+    """Return time to readiness and first query latency of a fresh API server."""
+    env = {"STARTUP_PREWARM": "1" if prewarm else "0", "RESULT_CACHE_ENABLED": "0"}
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = start_server(db_path, llm.url, port, env)
+    try:
+        wait_ready(url, proc)
+        ready = time.perf_counter() - start
+        begin = time.perf_counter()
+        httpx.post(f"{url}/api/query", json={"question": question}, timeout=120).raise_for_status()
+        first = time.perf_counter() - begin
+        begin = time.perf_counter()
+        httpx.post(f"{url}/api/query", json={"question": question}, timeout=120).raise_for_status()
+        second = time.perf_counter() - begin
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {
+        "prewarm": prewarm,
+        "ready_s": round(ready, 3),
+        "first_query_ms": round(first * 1000, 1),
+        "second_query_ms": round(second * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and API server startup time.")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per import measurement")
+    parser.add_argument("--budgets", default=BUDGETS_PATH)
+    parser.add_argument("--no-server", action="store_true", help="only measure and check the imports")
+    parser.add_argument("--scale", type=float, default=0.1, help="scale of the generated demo database")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", help="optional result JSON file")
+    args = parser.parse_args()
+
+    with open(args.budgets, "r", encoding="utf-8") as f:
+        budgets = json.load(f)
+    workdir = os.path.join(ROOT, "benchmarks", ".data")
+    os.makedirs(workdir, exist_ok=True)
+    db_path = prepare_database(workdir, args.scale, 42, False)
+
+    result = {"imports": {}, "server": []}
+    for module in ("nl2sql_app", "api_server"):
+        stats = result["imports"][module] = import_profile(module, args.repeat, import_env(db_path))
+        print(f"{module:<12} import {stats['import_ms']:>8.1f}ms  heavy: {', '.join(stats['heavy_modules']) or '-'}")
+        for name, ms in list(stats["top_self_ms"].items())[:5]:
+            print(f"    {name:<40} {ms:>7.1f}ms")
+
+    if not args.no_server:
+        corpus = load_corpus()
+        llm = FakeLLMServer(corpus).start()
+        try:
+            for prewarm in (True, False):
+                run = server_startup(db_path, llm, corpus[0]["question"], args.port, prewarm)
+                result["server"].append(run)
+                print(f"server prewarm={int(prewarm)}  ready {run['ready_s']:.2f}s  "
+                      f"first query {run['first_query_ms']}ms  second {run['second_query_ms']}ms")
+        finally:
+            llm.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    problems = check_budgets(result["imports"], budgets)
+    for problem in problems:
+        print(f"BUDGET EXCEEDED {problem}")
+    if problems:
+        sys.exit(1)
+    print("All startup budgets met.")
+
+
+if __name__ == "__main__":
+    main()
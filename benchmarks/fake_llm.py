@@ -0,0 +1,203 @@
+"""Deterministic local stand-in for the OpenAI chat completions endpoint.
+
+Answers are replayed from a corpus of recorded ``{"question", "answer"}``
+pairs (``benchmarks/corpus.json`` by default). The question is read from the
+``Question:`` line of the last user message and matched after the same
+normalisation the API applies, so benchmarks run without network access and
+always receive the same SQL. Unknown questions get an ``error`` answer.
+
+Requests with ``"stream": true`` are answered as server-sent events, one
+``TOKEN_CHARS`` piece of the answer per chunk, ``token_latency`` seconds
+apart, the way the real API streams tokens.
+
+Point the API server at it with ``OPENAI_BASE_URL``::
+
+    python -m benchmarks.fake_llm --port 8400 --latency-ms 300 --token-ms 20
+    OPENAI_BASE_URL=http://127.0.0.1:8400/v1 OPENAI_API_KEY=x python api_server.py
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from field_mapping import to_tech
+from nl2sql_app import normalize_turkish_text
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus.json")
+
+# Characters per streamed chunk, roughly one token
+TOKEN_CHARS = 4
+
+
+def load_corpus(path: str = CORPUS_PATH) -> list:
+    """Return the recorded question/answer pairs from ``path``."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def question_key(question: str) -> str:
+    """Return the form of ``question`` that appears in the prompt."""
+    return to_tech(normalize_turkish_text(question))
+
+
+def prompt_question(messages) -> str:
+    """Return the question from the last user message of a chat request."""
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content") or ""
+            marker = content.rfind("Question:")
+            return content[marker + len("Question:"):].strip() if marker >= 0 else content.strip()
+    return ""
+
+
+def completion(content: str, model: str) -> dict:
+    """Return a chat completion response body carrying ``content``."""
+    return {
+        "id": "chatcmpl-benchmark",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def completion_chunk(content: str | None, model: str) -> dict:
+    """Return one streamed chunk; ``None`` ends the answer."""
+    delta = {"content": content} if content is not None else {}
+    return {
+        "id": "chatcmpl-benchmark",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": None if content is not None else "stop"}],
+    }
+
+
+class FakeLLMServer:
+    """Serve recorded answers on ``/v1/chat/completions`` from a thread.
+
+    ``latency`` seconds are slept before every answer to model the network
+    round-trip of the real API, ``token_latency`` per ``TOKEN_CHARS`` of the
+    answer to model its generation.
+    """
+
+    def __init__(self, corpus: list, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0,
+                 token_latency: float = 0.0):
+        self.answers = {question_key(e["question"]): json.dumps(e["answer"], ensure_ascii=False) for e in corpus}
+        self.latency = latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def answer(self, messages) -> str:
+        question = prompt_question(messages)
+        with self._lock:
+            self.requests += 1
+        content = self.answers.get(question)
+        if content is None:
+            content = json.dumps({"error": f"Kayıtlı yanıt yok: {question}"}, ensure_ascii=False)
+        return content
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if server.latency:
+                    time.sleep(server.latency)
+                content = server.answer(request.get("messages", []))
+                if request.get("stream"):
+                    self.stream(content, request.get("model", "fake"))
+                    return
+                if server.token_latency:
+                    # The whole answer is generated before it is sent
+                    time.sleep(server.token_latency * -(-len(content) // TOKEN_CHARS))
+                body = json.dumps(completion(content, request.get("model", "fake")), ensure_ascii=False)
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def stream(self, content, model):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                pieces = [content[i:i + TOKEN_CHARS] for i in range(0, len(content), TOKEN_CHARS)]
+                try:
+                    for piece in pieces + [None]:
+                        data = json.dumps(completion_chunk(piece, model), ensure_ascii=False)
+                        self.send_chunk(f"data: {data}\n\n".encode("utf-8"))
+                        if piece is not None and server.token_latency:
+                            time.sleep(server.token_latency)
+                    self.send_chunk(b"data: [DONE]\n\n")
+                    self.send_chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # the client stopped reading
+
+            def send_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded LLM answers locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay before every answer")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="delay between streamed chunks")
+    args = parser.parse_args()
+    server = FakeLLMServer(load_corpus(args.corpus), args.latency_ms / 1000, args.host, args.port,
+                           args.token_ms / 1000)
+    print(f"Fake LLM listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
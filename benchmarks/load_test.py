@@ -0,0 +1,108 @@
+"""Concurrent load test for the ``/api/query`` endpoint.
+
+Sends the same set of questions from 1, 10 and 50 concurrent clients (by
+default) and prints requests per second and latency percentiles for each
+level.  The API server must already be running::
+
+    python api_server.py
+    python -m benchmarks.load_test --url http://localhost:8000 --requests 200
+
+Use ``LLM_CACHE_ENABLED=0`` on the server to measure the full LLM round-trip
+instead of cache hits.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+DEFAULT_QUESTIONS = [
+    "aylara göre toplam satış",
+    "en çok satan 10 ürün",
+    "departmanlara göre çalışan sayısı",
+    "müşteri lokasyonlarına göre satış adedi",
+    "yıllara göre üretim adedi ve hata sayısı",
+]
+
+
+def percentile(values, pct):
+    """Return the ``pct`` percentile of ``values`` using nearest rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+async def run_level(url, questions, concurrency, total, timeout):
+    """Send ``total`` requests with ``concurrency`` clients and return stats."""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker(client):
+        nonlocal errors
+        for i in counter:
+            payload = {"question": questions[i % len(questions)]}
+            start = time.perf_counter()
+            try:
+                res = await client.post(f"{url}/api/query", json=payload)
+                if res.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else 0.0,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--levels", default="1,10,50", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per level")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--questions", help="optional JSON file with a list of questions")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = json.load(f)
+
+    results = []
+    for level in (int(x) for x in args.levels.split(",")):
+        stats = asyncio.run(run_level(args.url, questions, level, args.requests, args.timeout))
+        results.append(stats)
+        print(
+            f"concurrency={stats['concurrency']:>3}  rps={stats['rps']:>8}  "
+            f"p50={stats['p50_ms']}ms  p95={stats['p95_ms']}ms  p99={stats['p99_ms']}ms  "
+            f"errors={stats['errors']}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
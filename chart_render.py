@@ -0,0 +1,303 @@
+"""Chart rendering for the CLI and batch reports.
+
+Charts are drawn with matplotlib's object API (``Figure`` and ``Axes``) on
+the Agg backend, without pyplot and its global figure state. The caller
+reduces the result with ``downsample.reduce_for_visual`` and turns the
+columns a visual uses into NumPy arrays. Multi-series bars are offset per
+series and lines are drawn one array at a time, so the frame is never melted
+into long form. Only those arrays are sent to a pool of worker processes,
+which import matplotlib once and draw PNG or SVG images in parallel.
+
+Images are cached in memory, keyed by a hash of the result rows and the
+visual spec (type, columns, format, size), so a repeated question or a
+report drawing the same chart twice does not render it again. Identical
+charts requested while one is still rendering share that render.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CHART_TYPES = ("bar", "line", "scatter", "pie")
+FORMATS = ("png", "svg")
+# At most this many category labels are written on the x axis
+MAX_TICKS = 30
+
+
+def _init_worker():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    # Importing the figure module up front keeps it out of the first render
+    import matplotlib.figure  # noqa: F401
+
+
+def _ticks(ax, labels):
+    positions = np.arange(len(labels))
+    step = max(1, -(-len(labels) // MAX_TICKS))
+    ax.set_xticks(positions[::step], [str(v) for v in labels[::step]], rotation=45, ha="right")
+    return positions
+
+
+def _margins(fig, ax) -> None:
+    # Fixed margins sized from the longest tick label; a tight layout would
+    # draw the whole figure once more just to measure it
+    labels = [t.get_text() for t in ax.get_xticklabels()]
+    longest = max(map(len, labels), default=0)
+    fig.subplots_adjust(left=0.1, right=0.97, top=0.93, bottom=min(0.45, 0.11 + 0.006 * longest))
+
+
+def draw(chart: dict, fmt: str = "png", dpi: int = 100, size=(10, 6)) -> bytes:
+    """Return the image of ``chart`` (see ``chart_data``) as ``fmt`` bytes.
+
+    Runs in the worker processes but works in any process.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=size, dpi=dpi)
+    ax = fig.add_subplot()
+    kind, x, series = chart["type"], chart["x"], chart["series"]
+    if kind == "pie":
+        name, values = series[0]
+        ax.pie(np.nan_to_num(values), labels=[str(v) for v in x], autopct="%1.0f%%")
+        ax.set_title(name)
+    else:
+        ax.grid(axis="y", alpha=0.3)
+        ax.set_axisbelow(True)
+        if kind == "bar":
+            positions = _ticks(ax, x)
+            width = 0.8 / len(series)
+            for i, (name, values) in enumerate(series):
+                ax.bar(positions + (i - (len(series) - 1) / 2) * width, values, width, label=name)
+        elif kind == "line":
+            positions = x if x.dtype.kind in "fiuM" else _ticks(ax, x)
+            for name, values in series:
+                ax.plot(positions, values, marker="o" if len(values) <= 100 else None, label=name)
+        else:
+            sizes = chart.get("sizes")
+            if sizes is not None:
+                sizes = 10 + 90 * sizes / sizes.max()
+            ax.scatter(x, series[0][1], s=sizes, alpha=0.7)
+        ax.set_xlabel(chart["x_label"] or "")
+        if len(series) > 1:
+            ax.legend()
+        else:
+            ax.set_ylabel(series[0][0])
+        _margins(fig, ax)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def result_hash(df) -> str:
+    """Return a hash of the column names and rows of ``df``."""
+    import pandas as pd
+
+    digest = hashlib.sha256("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def chart_data(df, visual: dict):
+    """Return the arrays ``draw`` needs for ``visual`` or ``None`` for tables.
+
+    Charts whose columns are missing or not numeric are ``None`` as well.
+    """
+    import pandas as pd
+
+    from downsample import COUNT_COLUMN, reduce_for_visual
+
+    kind = visual.get("type", "table")
+    x, y = visual.get("x"), visual.get("y")
+    if kind not in CHART_TYPES or df.empty:
+        return None
+    ys = [c for c in (y if isinstance(y, (list, tuple)) else [y]) if isinstance(c, str) and c in df.columns]
+    if not ys or not all(pd.api.types.is_numeric_dtype(df[c]) for c in ys):
+        return None
+    if kind == "scatter" and (x not in df.columns or not pd.api.types.is_numeric_dtype(df[x])):
+        return None
+    df, info = reduce_for_visual(df, kind, x, ys)
+    if info:
+        logger.info("Plotting %s of %s rows (%s)", info["points"], info["rows"], info["method"])
+    if x in df.columns:
+        labels = df[x].to_numpy()
+        if labels.dtype == object:
+            labels = labels.astype(str)
+    else:
+        x, labels = None, np.arange(len(df))
+    return {
+        "type": kind,
+        "x_label": x,
+        "x": labels,
+        "series": [(c, df[c].to_numpy(dtype=float)) for c in ys[: 1 if kind in ("pie", "scatter") else None]],
+        "sizes": df[COUNT_COLUMN].to_numpy(dtype=float) if kind == "scatter" and COUNT_COLUMN in df else None,
+    }
+
+
+class ChartRenderer:
+    """Render charts in worker processes and cache the images, see the module docs.
+
+    The pool starts with the first render; ``max_bytes`` bounds the cache.
+    """
+
+    def __init__(self, workers: int | None = None, max_bytes: int = 32 * 2**20, dpi: int = 100, size=(10, 6)):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_bytes = max_bytes
+        self.dpi = dpi
+        self.size = tuple(size)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._entries = OrderedDict()
+        self._pending = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.renders = 0
+        self.render_seconds = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: workers do not inherit the caller's threads or connections
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+            )
+        return self._executor
+
+    def key(self, digest: str, visual: dict, fmt: str) -> str:
+        spec = {"type": visual.get("type"), "x": visual.get("x"), "y": visual.get("y"),
+                "format": fmt, "dpi": self.dpi, "size": self.size}
+        text = digest + json.dumps(spec, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _store(self, key: str, image: bytes) -> None:
+        if len(image) > self.max_bytes:
+            return
+        self._entries[key] = image
+        self.bytes += len(image)
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+
+    def submit(self, df, visual: dict, fmt: str = "png", digest: str | None = None) -> Future:
+        """Start rendering ``visual`` of ``df``; the future's result is the image.
+
+        The result is ``None`` for tables and charts that cannot be drawn.
+        ``digest`` is ``result_hash(df)`` when the caller already has it.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Desteklenmeyen grafik formatı: {fmt}")
+        key = self.key(digest or result_hash(df), visual, fmt)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            pending = self._pending.get(key)
+        if image is not None:
+            future = Future()
+            future.set_result(image)
+            return future
+        if pending is not None:
+            return pending
+        chart = chart_data(df, visual)
+        if chart is None:
+            future = Future()
+            future.set_result(None)
+            return future
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                return pending
+            self.misses += 1
+            start = time.perf_counter()
+            future = self._pool().submit(draw, chart, fmt, self.dpi, self.size)
+            self._pending[key] = future
+
+        def done(f):
+            with self._lock:
+                self._pending.pop(key, None)
+                if not f.cancelled() and f.exception() is None:
+                    self.renders += 1
+                    self.render_seconds += time.perf_counter() - start
+                    self._store(key, f.result())
+
+        future.add_done_callback(done)
+        return future
+
+    def render(self, df, visual: dict, fmt: str = "png") -> bytes | None:
+        """Render one chart and wait for it."""
+        return self.submit(df, visual, fmt).result()
+
+    def export(self, items, directory: str, fmt: str = "png") -> list:
+        """Write the charts of ``items`` to ``directory`` and return their paths.
+
+        ``items`` are ``(name, frame, visuals)`` tuples, e.g. the answers of a
+        batch. Every chart is submitted before the first one is awaited, so
+        they render in parallel; files are named ``<name>_<n>_<type>.<fmt>``.
+        """
+        os.makedirs(directory, exist_ok=True)
+        jobs = []
+        for name, df, visuals in items:
+            digest = result_hash(df)
+            for i, visual in enumerate(visuals, 1):
+                future = self.submit(df, visual, fmt, digest)
+                path = os.path.join(directory, f"{name}_{i}_{visual.get('type', 'table')}.{fmt}")
+                jobs.append((path, future))
+        paths = []
+        for path, future in jobs:
+            try:
+                image = future.result()
+            except Exception as e:
+                logger.warning("Unable to render %s: %s", path, e)
+                continue
+            if image is None:
+                continue
+            with open(path, "wb") as f:
+                f.write(image)
+            paths.append(path)
+        return paths
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "workers": self.workers,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "renders": self.renders,
+                "render_seconds": round(self.render_seconds, 3),
+            }
+
+
+def renderer_from_env() -> ChartRenderer:
+    """Build a ``ChartRenderer`` from ``CHART_WORKERS`` and ``CHART_CACHE_MB``."""
+    workers = int(os.getenv("CHART_WORKERS", "0")) or None
+    return ChartRenderer(workers, max_bytes=int(float(os.getenv("CHART_CACHE_MB", "32")) * 2**20))
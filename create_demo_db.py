@@ -1,64 +1,75 @@
+"""Generate the demo company database with synthetic Turkish data.
+
+Row counts are multiplied by ``--scale`` so the same generator produces the
+small demo database and large datasets for load testing::
+
+    python create_demo_db.py --force                      # demo size
+    python create_demo_db.py --scale 100 --db /tmp/big.db --workers 8
+
+Faker is only used to build small value pools up front. Rows are then drawn
+from those pools with vectorised NumPy sampling in worker processes and
+written with batched ``executemany`` calls inside a single transaction. For a
+given day the output is fully determined by ``--seed``, independent of the
+number of workers.
+"""
+
+import argparse
+import os
 import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+import numpy as np
 from faker import Faker
-import random
-from datetime import datetime, timedelta
-import os
-from nl2sql_app import DB_PATH
-
-fake = Faker('tr_TR')
-
-# Ensure the database directory exists and open a connection using the same
-# path as nl2sql_app.DB_PATH.
-os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-conn = sqlite3.connect(DB_PATH)
-cur = conn.cursor()
-
-# Temel tabloları oluştur
-cur.execute('''CREATE TABLE IF NOT EXISTS Departmanlar (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    isim TEXT NOT NULL
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS Calisanlar (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    isim TEXT,
-    soyisim TEXT,
-    departman_id INTEGER,
-    pozisyon TEXT,
-    ise_giris DATE,
-    maas REAL,
-    dogum_tarihi DATE,
-    email TEXT,
-    FOREIGN KEY (departman_id) REFERENCES Departmanlar(id)
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS Urunler (
+
+from nl2sql_app import DB_PATH, get_schema_details
+from index_advisor import build_indexes, default_proposals
+
+# Temel tablolar
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS Departmanlar (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    isim TEXT NOT NULL
+)''',
+    '''CREATE TABLE IF NOT EXISTS Calisanlar (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    isim TEXT,
+    soyisim TEXT,
+    departman_id INTEGER,
+    pozisyon TEXT,
+    ise_giris DATE,
+    maas REAL,
+    dogum_tarihi DATE,
+    email TEXT,
+    FOREIGN KEY (departman_id) REFERENCES Departmanlar(id)
+)''',
+    '''CREATE TABLE IF NOT EXISTS Urunler (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     isim TEXT,
     kategori TEXT,
     birim TEXT,
     birim_fiyat REAL,
     w_carpani REAL
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS Musteriler (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    isim TEXT,
-    sektor TEXT,
-    lokasyon TEXT,
-    puan INTEGER,
-    email TEXT
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS Tedarikciler (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    isim TEXT,
-    kategori TEXT,
-    lokasyon TEXT,
-    email TEXT
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS SatinAlma (
+)''',
+    '''CREATE TABLE IF NOT EXISTS Musteriler (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    isim TEXT,
+    sektor TEXT,
+    lokasyon TEXT,
+    puan INTEGER,
+    email TEXT
+)''',
+    '''CREATE TABLE IF NOT EXISTS Tedarikciler (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    isim TEXT,
+    kategori TEXT,
+    lokasyon TEXT,
+    email TEXT
+)''',
+    '''CREATE TABLE IF NOT EXISTS SatinAlma (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     urun_id INTEGER,
     tedarikci_id INTEGER,
@@ -69,9 +80,8 @@ cur.execute('''CREATE TABLE IF NOT EXISTS SatinAlma (
     para_birimi TEXT,
     FOREIGN KEY (urun_id) REFERENCES Urunler(id),
     FOREIGN KEY (tedarikci_id) REFERENCES Tedarikciler(id)
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS Stoklar (
+)''',
+    '''CREATE TABLE IF NOT EXISTS Stoklar (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     urun_id INTEGER,
     miktar INTEGER,
@@ -79,9 +89,8 @@ cur.execute('''CREATE TABLE IF NOT EXISTS Stoklar (
     depo TEXT,
     guncelleme_tarihi DATE,
     FOREIGN KEY (urun_id) REFERENCES Urunler(id)
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS Satislar (
+)''',
+    '''CREATE TABLE IF NOT EXISTS Satislar (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     urun_id INTEGER,
     musteri_id INTEGER,
@@ -94,9 +103,8 @@ cur.execute('''CREATE TABLE IF NOT EXISTS Satislar (
     FOREIGN KEY (urun_id) REFERENCES Urunler(id),
     FOREIGN KEY (musteri_id) REFERENCES Musteriler(id),
     FOREIGN KEY (calisan_id) REFERENCES Calisanlar(id)
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS Uretim (
+)''',
+    '''CREATE TABLE IF NOT EXISTS Uretim (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     urun_id INTEGER,
     tarih DATE,
@@ -107,39 +115,35 @@ cur.execute('''CREATE TABLE IF NOT EXISTS Uretim (
     hata_sayisi INTEGER,
     FOREIGN KEY (urun_id) REFERENCES Urunler(id),
     FOREIGN KEY (calisan_id) REFERENCES Calisanlar(id)
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS FazlaMesai (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    calisan_id INTEGER,
-    tarih DATE,
-    toplam_saat REAL,
-    neden TEXT,
-    FOREIGN KEY (calisan_id) REFERENCES Calisanlar(id)
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS Izinler (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    calisan_id INTEGER,
-    izin_tipi TEXT,
-    baslangic DATE,
-    bitis DATE,
-    toplam_gun INTEGER,
-    FOREIGN KEY (calisan_id) REFERENCES Calisanlar(id)
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS KaliteKontrol (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    urun_id INTEGER,
-    tarih DATE,
-    sonuc TEXT,
-    aciklama TEXT,
-    hata_sayisi INTEGER,
-    cozulen INTEGER,
-    FOREIGN KEY (urun_id) REFERENCES Urunler(id)
-)''')
-
-cur.execute('''CREATE TABLE IF NOT EXISTS Finans (
+)''',
+    '''CREATE TABLE IF NOT EXISTS FazlaMesai (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    calisan_id INTEGER,
+    tarih DATE,
+    toplam_saat REAL,
+    neden TEXT,
+    FOREIGN KEY (calisan_id) REFERENCES Calisanlar(id)
+)''',
+    '''CREATE TABLE IF NOT EXISTS Izinler (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    calisan_id INTEGER,
+    izin_tipi TEXT,
+    baslangic DATE,
+    bitis DATE,
+    toplam_gun INTEGER,
+    FOREIGN KEY (calisan_id) REFERENCES Calisanlar(id)
+)''',
+    '''CREATE TABLE IF NOT EXISTS KaliteKontrol (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    urun_id INTEGER,
+    tarih DATE,
+    sonuc TEXT,
+    aciklama TEXT,
+    hata_sayisi INTEGER,
+    cozulen INTEGER,
+    FOREIGN KEY (urun_id) REFERENCES Urunler(id)
+)''',
+    '''CREATE TABLE IF NOT EXISTS Finans (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     tip TEXT,
     tarih DATE,
@@ -148,176 +152,355 @@ cur.execute('''CREATE TABLE IF NOT EXISTS Finans (
     aciklama TEXT,
     ilgili_tablo TEXT,
     ilgili_id INTEGER
-)''')
-
-# --- DEMO VERİ ÜRETİMİ ---
-
-# Departmanlar
-departmanlar = ['Üretim', 'Satış', 'İnsan Kaynakları', 'Finans', 'Satınalma', 'Kalite', 'Lojistik', 'Bakım']
-for isim in departmanlar:
-    cur.execute('INSERT INTO Departmanlar (isim) VALUES (?)', (isim,))
-
-# Ürünler ve birim bilgisini sakla
-urun_list = []
-urun_birim = {}
-for _ in range(250):
-    isim = fake.word().capitalize() + ' ' + fake.word().capitalize() + ' ' + str(random.randint(100, 9999))
-    kategori = fake.word().capitalize()
-    birim = random.choice(['Adet', 'Kg', 'Litre', 'Koli', 'Paket'])
-    birim_fiyat = round(random.uniform(10, 500), 2)
-    w_carpani = round(random.uniform(0.001, 0.01), 4)
-    cur.execute(
-        'INSERT INTO Urunler (isim, kategori, birim, birim_fiyat, w_carpani) VALUES (?, ?, ?, ?, ?)',
-        (isim, kategori, birim, birim_fiyat, w_carpani))
-    urun_id = cur.lastrowid
-    urun_list.append(urun_id)
-    urun_birim[urun_id] = birim
-
-# Müşteriler
-for _ in range(2000):
-    isim = fake.company()
-    sektor = fake.job()
-    lokasyon = fake.city()
-    puan = random.randint(1, 10)
-    email = fake.company_email()
-    cur.execute('INSERT INTO Musteriler (isim, sektor, lokasyon, puan, email) VALUES (?, ?, ?, ?, ?)',
-                (isim, sektor, lokasyon, puan, email))
-
-# Tedarikçiler
-for _ in range(300):
-    isim = fake.company()
-    kategori = fake.word().capitalize()
-    lokasyon = fake.city()
-    email = fake.company_email()
-    cur.execute('INSERT INTO Tedarikciler (isim, kategori, lokasyon, email) VALUES (?, ?, ?, ?)',
-                (isim, kategori, lokasyon, email))
-
-# Çalışanlar
-for _ in range(1000):
-    isim = fake.first_name()
-    soyisim = fake.last_name()
-    departman_id = random.randint(1, len(departmanlar))
-    pozisyon = fake.job()
-    ise_giris = fake.date_between(start_date='-15y', end_date='-1d')
-    maas = round(random.uniform(20000, 80000), 2)
-    dogum_tarihi = fake.date_of_birth(minimum_age=20, maximum_age=60)
-    email = fake.email()
-    cur.execute('INSERT INTO Calisanlar (isim, soyisim, departman_id, pozisyon, ise_giris, maas, dogum_tarihi, email) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                (isim, soyisim, departman_id, pozisyon, ise_giris, maas, dogum_tarihi, email))
-
-# Satışlar
-para_birimleri = ['TL', 'USD', 'EUR']
-for _ in range(12000):
-    urun_id = random.randint(1, 250)
-    musteri_id = random.randint(1, 2000)
-    calisan_id = random.randint(1, 1000)
-    tarih = fake.date_between(start_date='-4y', end_date='today')
-    adet = random.randint(1, 100)
-    birim = urun_birim.get(urun_id)
-    toplam_fiyat = adet * float(random.uniform(10, 500))
-    para_birimi = random.choice(para_birimleri)
-    cur.execute(
-        'INSERT INTO Satislar (urun_id, musteri_id, calisan_id, tarih, adet, birim, toplam_fiyat, para_birimi) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-        (urun_id, musteri_id, calisan_id, tarih, adet, birim, toplam_fiyat, para_birimi))
-
-# Üretim
-vardiyalar = ['Gündüz', 'Gece', 'Akşam']
-for _ in range(14000):
-    urun_id = random.randint(1, 250)
-    tarih = fake.date_between(start_date='-4y', end_date='today')
-    calisan_id = random.randint(1, 1000)
-    vardiya = random.choice(vardiyalar)
-    adet = random.randint(10, 1000)
-    birim = urun_birim.get(urun_id)
-    hata_sayisi = random.randint(0, 10)
-    cur.execute(
-        'INSERT INTO Uretim (urun_id, tarih, calisan_id, vardiya, adet, birim, hata_sayisi) VALUES (?, ?, ?, ?, ?, ?, ?)',
-        (urun_id, tarih, calisan_id, vardiya, adet, birim, hata_sayisi))
-
-# Satınalma
-for _ in range(4000):
-    urun_id = random.randint(1, 250)
-    tedarikci_id = random.randint(1, 300)
-    tarih = fake.date_between(start_date='-4y', end_date='today')
-    miktar = random.randint(10, 1000)
-    birim = urun_birim.get(urun_id)
-    toplam_tutar = miktar * float(random.uniform(10, 500))
-    para_birimi = random.choice(para_birimleri)
-    cur.execute(
-        'INSERT INTO SatinAlma (urun_id, tedarikci_id, tarih, miktar, birim, toplam_tutar, para_birimi) VALUES (?, ?, ?, ?, ?, ?, ?)',
-        (urun_id, tedarikci_id, tarih, miktar, birim, toplam_tutar, para_birimi))
-
-# Stoklar
-for urun_id in range(1, 251):
-    miktar = random.randint(0, 5000)
-    birim = urun_birim.get(urun_id)
-    depo = fake.city()
-    guncelleme_tarihi = fake.date_between(start_date='-1y', end_date='today')
-    cur.execute(
-        'INSERT INTO Stoklar (urun_id, miktar, birim, depo, guncelleme_tarihi) VALUES (?, ?, ?, ?, ?)',
-        (urun_id, miktar, birim, depo, guncelleme_tarihi))
-
-# Fazla Mesai
-nedenler = ['Üretim Artışı', 'Arıza', 'Yıllık Stok', 'Acil Sipariş', 'Proje Teslimi']
-for _ in range(3500):
-    calisan_id = random.randint(1, 1000)
-    tarih = fake.date_between(start_date='-4y', end_date='today')
-    toplam_saat = round(random.uniform(2, 10), 1)
-    neden = random.choice(nedenler)
-    cur.execute('INSERT INTO FazlaMesai (calisan_id, tarih, toplam_saat, neden) VALUES (?, ?, ?, ?)',
-                (calisan_id, tarih, toplam_saat, neden))
-
-# İzinler
-izinler = ['Yıllık', 'Sağlık', 'Mazeret', 'Doğum', 'Ücretsiz']
-for _ in range(2200):
-    calisan_id = random.randint(1, 1000)
-    izin_tipi = random.choice(izinler)
-    baslangic = fake.date_between(start_date='-4y', end_date='today')
-    bitis = baslangic + timedelta(days=random.randint(1, 14))
-    toplam_gun = (bitis - baslangic).days
-    cur.execute('INSERT INTO Izinler (calisan_id, izin_tipi, baslangic, bitis, toplam_gun) VALUES (?, ?, ?, ?, ?)',
-                (calisan_id, izin_tipi, baslangic, bitis, toplam_gun))
-
-# Kalite Kontrol
-sonuclar = ['Geçti', 'Kaldı', 'Kısmen']
-for _ in range(3000):
-    urun_id = random.randint(1, 250)
-    tarih = fake.date_between(start_date='-4y', end_date='today')
-    sonuc = random.choice(sonuclar)
-    aciklama = fake.sentence(nb_words=8)
-    hata_sayisi = random.randint(0, 5)
-    cozulen = random.randint(0, 1)
-    cur.execute('INSERT INTO KaliteKontrol (urun_id, tarih, sonuc, aciklama, hata_sayisi, cozulen) VALUES (?, ?, ?, ?, ?, ?)',
-                (urun_id, tarih, sonuc, aciklama, hata_sayisi, cozulen))
-
-# Finans
-tipler = ['Gelir', 'Gider']
-for _ in range(8000):
-    tip = random.choice(tipler)
-    tarih = fake.date_between(start_date='-4y', end_date='today')
-    tutar = round(random.uniform(1000, 100000), 2)
-    para_birimi = random.choice(para_birimleri)
-    aciklama = fake.sentence(nb_words=6)
-    ilgili_tablo = random.choice(['Satislar', 'SatinAlma', 'Maas', 'Genel'])
-    ilgili_id = random.randint(1, 1000)
-    cur.execute(
-        'INSERT INTO Finans (tip, tarih, tutar, para_birimi, aciklama, ilgili_tablo, ilgili_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
-        (tip, tarih, tutar, para_birimi, aciklama, ilgili_tablo, ilgili_id))
-
-# Her ay için ekstra Genel Gider kaydı ekle
-start = datetime.today().replace(day=1) - timedelta(days=4*365)
-start = start.replace(day=1)
-for i in range(48):
-    year = start.year + (start.month - 1 + i) // 12
-    month = (start.month - 1 + i) % 12 + 1
-    tarih = datetime(year, month, 1).date()
-    tutar = round(random.uniform(20000, 50000), 2)
-    para_birimi = 'TL'
-    cur.execute(
-        'INSERT INTO Finans (tip, tarih, tutar, para_birimi, aciklama, ilgili_tablo, ilgili_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
-        ('Genel Gider', tarih, tutar, para_birimi, 'Aylık genel gider', 'Genel', None))
-
-conn.commit()
-conn.close()
-
-print(f"Veritabanı başarıyla oluşturuldu: {DB_PATH}")
+)''',
+]
+
+# Demo boyutundaki satır sayıları; --scale ile çarpılır
+BASE_COUNTS = {
+    "Urunler": 250,
+    "Musteriler": 2000,
+    "Tedarikciler": 300,
+    "Calisanlar": 1000,
+    "Satislar": 12000,
+    "Uretim": 14000,
+    "SatinAlma": 4000,
+    "FazlaMesai": 3500,
+    "Izinler": 2200,
+    "KaliteKontrol": 3000,
+    "Finans": 8000,
+}
+
+DEPARTMANLAR = ['Üretim', 'Satış', 'İnsan Kaynakları', 'Finans', 'Satınalma', 'Kalite', 'Lojistik', 'Bakım']
+BIRIMLER = np.array(['Adet', 'Kg', 'Litre', 'Koli', 'Paket'], dtype=object)
+PARA_BIRIMLERI = np.array(['TL', 'USD', 'EUR'], dtype=object)
+VARDIYALAR = np.array(['Gündüz', 'Gece', 'Akşam'], dtype=object)
+NEDENLER = np.array(['Üretim Artışı', 'Arıza', 'Yıllık Stok', 'Acil Sipariş', 'Proje Teslimi'], dtype=object)
+IZIN_TIPLERI = np.array(['Yıllık', 'Sağlık', 'Mazeret', 'Doğum', 'Ücretsiz'], dtype=object)
+SONUCLAR = np.array(['Geçti', 'Kaldı', 'Kısmen'], dtype=object)
+FINANS_TIPLERI = np.array(['Gelir', 'Gider'], dtype=object)
+ILGILI_TABLOLAR = np.array(['Satislar', 'SatinAlma', 'Maas', 'Genel'], dtype=object)
+
+COLUMNS = {
+    "Departmanlar": ("isim",),
+    "Urunler": ("isim", "kategori", "birim", "birim_fiyat", "w_carpani"),
+    "Musteriler": ("isim", "sektor", "lokasyon", "puan", "email"),
+    "Tedarikciler": ("isim", "kategori", "lokasyon", "email"),
+    "Calisanlar": ("isim", "soyisim", "departman_id", "pozisyon", "ise_giris", "maas", "dogum_tarihi", "email"),
+    "Satislar": ("urun_id", "musteri_id", "calisan_id", "tarih", "adet", "birim", "toplam_fiyat", "para_birimi"),
+    "Uretim": ("urun_id", "tarih", "calisan_id", "vardiya", "adet", "birim", "hata_sayisi"),
+    "SatinAlma": ("urun_id", "tedarikci_id", "tarih", "miktar", "birim", "toplam_tutar", "para_birimi"),
+    "Stoklar": ("urun_id", "miktar", "birim", "depo", "guncelleme_tarihi"),
+    "FazlaMesai": ("calisan_id", "tarih", "toplam_saat", "neden"),
+    "Izinler": ("calisan_id", "izin_tipi", "baslangic", "bitis", "toplam_gun"),
+    "KaliteKontrol": ("urun_id", "tarih", "sonuc", "aciklama", "hata_sayisi", "cozulen"),
+    "Finans": ("tip", "tarih", "tutar", "para_birimi", "aciklama", "ilgili_tablo", "ilgili_id"),
+}
+
+INSERTS = {
+    table: "INSERT INTO {} ({}) VALUES ({})".format(table, ", ".join(cols), ", ".join("?" * len(cols)))
+    for table, cols in COLUMNS.items()
+}
+
+# Tables filled by worker processes, in insertion order. IDs are assigned in
+# this order so the output only depends on the seed.
+TABLE_ORDER = [
+    "Urunler", "Musteriler", "Tedarikciler", "Calisanlar", "Satislar", "Uretim",
+    "SatinAlma", "Stoklar", "FazlaMesai", "Izinler", "KaliteKontrol", "Finans",
+]
+
+FOUR_YEARS = 4 * 365
+
+
+def build_pools(seed: int, size: int) -> dict:
+    """Return Faker generated value pools sampled by the row generators."""
+    Faker.seed(seed)
+    fake = Faker('tr_TR')
+    pools = {
+        "word": [fake.word() for _ in range(size)],
+        "company": [fake.company() for _ in range(size)],
+        "company_email": [fake.company_email() for _ in range(size)],
+        "city": [fake.city() for _ in range(size)],
+        "job": [fake.job() for _ in range(size)],
+        "first_name": [fake.first_name() for _ in range(size)],
+        "last_name": [fake.last_name() for _ in range(size)],
+        "email": [fake.email() for _ in range(size)],
+        "sentence6": [fake.sentence(nb_words=6) for _ in range(size)],
+        "sentence8": [fake.sentence(nb_words=8) for _ in range(size)],
+    }
+    return {k: np.array(v, dtype=object) for k, v in pools.items()}
+
+
+# Worker process state set by ``_init_worker``
+_POOLS = None
+_CTX = None
+
+
+def _init_worker(pools, ctx):
+    global _POOLS, _CTX
+    _POOLS = pools
+    _CTX = ctx
+
+
+def _pick(rng, values, n):
+    if isinstance(values, str):
+        values = _POOLS[values]
+    return values[rng.integers(0, len(values), n)].tolist()
+
+
+def _ids(rng, key, n):
+    return rng.integers(1, _CTX[key] + 1, n)
+
+
+def _dates(rng, n, min_days_ago, max_days_ago):
+    offsets = rng.integers(min_days_ago, max_days_ago + 1, n).astype("timedelta64[D]")
+    return _CTX["today"] - offsets
+
+
+def _money(rng, low, high, n, decimals=2):
+    return np.round(rng.uniform(low, high, n), decimals).tolist()
+
+
+def _birim(urun_ids):
+    return BIRIMLER[_CTX["urun_birim"][urun_ids - 1]].tolist()
+
+
+def gen_urunler(rng, start, n):
+    first = _pick(rng, "word", n)
+    second = _pick(rng, "word", n)
+    numbers = rng.integers(100, 10000, n).tolist()
+    isim = [f"{a.capitalize()} {b.capitalize()} {c}" for a, b, c in zip(first, second, numbers)]
+    kategori = [w.capitalize() for w in _pick(rng, "word", n)]
+    birim = BIRIMLER[_CTX["urun_birim"][start:start + n]].tolist()
+    return zip(isim, kategori, birim, _money(rng, 10, 500, n), _money(rng, 0.001, 0.01, n, 4))
+
+
+def gen_musteriler(rng, start, n):
+    return zip(_pick(rng, "company", n), _pick(rng, "job", n), _pick(rng, "city", n),
+               rng.integers(1, 11, n).tolist(), _pick(rng, "company_email", n))
+
+
+def gen_tedarikciler(rng, start, n):
+    kategori = [w.capitalize() for w in _pick(rng, "word", n)]
+    return zip(_pick(rng, "company", n), kategori, _pick(rng, "city", n), _pick(rng, "company_email", n))
+
+
+def gen_calisanlar(rng, start, n):
+    return zip(_pick(rng, "first_name", n), _pick(rng, "last_name", n),
+               rng.integers(1, len(DEPARTMANLAR) + 1, n).tolist(), _pick(rng, "job", n),
+               _dates(rng, n, 1, 15 * 365).astype(str).tolist(), _money(rng, 20000, 80000, n),
+               _dates(rng, n, 20 * 365, 60 * 365).astype(str).tolist(), _pick(rng, "email", n))
+
+
+def gen_satislar(rng, start, n):
+    urun_id = _ids(rng, "Urunler", n)
+    adet = rng.integers(1, 101, n)
+    toplam_fiyat = adet * rng.uniform(10, 500, n)
+    return zip(urun_id.tolist(), _ids(rng, "Musteriler", n).tolist(), _ids(rng, "Calisanlar", n).tolist(),
+               _dates(rng, n, 0, FOUR_YEARS).astype(str).tolist(), adet.tolist(), _birim(urun_id),
+               toplam_fiyat.tolist(), _pick(rng, PARA_BIRIMLERI, n))
+
+
+def gen_uretim(rng, start, n):
+    urun_id = _ids(rng, "Urunler", n)
+    return zip(urun_id.tolist(), _dates(rng, n, 0, FOUR_YEARS).astype(str).tolist(),
+               _ids(rng, "Calisanlar", n).tolist(), _pick(rng, VARDIYALAR, n),
+               rng.integers(10, 1001, n).tolist(), _birim(urun_id), rng.integers(0, 11, n).tolist())
+
+
+def gen_satinalma(rng, start, n):
+    urun_id = _ids(rng, "Urunler", n)
+    miktar = rng.integers(10, 1001, n)
+    toplam_tutar = miktar * rng.uniform(10, 500, n)
+    return zip(urun_id.tolist(), _ids(rng, "Tedarikciler", n).tolist(),
+               _dates(rng, n, 0, FOUR_YEARS).astype(str).tolist(), miktar.tolist(), _birim(urun_id),
+               toplam_tutar.tolist(), _pick(rng, PARA_BIRIMLERI, n))
+
+
+def gen_stoklar(rng, start, n):
+    urun_id = np.arange(start + 1, start + n + 1)
+    return zip(urun_id.tolist(), rng.integers(0, 5001, n).tolist(), _birim(urun_id),
+               _pick(rng, "city", n), _dates(rng, n, 0, 365).astype(str).tolist())
+
+
+def gen_fazlamesai(rng, start, n):
+    return zip(_ids(rng, "Calisanlar", n).tolist(), _dates(rng, n, 0, FOUR_YEARS).astype(str).tolist(),
+               _money(rng, 2, 10, n, 1), _pick(rng, NEDENLER, n))
+
+
+def gen_izinler(rng, start, n):
+    baslangic = _dates(rng, n, 0, FOUR_YEARS)
+    gun = rng.integers(1, 15, n)
+    bitis = baslangic + gun.astype("timedelta64[D]")
+    return zip(_ids(rng, "Calisanlar", n).tolist(), _pick(rng, IZIN_TIPLERI, n),
+               baslangic.astype(str).tolist(), bitis.astype(str).tolist(), gun.tolist())
+
+
+def gen_kalitekontrol(rng, start, n):
+    return zip(_ids(rng, "Urunler", n).tolist(), _dates(rng, n, 0, FOUR_YEARS).astype(str).tolist(),
+               _pick(rng, SONUCLAR, n), _pick(rng, "sentence8", n),
+               rng.integers(0, 6, n).tolist(), rng.integers(0, 2, n).tolist())
+
+
+def gen_finans(rng, start, n):
+    return zip(_pick(rng, FINANS_TIPLERI, n), _dates(rng, n, 0, FOUR_YEARS).astype(str).tolist(),
+               _money(rng, 1000, 100000, n), _pick(rng, PARA_BIRIMLERI, n), _pick(rng, "sentence6", n),
+               _pick(rng, ILGILI_TABLOLAR, n), rng.integers(1, 1001, n).tolist())
+
+
+GENERATORS = {
+    "Urunler": gen_urunler,
+    "Musteriler": gen_musteriler,
+    "Tedarikciler": gen_tedarikciler,
+    "Calisanlar": gen_calisanlar,
+    "Satislar": gen_satislar,
+    "Uretim": gen_uretim,
+    "SatinAlma": gen_satinalma,
+    "Stoklar": gen_stoklar,
+    "FazlaMesai": gen_fazlamesai,
+    "Izinler": gen_izinler,
+    "KaliteKontrol": gen_kalitekontrol,
+    "Finans": gen_finans,
+}
+
+
+def _generate_chunk(task):
+    """Generate one chunk of rows; runs inside a worker process."""
+    table, chunk_no, start, count = task
+    seq = np.random.SeedSequence([_CTX["seed"], TABLE_ORDER.index(table), chunk_no])
+    rng = np.random.default_rng(seq)
+    return table, list(GENERATORS[table](rng, start, count))
+
+
+def _ordered_results(executor, tasks, window):
+    """Yield chunk results in task order keeping at most ``window`` in flight."""
+    pending = deque()
+    remaining = iter(tasks)
+    for task in islice(remaining, window):
+        pending.append(executor.submit(_generate_chunk, task))
+    while pending:
+        result = pending.popleft().result()
+        task = next(remaining, None)
+        if task is not None:
+            pending.append(executor.submit(_generate_chunk, task))
+        yield result
+
+
+def _genel_gider_rows(rng):
+    # Her ay için ekstra Genel Gider kaydı ekle
+    start = datetime.today().replace(day=1) - timedelta(days=4*365)
+    start = start.replace(day=1)
+    rows = []
+    for i in range(48):
+        year = start.year + (start.month - 1 + i) // 12
+        month = (start.month - 1 + i) % 12 + 1
+        tarih = datetime(year, month, 1).date().isoformat()
+        tutar = round(float(rng.uniform(20000, 50000)), 2)
+        rows.append(('Genel Gider', tarih, tutar, 'TL', 'Aylık genel gider', 'Genel', None))
+    return rows
+
+
+def generate(db_path: str = DB_PATH, scale: float = 1.0, seed: int = 42, workers: int | None = None,
+             batch_size: int = 50000, pool_size: int = 2000, force: bool = False) -> dict:
+    """Create the demo database at ``db_path`` and return per-table statistics.
+
+    Raises ``FileExistsError`` when ``db_path`` already exists unless
+    ``force`` is set, in which case the old file is replaced.
+    """
+    if os.path.exists(db_path):
+        if not force:
+            raise FileExistsError(f"{db_path} already exists, use --force to replace it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    counts = {t: max(1, int(round(c * scale))) for t, c in BASE_COUNTS.items()}
+    counts["Stoklar"] = counts["Urunler"]
+    rng = np.random.default_rng(seed)
+    ctx = {
+        "seed": seed,
+        "today": np.datetime64(date.today(), "D"),
+        "urun_birim": rng.integers(0, len(BIRIMLER), counts["Urunler"]),
+        **counts,
+    }
+    pools = build_pools(seed, pool_size)
+    tasks = [
+        (table, chunk_no, start, min(batch_size, counts[table] - start))
+        for table in TABLE_ORDER
+        for chunk_no, start in enumerate(range(0, counts[table], batch_size))
+    ]
+
+    conn = sqlite3.connect(db_path)
+    # Tek seferlik üretim: dayanıklılık yerine hız
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA journal_mode=MEMORY")
+    cur = conn.cursor()
+    for stmt in SCHEMA:
+        cur.execute(stmt)
+
+    # Tüm veri tek bir transaction içinde yazılır
+    cur.executemany(INSERTS["Departmanlar"], [(isim,) for isim in DEPARTMANLAR])
+
+    stats = {}
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pools, ctx))
+        results = _ordered_results(executor, tasks, workers * 2)
+    else:
+        _init_worker(pools, ctx)
+        results = map(_generate_chunk, tasks)
+
+    try:
+        table_start = time.perf_counter()
+        for table, rows in results:
+            cur.executemany(INSERTS[table], rows)
+            entry = stats.setdefault(table, {"rows": 0})
+            entry["rows"] += len(rows)
+            if entry["rows"] >= counts[table]:
+                now = time.perf_counter()
+                entry["seconds"] = now - table_start
+                entry["rows_per_sec"] = entry["rows"] / entry["seconds"] if entry["seconds"] else 0.0
+                print(f"{table:<14} {entry['rows']:>10} rows  {entry['seconds']:>7.2f}s  "
+                      f"{entry['rows_per_sec']:>12,.0f} rows/s")
+                table_start = now
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    cur.executemany(INSERTS["Finans"], _genel_gider_rows(rng))
+
+    # Yabancı anahtar ve tarih kolonları için varsayılan indeksler
+    start = time.perf_counter()
+    build_indexes(conn, default_proposals(get_schema_details(cur)))
+    print(f"{'indexes':<14} {time.perf_counter() - start:>24.2f}s")
+
+    conn.commit()
+    conn.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the demo company database.")
+    parser.add_argument("--db", default=DB_PATH, help="output database file")
+    parser.add_argument("--scale", type=float, default=1.0, help="row count multiplier")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--workers", type=int, default=None, help="generator processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=50000, help="rows per executemany batch")
+    parser.add_argument("--pool-size", type=int, default=2000, help="Faker values per pool")
+    parser.add_argument("--force", action="store_true", help="replace an existing database")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        stats = generate(args.db, args.scale, args.seed, args.workers, args.batch_size,
+                         args.pool_size, args.force)
+    except FileExistsError as e:
+        parser.error(str(e))
+    total = sum(s["rows"] for s in stats.values())
+    print(f"Veritabanı başarıyla oluşturuldu: {args.db} "
+          f"({total} satır, {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
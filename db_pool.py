@@ -0,0 +1,189 @@
+"""Thread-affine pool of read-only, pre-tuned SQLite connections.
+
+Generated SQL must never modify the database, so every connection handed out
+by the pool is opened with a ``mode=ro`` URI and ``PRAGMA query_only``.  Each
+thread keeps its own connection which preserves SQLite's page cache between
+queries and avoids the cost of reopening the file on every request.
+
+WAL journal mode is a property of the database file and can only be switched
+by a writer. It is opt-in: ``ensure_wal`` opens the existing file read-write
+once when the pool is created with ``wal=True`` (``SQLITE_WAL=1`` for the
+shared pools). A missing database file is an error, never created.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+# Pragmas applied to every pooled connection. ``cache_size`` is negative so it
+# is interpreted as KiB rather than pages.
+DEFAULT_PRAGMAS = {
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": -int(os.getenv("SQLITE_CACHE_KB", str(64 * 1024))),
+    "temp_store": "MEMORY",
+    "query_only": 1,
+}
+# Switch the shared pools' databases to WAL mode
+WAL = os.getenv("SQLITE_WAL", "0").lower() in {"1", "true", "yes"}
+
+
+def sqlite_uri(path: str, mode: str = "ro") -> str:
+    """Return a ``file:`` URI opening ``path`` with ``mode``, the path escaped."""
+    return f"file:{quote(path)}?mode={mode}"
+
+
+def require_database(path: str) -> None:
+    """Raise ``FileNotFoundError`` unless ``path`` is an existing file."""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"SQLite database not found: {path} (check NL2SQL_DB_PATH)")
+
+
+def ensure_wal(path: str) -> str:
+    """Switch the database at ``path`` to WAL mode and return the journal mode.
+
+    The file must exist. If it cannot be opened for writing the current mode
+    is returned unchanged.
+    """
+    require_database(path)
+    try:
+        with sqlite3.connect(sqlite_uri(path, "rw"), uri=True) as conn:
+            return conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    except sqlite3.OperationalError as e:
+        logger.warning("Unable to enable WAL mode for %s: %s", path, e)
+        try:
+            with sqlite3.connect(sqlite_uri(path), uri=True) as conn:
+                return conn.execute("PRAGMA journal_mode").fetchone()[0]
+        except sqlite3.Error:
+            return "unknown"
+
+
+class ConnectionPool:
+    """Hand out one read-only SQLite connection per thread.
+
+    Connections are checked with a cheap ``SELECT 1`` before being reused and
+    transparently reopened when the check fails. ``path`` must exist;
+    ``wal`` switches it to WAL mode first, see ``ensure_wal``.
+    """
+
+    def __init__(self, path: str, pragmas: dict | None = None, wal: bool = False):
+        require_database(path)
+        self.path = path
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.journal_mode = ensure_wal(path) if wal else None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = set()
+        self.opened = 0
+        self.reopened = 0
+
+    def _open(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        conn = sqlite3.connect(sqlite_uri(self.path), uri=True, check_same_thread=check_same_thread)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        with self._lock:
+            self._connections.add(conn)
+            self.opened += 1
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._connections.discard(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and not self._healthy(conn):
+            self._discard(conn)
+            conn = None
+            with self._lock:
+                self.reopened += 1
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding the calling thread's connection.
+
+        Any open read transaction is ended on exit so later queries see new
+        data committed by writers.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+    @contextmanager
+    def dedicated(self):
+        """Yield a private connection usable from any thread and close it after.
+
+        Useful for long running work, such as streaming a result, that may be
+        resumed on different threads.
+        """
+        conn = self._open(check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            self._discard(conn)
+
+    def warm(self) -> None:
+        """Open the calling thread's connection and touch the schema pages."""
+        with self.connection() as conn:
+            conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+
+    def close_all(self) -> None:
+        """Close every connection opened by the pool."""
+        with self._lock:
+            conns = list(self._connections)
+            self._connections.clear()
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def stats(self) -> dict:
+        """Return counters describing the pool."""
+        with self._lock:
+            return {
+                "path": self.path,
+                "open_connections": len(self._connections),
+                "opened": self.opened,
+                "reopened": self.reopened,
+                "journal_mode": self.journal_mode,
+            }
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(path: str) -> ConnectionPool:
+    """Return the shared ``ConnectionPool`` for ``path``, see ``WAL``."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(path)
+        if pool is None:
+            pool = ConnectionPool(path, wal=WAL)
+            _POOLS[path] = pool
+        return pool
@@ -0,0 +1,169 @@
+"""Reduce query results to what a chart can actually show.
+
+A chart has at most a few thousand distinguishable points, so large results
+are reduced per visual before they are sent or plotted:
+
+- ``line``: Largest-Triangle-Three-Buckets (LTTB) picks the rows that keep
+  the visual shape of every series;
+- ``scatter``: points are aggregated on a square grid, each non-empty cell
+  becomes its mean position plus the number of points it holds. Every
+  series gets its own grid and rows, leaving the other series empty;
+- ``pie``: the ``top_n - 1`` largest slices are kept and the rest are
+  summed into an ``OTHER_LABEL`` slice;
+- ``bar``: bars are only reduced when there are more than ``max_points`` of
+  them. Categories without an order are then folded like pie slices; bars
+  on an ordinal axis (numbers or dates) go through LTTB instead, so the axis
+  stays whole.
+
+Tables are never reduced. All reductions are vectorised with NumPy apart
+from the sequential LTTB bucket walk, whose inner work is vectorised.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = int(os.getenv("VISUAL_MAX_POINTS", "2000"))
+TOP_N = int(os.getenv("VISUAL_TOP_N", "20"))
+OTHER_LABEL = "Diğer"
+COUNT_COLUMN = "nokta_sayisi"
+
+
+def lttb(x, y, n: int):
+    """Return the indices of ``n`` points of ``(x, y)`` chosen by LTTB.
+
+    ``x`` must be ascending. The first and last points are always kept.
+    """
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    # n - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 1 < n - 2:
+            cx, cy = avg_x[i + 1], avg_y[i + 1]
+        else:
+            cx, cy = x[-1], y[-1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def _numeric_axis(values):
+    """Return ``values`` as ascending floats, or row positions when that fails."""
+    if pd.api.types.is_numeric_dtype(values):
+        axis = values.to_numpy(dtype=float)
+    else:
+        parsed = pd.to_datetime(values, errors="coerce")
+        if parsed.isna().any():
+            return np.arange(len(values), dtype=float)
+        axis = parsed.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(float)
+    if np.isnan(axis).any() or np.any(np.diff(axis) < 0):
+        return np.arange(len(values), dtype=float)
+    return axis
+
+
+def _ordinal(values) -> bool:
+    """Return whether ``values`` have an order of their own: numbers or dates."""
+    if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+        return True
+    # A name such as "Satış" rules the column out before every label is parsed
+    if pd.isna(pd.to_datetime(values.iloc[:1], errors="coerce", format="mixed")).any():
+        return False
+    return bool(pd.to_datetime(values, errors="coerce", format="mixed").notna().all())
+
+
+def reduce_line(df, x, ys, max_points: int):
+    """Keep the rows LTTB selects for any of the ``ys`` series."""
+    axis = _numeric_axis(df[x]) if x in df.columns else np.arange(len(df), dtype=float)
+    per_series = max(3, max_points // max(len(ys), 1))
+    keep = np.unique(np.concatenate([lttb(axis, df[y].to_numpy(dtype=float), per_series) for y in ys]))
+    return df.iloc[keep].reset_index(drop=True)
+
+
+def reduce_scatter(df, x, ys, max_points: int):
+    """Aggregate the points of each of the ``ys`` series on its own grid.
+
+    The grids share ``max_points`` cells; a row holds the cell of one series
+    and ``NaN`` for the others.
+    """
+    side = max(1, int(np.sqrt(max_points // max(len(ys), 1))))
+
+    def cells(values):
+        span = np.ptp(values) or 1.0
+        return np.minimum(((values - values.min()) / span * side).astype(np.int64), side - 1)
+
+    frames = []
+    for y in ys:
+        data = df[[x, y]].dropna()
+        if data.empty:
+            continue
+        xs = data[x].to_numpy(dtype=float)
+        values = data[y].to_numpy(dtype=float)
+        _, inverse, counts = np.unique(cells(xs) * side + cells(values), return_inverse=True, return_counts=True)
+        frames.append(pd.DataFrame({
+            x: np.bincount(inverse, weights=xs) / counts,
+            y: np.bincount(inverse, weights=values) / counts,
+            COUNT_COLUMN: counts,
+        }))
+    if not frames:
+        return pd.DataFrame(columns=[x, *ys, COUNT_COLUMN])
+    return pd.concat(frames, ignore_index=True)[[x, *ys, COUNT_COLUMN]]
+
+
+def reduce_categories(df, x, ys, top_n: int):
+    """Keep the largest ``top_n - 1`` categories and sum the rest as ``OTHER_LABEL``."""
+    grouped = df.groupby(x, sort=False, dropna=False)[ys].sum().reset_index()
+    if len(grouped) <= top_n:
+        return grouped
+    size = grouped[ys].abs().sum(axis=1).to_numpy()
+    order = np.argsort(-size, kind="stable")
+    keep = np.sort(order[: top_n - 1])
+    rest = np.sort(order[top_n - 1:])
+    other = grouped.iloc[rest][ys].sum().to_frame().T
+    other.insert(0, x, OTHER_LABEL)
+    kept = grouped.iloc[keep].astype({x: object})
+    return pd.concat([kept, other], ignore_index=True)
+
+
+def reduce_for_visual(df, vtype: str, x=None, y=None, max_points: int = MAX_POINTS, top_n: int = TOP_N):
+    """Return ``(frame, info)`` with ``df`` reduced for a ``vtype`` chart.
+
+    ``x`` and ``y`` are column names of ``df``; ``y`` may be a list. ``info``
+    describes the reduction (``method``, ``rows`` and ``points``) and is
+    ``None`` when ``df`` is returned unchanged because it is small enough,
+    the columns are missing or not numeric, or the budget is ``0``.
+    """
+    x = x if isinstance(x, str) else None
+    ys = [c for c in (y if isinstance(y, (list, tuple)) else [y]) if isinstance(c, str) and c in df.columns]
+    if not ys or not all(pd.api.types.is_numeric_dtype(df[c]) for c in ys):
+        return df, None
+    if vtype == "line" and max_points and len(df) > max_points:
+        method, out = "lttb", reduce_line(df, x, ys, max_points)
+    elif vtype == "scatter" and max_points and len(df) > max_points and x in df.columns \
+            and pd.api.types.is_numeric_dtype(df[x]):
+        method, out = "grid", reduce_scatter(df, x, ys, max_points)
+    elif vtype == "pie" and top_n > 1 and x in df.columns and df[x].nunique(dropna=False) > top_n:
+        method, out = "top_n", reduce_categories(df, x, ys, top_n)
+    elif vtype == "bar" and max_points and x in df.columns and df[x].nunique(dropna=False) > max_points:
+        if _ordinal(df[x]):
+            method, out = "lttb", reduce_line(df, x, ys, max_points)
+        elif top_n > 1:
+            method, out = "top_n", reduce_categories(df, x, ys, top_n)
+        else:
+            return df, None
+    else:
+        return df, None
+    out.attrs = dict(df.attrs)
+    return out, {"method": method, "rows": len(df), "points": len(out)}
@@ -0,0 +1,531 @@
+"""Optional DuckDB engine for aggregate-heavy statements.
+
+SQLite executes one row at a time, which makes the GROUP BY and JOIN heavy
+KPI questions slow on large fact tables. ``DuckDBEngine`` keeps a columnar
+in-memory copy of the SQLite tables in an embedded DuckDB database and runs
+statements there with vectorised, multi-threaded execution. Results come back
+as Arrow tables; DataFrames are only built for the JSON response.
+
+The copy is loaded from the SQLite file in a background thread and reloaded
+whenever ``PRAGMA data_version`` shows a commit by another connection. While
+it is loading or stale every statement runs on SQLite, so results are never
+older than the database. Columns declared ``DATE``, ``DATETIME`` or
+``TIMESTAMP`` are typed accordingly in DuckDB so date functions work; values
+that do not convert keep the column as text.
+
+``EngineRouter`` picks the engine per statement. ``SQL_ENGINE`` selects the
+mode:
+
+``sqlite``
+    Everything runs on SQLite (default).
+``duckdb``
+    The LLM is asked for DuckDB SQL and statements run on DuckDB.
+``auto``
+    The LLM keeps writing SQLite SQL. Statements that aggregate or group
+    over tables holding at least ``DUCKDB_MIN_ROWS`` rows go to DuckDB, which is set up
+    to follow SQLite's integer division and ``NULL`` ordering. Statements
+    using constructs whose results differ silently between the two stay on
+    SQLite: ``LIKE`` is case-insensitive in SQLite, ``CAST`` rounds
+    differently, ``UPPER``/``LOWER`` only fold ASCII letters in SQLite and
+    dates are text there, so ``tarih - tarih`` or ``date(x) + 1`` computes
+    something else. So do statements with un-aliased computed columns such as
+    ``COUNT(*)``, which DuckDB names ``count_star()`` while visuals refer to
+    SQLite's name.
+
+Whatever DuckDB cannot run (e.g. SQLite-only functions) falls back to SQLite,
+and the statement is remembered so it goes there directly next time.
+
+With ``PARQUET_MIRROR_DIR`` set the fact tables are not copied into memory:
+each reload syncs the ``parquet_mirror.ParquetMirror`` incrementally and
+DuckDB scans its files, with column and filter pushdown, through views of
+the same names.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from db_pool import sqlite_uri
+from metrics import RESULT_ROWS, timed
+from query_guard import QueryRejected, ensure_limit
+from result_cache import canonical_sql, read_tables, root_pages
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sqlite", "duckdb", "auto")
+DIALECTS = {"sqlite": "SQLite", "duckdb": "DuckDB", "auto": "SQLite"}
+PROMPT_HINT = (
+    "Sorgu DuckDB üzerinde çalışır. Tarih kolonları DATE tipindedir; "
+    "strftime(tarih, '%Y-%m'), date_trunc('month', tarih) ve year(tarih) kullanılabilir."
+)
+
+# Same filter as the schema registry: internal tables are not copied
+_VISIBLE = "type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_%' ESCAPE '\\'"
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_SQLITE_ONLY = re.compile(r"\b(LIKE|GLOB|CAST|TYPEOF|ROWID|COLLATE|UPPER|LOWER)\b", re.I)
+# A date(...) or datetime(...) call next to + or -: text on SQLite, a DATE on DuckDB
+_DATE_CALL = r"\b(?:date|datetime)\s*\([^()]*(?:\([^()]*\)[^()]*)*\)"
+_DATE_CALL_ARITHMETIC = re.compile(rf"{_DATE_CALL}\s*[-+]|[-+]\s*{_DATE_CALL}", re.I)
+_SELECT_TOKENS = re.compile(r"[(),]|\b(SELECT|FROM|UNION|EXCEPT|INTERSECT|WHERE|GROUP|ORDER|LIMIT)\b", re.I)
+_BARE_COLUMN = re.compile(r'^\s*(?:DISTINCT\s+)?(?:(?:\w+|"[^"]+")\s*\.\s*)?(?:\w+|"[^"]+"|\*)\s*$', re.I)
+_ALIAS = re.compile(r'(?:\bAS\s+|[\w")\]]\s+)(?:\w+|"[^"]+")\s*$', re.I)
+_NOT_ALIAS = {"END", "NULL", "TRUE", "FALSE"}
+_ANALYTIC = re.compile(r"\b(GROUP\s+BY|SUM|AVG|COUNT|MIN|MAX|TOTAL|OVER)\b", re.I)
+_DATE_TYPES = {"DATE": "date32", "DATETIME": "timestamp", "TIMESTAMP": "timestamp"}
+# SQLite's integer division and NULL ordering. Settings are per session and
+# cursors do not inherit them from their connection.
+_SESSION_SETTINGS = ("SET integer_division = true", "SET default_null_order = 'nulls_first_on_asc_last_on_desc'")
+
+
+def arrow_type(declared: str | None):
+    """Return the Arrow type for a column declared as ``declared`` in SQLite."""
+    import pyarrow as pa
+
+    declared = (declared or "").upper()
+    if declared in _DATE_TYPES:
+        return pa.date32() if _DATE_TYPES[declared] == "date32" else pa.timestamp("us")
+    # SQLite's type affinity rules
+    if "INT" in declared:
+        return pa.int64()
+    if any(t in declared for t in ("CHAR", "CLOB", "TEXT")):
+        return pa.string()
+    if any(t in declared for t in ("REAL", "FLOA", "DOUB", "NUMERIC", "DECIMAL")):
+        return pa.float64()
+    return None
+
+
+def column_array(values, declared):
+    """Return ``values`` as an Arrow array typed after ``declared``.
+
+    Falls back to text, and then to Arrow's inferred type, when the values do
+    not fit the declared type.
+    """
+    import pyarrow as pa
+
+    target = arrow_type(declared)
+    attempts = [target] if target is not None else []
+    if target in (pa.date32(), pa.timestamp("us")):
+        attempts = []
+        try:
+            return pa.array(values, pa.string()).cast(target)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass
+    for kind in attempts + [pa.string(), None]:
+        try:
+            return pa.array(values, kind)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            continue
+    return pa.array([None if v is None else str(v) for v in values], pa.string())
+
+
+def normalize_arrow(table):
+    """Return DuckDB results with the types SQLite would have returned.
+
+    ``SUM`` over integers returns ``HUGEINT``, which Arrow represents as
+    ``decimal128(38, 0)``, and dates come back as dates; SQLite returns an
+    integer and ISO text there.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = []
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_decimal(field.type):
+            column = column.cast(pa.int64() if field.type.scale == 0 else pa.float64(), safe=False)
+        elif pa.types.is_date(field.type):
+            column = column.cast(pa.string())
+        elif pa.types.is_timestamp(field.type):
+            column = pc.strftime(column, "%Y-%m-%d %H:%M:%S")
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def select_list(sql: str) -> list:
+    """Return the items of the outermost select list of ``sql``.
+
+    String literals must already be masked. CTE bodies and subqueries are
+    skipped because they are nested in parentheses.
+    """
+    items = None
+    depth = 0
+    start = 0
+    for match in _SELECT_TOKENS.finditer(sql):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth != 0:
+            continue
+        elif items is None:
+            if token.upper() == "SELECT":
+                items, start = [], match.end()
+        elif token == ",":
+            items.append(sql[start:match.start()])
+            start = match.end()
+        else:
+            items.append(sql[start:match.start()])
+            return items
+    if items is None:
+        return []
+    items.append(sql[start:])
+    return items
+
+
+def unaliased_columns(sql: str) -> bool:
+    """Tell whether the result of ``sql`` has computed columns without an alias."""
+    for item in select_list(sql):
+        if _BARE_COLUMN.match(item):
+            continue
+        alias = _ALIAS.search(item)
+        if alias is None or alias.group(0).split()[-1].upper() in _NOT_ALIAS:
+            return True
+    return False
+
+
+class DuckDBEngine:
+    """Columnar copy of a SQLite database in an in-memory DuckDB database.
+
+    ``tables`` restricts the copy to these tables (all visible tables when
+    ``None``) and ``threads`` the DuckDB worker threads. ``ready`` tells
+    whether the copy matches the SQLite file; call ``refresh`` to check and
+    reload it. The tables of ``mirror`` are read from its Parquet files
+    instead of being copied.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, path: str, tables=None, threads: int | None = None, mirror=None):
+        import duckdb
+
+        self.path = path
+        self.tables = set(tables) if tables else None
+        self.mirror = mirror
+        self.db = duckdb.connect(":memory:")
+        self._configure(self.db)
+        if threads:
+            self.db.execute(f"SET threads = {int(threads)}")
+        self.row_counts = {}
+        self.date_columns = frozenset()
+        self.loads = 0
+        self.load_seconds = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._loading = False
+        self._loaded_version = None
+        self._datasets = {}
+        self._generation = 0
+        self._watch = sqlite3.connect(sqlite_uri(path), uri=True, check_same_thread=False)
+        self._watch_lock = threading.Lock()
+
+    def _cursor(self):
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self._configure(self.db.cursor())
+            self._local.generation = None
+        if self._local.generation != self._generation:
+            self._local.generation = self._generation
+            self._attach_mirror(cursor, self._datasets)
+        return cursor
+
+    @staticmethod
+    def _configure(cursor):
+        for statement in _SESSION_SETTINGS:
+            cursor.execute(statement)
+        return cursor
+
+    @staticmethod
+    def _attach_mirror(cursor, datasets: dict) -> None:
+        # Registered datasets and temporary views are local to a cursor
+        for name, dataset in datasets.items():
+            cursor.register(f"_mirror_{name}", dataset)
+            cursor.execute(f'CREATE OR REPLACE TEMP VIEW "{name}" AS SELECT * EXCLUDE (ay) FROM "_mirror_{name}"')
+
+    def _data_version(self):
+        with self._watch_lock:
+            return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_version is not None
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded_version is not None and self._loaded_version == self._data_version()
+
+    def refresh(self, wait: bool = False) -> bool:
+        """Reload the copy when the SQLite file changed and return ``ready``.
+
+        The reload runs in a background thread unless ``wait`` is set.
+        """
+        if self.ready:
+            return True
+        with self._lock:
+            if self._loading:
+                return False
+            self._loading = True
+        if wait:
+            self._load()
+            return self.ready
+        threading.Thread(target=self._load, name="duckdb-load", daemon=True).start()
+        return False
+
+    def _load(self) -> None:
+        import pyarrow as pa
+
+        start = time.perf_counter()
+        try:
+            version = self._data_version()
+            source = sqlite3.connect(sqlite_uri(self.path), uri=True)
+            try:
+                objects = source.execute(f"SELECT name, type, sql FROM sqlite_master WHERE {_VISIBLE} "
+                                         "ORDER BY type, rowid").fetchall()
+                loaded = {}
+                datasets = {}
+                dates = set()
+                if self.mirror is not None:
+                    self.mirror.sync(source)
+                    present = {name for name, kind, _ in objects if kind == "table"}
+                    for name in self.mirror.tables:
+                        if name in present and (self.tables is None or name in self.tables):
+                            datasets[name] = self.mirror.dataset(name)
+                            dates.update(f.name for f in datasets[name].schema
+                                         if pa.types.is_date(f.type) or pa.types.is_timestamp(f.type))
+                            loaded[name] = self.mirror.rows(name)
+                cursor = self._configure(self.db.cursor())
+                self._attach_mirror(cursor, datasets)
+                # Readers keep seeing the previous copy until the commit
+                cursor.execute("BEGIN")
+                for name, kind, definition in objects:
+                    if kind != "table" or name in datasets or (self.tables is not None and name not in self.tables):
+                        continue
+                    columns = source.execute(f'SELECT name, type FROM pragma_table_info("{name}")').fetchall()
+                    rows = source.execute(f'SELECT * FROM "{name}"').fetchall()
+                    data = list(zip(*rows)) if rows else [[] for _ in columns]
+                    frame = pa.Table.from_arrays(
+                        [column_array(list(values), declared) for values, (_, declared) in zip(data, columns)],
+                        names=[c for c, _ in columns],
+                    )
+                    cursor.register("_load_frame", frame)
+                    cursor.execute(f'CREATE OR REPLACE TABLE "{name}" AS SELECT * FROM _load_frame')
+                    cursor.unregister("_load_frame")
+                    loaded[name] = frame.num_rows
+                    dates.update(f.name for f in frame.schema
+                                 if pa.types.is_date(f.type) or pa.types.is_timestamp(f.type))
+                cursor.execute("COMMIT")
+                for name, kind, definition in objects:
+                    if kind == "view" and (self.tables is None or name in self.tables):
+                        try:
+                            cursor.execute(re.sub(r"^\s*CREATE\s+VIEW", "CREATE OR REPLACE VIEW", definition,
+                                                  flags=re.I))
+                        except Exception as e:
+                            logger.info("View %s is not available in DuckDB: %s", name, e)
+                cursor.close()
+            finally:
+                source.close()
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.row_counts = loaded
+                self.date_columns = frozenset(dates)
+                self._datasets = datasets
+                self._generation += 1
+                self._loaded_version = version
+                self.loads += 1
+                self.load_seconds = seconds
+            logger.info("Loaded %d tables, %d rows into DuckDB in %.2fs", len(loaded), sum(loaded.values()), seconds)
+        except Exception:
+            logger.exception("Loading the DuckDB copy of %s failed", self.path)
+        finally:
+            with self._lock:
+                self._loading = False
+
+    def execute_arrow(self, sql: str, guard=None):
+        """Run ``sql`` and return the result as a ``pyarrow.Table``.
+
+        With a ``query_guard.QueryGuard`` the row limit and time budget apply;
+        ``attrs`` cannot be set on Arrow tables, so truncation is reported by
+        the returned flag: ``(table, truncated)``.
+        """
+        cursor = self._cursor()
+        if guard is None:
+            return normalize_arrow(cursor.execute(sql).fetch_arrow_table()), False
+        limited = ensure_limit(sql, guard.max_rows + 1 if guard.max_rows > 0 else 0)
+        with guard.deadline(cursor.interrupt):
+            table = cursor.execute(limited).fetch_arrow_table()
+        truncated = guard.max_rows > 0 and table.num_rows > guard.max_rows
+        if truncated:
+            table = table.slice(0, guard.max_rows)
+        return normalize_arrow(table), truncated
+
+    def execute(self, sql: str, guard=None):
+        """Run ``sql`` and return the result as a DataFrame, like ``execute_sql``."""
+        table, truncated = self.execute_arrow(sql, guard)
+        df = table.to_pandas()
+        if truncated:
+            df.attrs["truncated"] = True
+        return df
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": self._loaded_version is not None,
+                "loading": self._loading,
+                "tables": len(self.row_counts),
+                "rows": sum(self.row_counts.values()),
+                "loads": self.loads,
+                "load_seconds": round(self.load_seconds, 3),
+                "mirror": self.mirror.stats() if self.mirror is not None else None,
+            }
+
+
+class EngineRouter:
+    """Choose between SQLite and ``duckdb`` per statement, see the module docs."""
+
+    def __init__(self, path: str, duckdb: DuckDBEngine, mode: str = "auto", min_rows: int = 100_000,
+                 max_fallbacks: int = 1024):
+        if mode not in MODES:
+            raise ValueError(f"Unknown SQL engine {mode!r}, expected one of {', '.join(MODES)}")
+        self.path = path
+        self.duckdb = duckdb
+        self.mode = mode
+        self.min_rows = min_rows
+        self.max_fallbacks = max_fallbacks
+        self.counts = {"sqlite": 0, "duckdb": 0, "fallback": 0}
+        self._fallbacks = OrderedDict()
+        self._lock = threading.Lock()
+        self._watch = sqlite3.connect(sqlite_uri(path), uri=True, check_same_thread=False)
+        self._roots = (None, {})
+        self._date_pattern = None
+
+    @property
+    def dialect(self) -> str:
+        return DIALECTS[self.mode]
+
+    @property
+    def prompt_hint(self) -> str:
+        return PROMPT_HINT if self.mode == "duckdb" else ""
+
+    def _tables(self, sql: str):
+        with self._lock:
+            schema_version = self._watch.execute("PRAGMA schema_version").fetchone()[0]
+            if self._roots[0] != schema_version:
+                self._roots = (schema_version, root_pages(self._watch))
+            try:
+                return read_tables(self._watch, sql, self._roots[1])
+            except sqlite3.Error:
+                return None
+
+    def _date_arithmetic(self, sql: str) -> bool:
+        """Tell whether ``sql`` adds to or subtracts from a date."""
+        if _DATE_CALL_ARITHMETIC.search(sql):
+            return True
+        columns = self.duckdb.date_columns
+        if not columns:
+            return False
+        if self._date_pattern is None or self._date_pattern[0] != columns:
+            names = "|".join(re.escape(c) for c in sorted(columns, key=len, reverse=True))
+            operand = rf'(?:\w+\s*\.\s*)?"?\b(?:{names})\b"?'
+            self._date_pattern = (columns, re.compile(rf"{operand}\s*[-+]|[-+]\s*{operand}", re.I))
+        return bool(self._date_pattern[1].search(sql))
+
+    def choose(self, sql: str) -> str:
+        """Return the engine name ``sql`` should run on."""
+        if self.mode == "sqlite":
+            return "sqlite"
+        fresh = self.duckdb.refresh()
+        if self.mode == "auto" and not fresh:
+            return "sqlite"
+        key = canonical_sql(sql)
+        with self._lock:
+            if key in self._fallbacks:
+                self._fallbacks.move_to_end(key)
+                return "sqlite"
+        if self.mode == "duckdb":
+            # DuckDB SQL cannot run on SQLite, a stale copy is used until reloaded
+            return "duckdb" if self.duckdb.loaded else "sqlite"
+        masked = _STRINGS.sub("''", key)
+        if _SQLITE_ONLY.search(masked) or not _ANALYTIC.search(masked):
+            return "sqlite"
+        if self._date_arithmetic(masked) or unaliased_columns(masked):
+            return "sqlite"
+        tables = self._tables(key)
+        counts = self.duckdb.row_counts
+        if not tables or any(t not in counts for t in tables):
+            return "sqlite"
+        return "duckdb" if sum(counts[t] for t in tables) >= self.min_rows else "sqlite"
+
+    def _fallback(self, sql: str, error) -> None:
+        logger.info("DuckDB could not run the statement, using SQLite: %s", error)
+        with self._lock:
+            self.counts["fallback"] += 1
+            self._fallbacks[canonical_sql(sql)] = True
+            while len(self._fallbacks) > self.max_fallbacks:
+                self._fallbacks.popitem(last=False)
+
+    def execute(self, sql: str, guard=None, arrow: bool = False):
+        """Run ``sql`` on DuckDB when it is the better engine.
+
+        Returns the DataFrame, or ``(table, truncated)`` with ``arrow``, and
+        ``None`` when the statement has to run on SQLite instead.
+        """
+        import duckdb
+
+        if self.choose(sql) != "duckdb":
+            with self._lock:
+                self.counts["sqlite"] += 1
+            return None
+        try:
+            with timed("sql"):
+                result = self.duckdb.execute_arrow(sql, guard) if arrow else self.duckdb.execute(sql, guard)
+        except QueryRejected:
+            raise
+        except duckdb.Error as e:
+            self._fallback(sql, e)
+            with self._lock:
+                self.counts["sqlite"] += 1
+            return None
+        with self._lock:
+            self.counts["duckdb"] += 1
+        rows = result[0].num_rows if arrow else len(result)
+        RESULT_ROWS.observe(rows)
+        logger.info("SQL: %s", sql, extra={"sql": sql, "rows": rows, "engine": "duckdb"})
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        return {"mode": self.mode, "min_rows": self.min_rows, "queries": counts, "duckdb": self.duckdb.stats()}
+
+
+def router_from_env(path: str):
+    """Create an ``EngineRouter`` from environment variables or return ``None``.
+
+    ``SQL_ENGINE`` is ``sqlite`` (default, no router), ``duckdb`` or ``auto``;
+    ``DUCKDB_MIN_ROWS``, ``DUCKDB_THREADS`` and ``DUCKDB_TABLES`` (comma
+    separated) tune the DuckDB engine and ``PARQUET_MIRROR_DIR`` makes it
+    read the fact tables from a Parquet mirror. Without the ``duckdb`` package the
+    router is disabled with a warning.
+    """
+    mode = os.getenv("SQL_ENGINE", "sqlite").lower()
+    if mode == "sqlite":
+        return None
+    if mode not in MODES:
+        raise ValueError(f"Unknown SQL_ENGINE {mode!r}, expected one of {', '.join(MODES)}")
+    try:
+        import duckdb  # noqa: F401
+        import pyarrow  # noqa: F401
+    except ImportError:
+        logger.warning("SQL_ENGINE=%s needs the duckdb and pyarrow packages, using SQLite", mode)
+        return None
+    tables = [t.strip() for t in os.getenv("DUCKDB_TABLES", "").split(",") if t.strip()]
+    from parquet_mirror import mirror_from_env
+
+    engine = DuckDBEngine(path, tables or None, int(os.getenv("DUCKDB_THREADS", "0")) or None, mirror_from_env())
+    router = EngineRouter(path, engine, mode, int(os.getenv("DUCKDB_MIN_ROWS", "100000")))
+    # DuckDB SQL needs the copy from the first statement on
+    engine.refresh(wait=mode == "duckdb")
+    return router
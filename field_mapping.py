@@ -1,5 +1,7 @@
 """Mapping utilities between technical and friendly field names."""
 
+import re
+
 # Mapping from technical database names to friendly Turkish labels
 TECH_TO_FRIENDLY = {
     # Tables
@@ -63,23 +65,71 @@ TECH_TO_FRIENDLY = {
 
 TRANSLATION_TABLE = str.maketrans("çğıöşü", "cgiosu")
 
+WORD_RE = re.compile(r"\w+")
+
+
+def build_reverse_mapping(tech_to_friendly: dict) -> dict:
+    """Return casefolded (and ASCII folded) friendly labels mapped to tech names."""
+    reverse = {}
+    for tech, friendly in tech_to_friendly.items():
+        cf = friendly.casefold()
+        reverse[cf] = tech
+        ascii_cf = cf.translate(TRANSLATION_TABLE)
+        if ascii_cf != cf:
+            reverse[ascii_cf] = tech
+    return reverse
+
+
+class LabelTranslator:
+    """Single pass replacement of whole-word labels.
+
+    Labels are indexed by their text once. ``translate`` walks the words of
+    the input and, at each word, looks up the longest run of following words
+    that forms a known label. The cost depends on the length of the text and
+    the longest label (in words), not on the number of labels, and labels
+    only match on word boundaries so ``tip`` is not replaced inside ``tipi``.
+    """
+
+    def __init__(self, mapping: dict):
+        self.mapping = dict(mapping)
+        self.max_words = max((len(WORD_RE.findall(k)) for k in self.mapping), default=0)
+
+    def translate(self, text: str) -> str:
+        """Return ``text`` with every label replaced by its mapped value."""
+        words = [(m.start(), m.end()) for m in WORD_RE.finditer(text)]
+        if not words or not self.mapping:
+            return text
+        parts = []
+        pos = 0
+        i = 0
+        while i < len(words):
+            start = words[i][0]
+            for n in range(min(self.max_words, len(words) - i), 0, -1):
+                end = words[i + n - 1][1]
+                value = self.mapping.get(text[start:end])
+                if value is not None:
+                    parts.append(text[pos:start])
+                    parts.append(value)
+                    pos = end
+                    i += n
+                    break
+            else:
+                i += 1
+        parts.append(text[pos:])
+        return "".join(parts)
+
+
 # Build reverse mapping for case-insensitive replacement
-FRIENDLY_TO_TECH = {}
-for tech, friendly in TECH_TO_FRIENDLY.items():
-    cf = friendly.casefold()
-    FRIENDLY_TO_TECH[cf] = tech
-    ascii_cf = cf.translate(TRANSLATION_TABLE)
-    if ascii_cf != cf:
-        FRIENDLY_TO_TECH[ascii_cf] = tech
+FRIENDLY_TO_TECH = build_reverse_mapping(TECH_TO_FRIENDLY)
+TRANSLATOR = LabelTranslator(FRIENDLY_TO_TECH)
 
 
 def to_tech(question: str) -> str:
-    """Replace friendly labels with technical names in the given question."""
-    result = question
-    # Longer labels first to avoid partial replacements
-    for friendly, tech in sorted(FRIENDLY_TO_TECH.items(), key=lambda x: -len(x[0])):
-        result = result.replace(friendly, tech)
-    return result
+    """Replace friendly labels with technical names in the given question.
+
+    ``question`` is expected to be casefolded, see ``normalize_turkish_text``.
+    """
+    return TRANSLATOR.translate(question)
 
 
 def to_friendly(record: dict) -> dict:
@@ -87,6 +137,15 @@ def to_friendly(record: dict) -> dict:
     return {TECH_TO_FRIENDLY.get(k, k): v for k, v in record.items()}
 
 
+def friendly_frame(df):
+    """Return ``df`` with its columns renamed to friendly labels.
+
+    Renaming the columns once is much cheaper than calling ``to_friendly``
+    for every row of a large result.
+    """
+    return df.rename(columns=lambda c: TECH_TO_FRIENDLY.get(c, c))
+
+
 def friendly_name(name: str) -> str:
     """Return the friendly label for ``name`` if available."""
     return TECH_TO_FRIENDLY.get(name, name)
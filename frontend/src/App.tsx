@@ -5,7 +5,7 @@ import QueryEditor from './components/QueryEditor'
 import DataTable from './components/DataTable'
 import ChartView from './components/charts/ChartView'
 import Spinner from './components/Spinner'
-import { queryDatabase, type VisualSpec } from './api'
+import { queryDatabaseStream, type StreamRequest, type VisualSpec } from './api'
 import { useQueryHistory } from './hooks/useQueryHistory'
 import MainLayout from './layout/MainLayout'
 
@@ -20,6 +20,7 @@ export default function App() {
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState('')
   const [formError, setFormError] = useState('')
+  const [nextToken, setNextToken] = useState<string | null>(null)
   const { addQuery } = useQueryHistory()
 
   const handleSubmit = async (e: React.FormEvent) => {
@@ -30,22 +31,55 @@ export default function App() {
       setFormError('Query cannot be empty')
       return
     }
+    const normalized = normalizeInput(question)
+    const ok = await runStream({ question: normalized })
+    if (ok) addQuery(question)
+  }
+
+  // Rows are appended to the tables as soon as each chunk arrives so the
+  // first results render while the rest of the query is still streaming.
+  // Charts get the whole result, reduced by the server, from their own line.
+  const runStream = async (body: StreamRequest): Promise<boolean> => {
     setLoading(true)
     try {
-      const normalized = normalizeInput(question)
-      const res = await queryDatabase(normalized)
-      setSql(res.sql)
-      setResult(res.visuals)
-      addQuery(question)
+      const end = await queryDatabaseStream(
+        body,
+        (meta) => {
+          setSql(meta.sql)
+          if (meta.visuals) {
+            setResult(meta.visuals.map((v) => ({ ...v, data: [] })))
+          }
+        },
+        (rows) => {
+          setResult((prev) =>
+            prev
+              ? prev.map((v) => (v.type === 'table' ? { ...v, data: [...v.data, ...rows] } : v))
+              : prev,
+          )
+        },
+        (visual) => {
+          setResult((prev) =>
+            prev ? prev.map((v, i) => (i === visual.index ? { ...v, data: visual.rows } : v)) : prev,
+          )
+        },
+      )
+      setNextToken(end.next)
+      return true
     } catch (err: unknown) {
       const message = err instanceof Error ? err.message : String(err)
       setError(message)
       setResult(null)
+      setNextToken(null)
+      return false
     } finally {
       setLoading(false)
     }
   }
 
+  const handleLoadMore = () => {
+    if (nextToken) runStream({ token: nextToken })
+  }
+
   const handleFieldSelect = (field: string) => {
     setQuestion((q) => (q ? q + ' ' + field : field))
   }
@@ -135,6 +169,18 @@ export default function App() {
                 </div>
               </Card>
             ))}
+            {nextToken && (
+              <div className="flex justify-center">
+                <Button
+                  type="button"
+                  variant="secondary"
+                  onClick={handleLoadMore}
+                  disabled={loading}
+                >
+                  Daha fazla yükle
+                </Button>
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -37,6 +37,95 @@ export async function queryDatabase(question: string, context: string[] = []): P
   return data
 }
 
+export interface StreamMeta {
+  sql: string
+  columns: string[]
+  visuals?: Omit<VisualSpec, 'data'>[]
+}
+
+export interface StreamVisual {
+  index: number
+  // eslint-disable-next-line @typescript-eslint/no-explicit-any
+  rows: any[]
+  downsampled?: { method: string; rows: number; points: number }
+}
+
+export interface StreamEnd {
+  rows: number
+  next: string | null
+}
+
+export interface StreamRequest {
+  question?: string
+  context?: string[]
+  token?: string
+}
+
+// Stream results from /api/query/stream. Each NDJSON "rows" chunk is converted
+// to objects keyed by column name and handed to onRows as soon as it arrives.
+// The first page also sends one "visual" line per chart with the whole result
+// reduced for drawing, handed to onVisual the same way.
+// Resolves with the row count and the continuation token for the next page.
+export async function queryDatabaseStream(
+  body: StreamRequest,
+  onMeta: (meta: StreamMeta) => void,
+  // eslint-disable-next-line @typescript-eslint/no-explicit-any
+  onRows: (rows: any[]) => void,
+  onVisual: (visual: StreamVisual) => void = () => {},
+): Promise<StreamEnd> {
+  const res = await fetch('/api/query/stream', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(body),
+  })
+  if (!res.ok || !res.body) {
+    const text = await res.text()
+    throw new Error(text || 'API error')
+  }
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let columns: string[] = []
+  let end: StreamEnd = { rows: 0, next: null }
+
+  const toObjects = (cols: string[], rows: unknown[][]) =>
+    rows.map((row) => Object.fromEntries(cols.map((col, i) => [col, row[i]])))
+
+  const handleLine = (line: string) => {
+    if (!line.trim()) return
+    const msg = JSON.parse(line)
+    if (msg.type === 'meta') {
+      columns = msg.columns
+      onMeta(msg)
+    } else if (msg.type === 'rows') {
+      onRows(toObjects(columns, msg.rows))
+    } else if (msg.type === 'visual') {
+      onVisual({
+        index: msg.index,
+        rows: toObjects(msg.columns, msg.rows),
+        downsampled: msg.downsampled,
+      })
+    } else if (msg.type === 'end') {
+      end = { rows: msg.rows, next: msg.next }
+    } else if (msg.type === 'error') {
+      throw new Error(msg.detail || 'API error')
+    }
+  }
+
+  for (;;) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n')
+    buffer = lines.pop() ?? ''
+    lines.forEach(handleLine)
+  }
+  handleLine(buffer + decoder.decode())
+  return end
+}
+
 export interface SchemaField {
   name: string
   type: string
@@ -0,0 +1,335 @@
+"""Index advisor and builder for the company database.
+
+The advisor proposes indexes from two sources:
+
+* the schema itself: every foreign key column and every ``DATE`` column is
+  indexed by default because LLM generated SQL joins and filters on them;
+* ``EXPLAIN QUERY PLAN`` output of generated SQL observed at runtime: full
+  table scans and automatic (transient) indexes are turned into composite
+  and covering index proposals.
+
+Run ``python index_advisor.py --apply`` to build the proposals and print a
+before/after timing report.
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from db_pool import sqlite_uri
+
+SQL_KEYWORDS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "outer", "on",
+    "group", "order", "limit", "having", "union", "natural", "using", "as",
+    "select", "from", "and", "or", "not", "set", "window", "except", "intersect",
+}
+
+# Representative analytical queries used for the timing report when no
+# queries are supplied on the command line.
+DEFAULT_QUERIES = [
+    "SELECT strftime('%Y-%m', tarih) AS ay, SUM(toplam_fiyat) FROM Satislar "
+    "WHERE tarih >= date('now', '-1 year') GROUP BY ay ORDER BY ay",
+    "SELECT U.isim, SUM(S.adet) AS adet FROM Satislar S JOIN Urunler U ON S.urun_id = U.id "
+    "WHERE S.urun_id = 42 GROUP BY U.isim",
+    "SELECT M.isim, COUNT(*) FROM Musteriler M JOIN Satislar S ON S.musteri_id = M.id "
+    "WHERE M.id BETWEEN 100 AND 120 GROUP BY M.isim",
+    "SELECT C.isim, SUM(R.adet) FROM Uretim R JOIN Calisanlar C ON R.calisan_id = C.id "
+    "WHERE R.calisan_id = 7 GROUP BY C.isim",
+    "SELECT SUM(tutar) FROM Finans WHERE tip = 'Genel Gider' AND tarih >= '2024-01-01'",
+]
+
+_AUTOMATIC_RE = re.compile(r"^SEARCH (\w+) USING AUTOMATIC (?:COVERING |PARTIAL )*INDEX \(([^)]*)\)")
+_SCAN_RE = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$")
+
+
+def index_name(table: str, columns) -> str:
+    """Return the conventional index name for ``table`` and ``columns``."""
+    return "idx_{}_{}".format(table.lower(), "_".join(c.lower() for c in columns))
+
+
+def _proposal(table, columns, reason):
+    return {
+        "table": table,
+        "columns": list(columns),
+        "name": index_name(table, columns),
+        "reason": reason,
+    }
+
+
+def default_proposals(schema_details: dict) -> list:
+    """Return index proposals for all foreign key and date columns."""
+    proposals = []
+    for table in schema_details.get("tables", []):
+        for col in table.get("columns", []):
+            ctype = (col.get("type") or "").upper()
+            if "fk" in col:
+                proposals.append(_proposal(table["name"], [col["name"]], "foreign key"))
+            elif ctype in {"DATE", "DATETIME", "TIMESTAMP"}:
+                proposals.append(_proposal(table["name"], [col["name"]], "date column"))
+    return proposals
+
+
+def table_aliases(sql: str, tables) -> dict:
+    """Return a mapping of alias (and table name) to table for ``sql``."""
+    aliases = {}
+    for table in tables:
+        pattern = re.compile(rf"\b{re.escape(table)}\b(?:\s+(?:AS\s+)?(\w+))?", re.I)
+        for match in pattern.finditer(sql):
+            aliases[table.lower()] = table
+            alias = match.group(1)
+            if alias and alias.lower() not in SQL_KEYWORDS:
+                aliases[alias.lower()] = table
+    return aliases
+
+
+def predicate_columns(sql: str, alias: str, columns, single_table: bool):
+    """Return ``(equality, range)`` columns of ``alias`` used in predicates."""
+    colset = {c.lower(): c for c in columns}
+    equality, ranges = [], []
+    prefix = rf"\b{re.escape(alias)}\.(\w+)"
+    if single_table:
+        prefix = rf"(?:\b{re.escape(alias)}\.)?\b(\w+)"
+    eq_re = re.compile(prefix + r"\s*(?:=|\bIN\b|\bIS\b)", re.I)
+    range_re = re.compile(prefix + r"\s*(?:<=|>=|<|>|\bBETWEEN\b|\bLIKE\s+'[^%_'])", re.I)
+    for regex, target in ((eq_re, equality), (range_re, ranges)):
+        for match in regex.finditer(sql):
+            name = colset.get(match.group(1).lower())
+            if name and name not in target:
+                target.append(name)
+    ranges = [c for c in ranges if c not in equality]
+    return equality, ranges
+
+
+def referenced_columns(sql: str, alias: str, columns) -> list:
+    """Return columns of ``alias`` referenced anywhere in ``sql``."""
+    found = []
+    for match in re.finditer(rf"\b{re.escape(alias)}\.(\w+)", sql, re.I):
+        for col in columns:
+            if col.lower() == match.group(1).lower() and col not in found:
+                found.append(col)
+    return found
+
+
+class IndexAdvisor:
+    """Collect query plans and turn them into index proposals.
+
+    ``observe`` is cheap (one ``EXPLAIN QUERY PLAN``) and thread-safe so it
+    can run on every generated query. When ``log_path`` is set each observed
+    statement is appended as a JSON line so the CLI can replay it later.
+    """
+
+    def __init__(self, schema_details: dict, log_path: str | None = None):
+        self.set_schema(schema_details)
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._observed = Counter()
+        self._reasons = {}
+        self.queries = 0
+
+    def set_schema(self, schema_details: dict) -> None:
+        """Use ``schema_details`` for the proposals from now on."""
+        self.schema_details = schema_details
+        self.columns = {
+            t["name"]: [c["name"] for c in t["columns"]] for t in schema_details.get("tables", [])
+        }
+
+    def plan(self, conn, sql: str) -> list:
+        """Return the ``EXPLAIN QUERY PLAN`` detail lines for ``sql``."""
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+
+    def analyze(self, sql: str, plan_lines) -> list:
+        """Return proposals derived from ``plan_lines`` of ``sql``."""
+        aliases = table_aliases(sql, self.columns)
+        single_table = len(set(aliases.values())) == 1
+        proposals = []
+        for line in plan_lines:
+            auto = _AUTOMATIC_RE.match(line)
+            if auto:
+                table = aliases.get(auto.group(1).lower())
+                cols = [c.split("=")[0].strip() for c in auto.group(2).split(" AND ")]
+                cols = [c for c in cols if table and c in self.columns.get(table, [])]
+                if table and cols:
+                    proposals.append(_proposal(table, cols, "automatic index in plan"))
+                continue
+            scan = _SCAN_RE.match(line)
+            if not scan:
+                continue
+            alias = scan.group(1)
+            table = aliases.get(alias.lower())
+            if table is None:
+                continue
+            columns = self.columns[table]
+            equality, ranges = predicate_columns(sql, alias, columns, single_table)
+            key = equality + ranges[:1]
+            if not key:
+                continue
+            used = referenced_columns(sql, alias, columns)
+            extra = [c for c in used if c not in key]
+            if extra and len(key) + len(extra) <= 5:
+                proposals.append(_proposal(table, key + extra, "covering index for scan"))
+            else:
+                reason = "composite index for scan" if len(key) > 1 else "index for scan"
+                proposals.append(_proposal(table, key, reason))
+        return proposals
+
+    def observe(self, conn, sql: str) -> list:
+        """Record the plan of ``sql`` and return the proposals it produced."""
+        try:
+            lines = self.plan(conn, sql)
+        except sqlite3.Error:
+            return []
+        proposals = self.analyze(sql, lines)
+        with self._lock:
+            self.queries += 1
+            for p in proposals:
+                key = (p["table"], tuple(p["columns"]))
+                self._observed[key] += 1
+                self._reasons[key] = p["reason"]
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"sql": sql}, ensure_ascii=False) + "\n")
+        return proposals
+
+    def proposals(self, include_defaults: bool = True) -> list:
+        """Return default and observed proposals, most frequent first."""
+        result = default_proposals(self.schema_details) if include_defaults else []
+        with self._lock:
+            for (table, cols), count in self._observed.most_common():
+                p = _proposal(table, cols, self._reasons[(table, cols)])
+                p["seen"] = count
+                result.append(p)
+        return dedupe(result)
+
+
+def dedupe(proposals) -> list:
+    """Drop proposals whose columns are a prefix of another proposal."""
+    result = []
+    for p in proposals:
+        cols = tuple(p["columns"])
+        covered = any(
+            q["table"] == p["table"] and tuple(q["columns"][: len(cols)]) == cols
+            for q in proposals
+            if q is not p and len(q["columns"]) > len(cols)
+        )
+        duplicate = any(q["table"] == p["table"] and tuple(q["columns"]) == cols for q in result)
+        if not covered and not duplicate:
+            result.append(p)
+    return result
+
+
+def existing_indexes(conn) -> set:
+    """Return ``(table, columns)`` tuples of the indexes already present."""
+    found = set()
+    tables = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    for (table,) in tables:
+        for idx in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+            cols = [r[2] for r in conn.execute(f'PRAGMA index_info("{idx[1]}")').fetchall()]
+            found.add((table, tuple(cols)))
+    return found
+
+
+def build_indexes(conn, proposals) -> list:
+    """Create the indexes in ``proposals`` and return the ones created.
+
+    ``conn`` must be a read-write connection. Indexes whose columns already
+    exist (under any name) are skipped and ``ANALYZE`` is run afterwards so
+    the planner has fresh statistics.
+    """
+    present = existing_indexes(conn)
+    created = []
+    for p in proposals:
+        if (p["table"], tuple(p["columns"])) in present:
+            continue
+        cols = ", ".join(f'"{c}"' for c in p["columns"])
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{p["name"]}" ON "{p["table"]}" ({cols})')
+        created.append(p)
+    if created:
+        conn.execute("ANALYZE")
+    conn.commit()
+    return created
+
+
+def apply_default_indexes(path: str, schema_details: dict | None = None) -> list:
+    """Build the default FK and date indexes for the database at ``path``."""
+    with sqlite3.connect(path) as conn:
+        if schema_details is None:
+            from nl2sql_app import get_schema_details
+
+            schema_details = get_schema_details(conn.cursor())
+        return build_indexes(conn, default_proposals(schema_details))
+
+
+def time_queries(path: str, queries, repeat: int = 3) -> list:
+    """Return the best of ``repeat`` wall-clock timings (ms) for each query."""
+    timings = []
+    uri = sqlite_uri(path)
+    with sqlite3.connect(uri, uri=True) as conn:
+        for sql in queries:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(sql).fetchall()
+                elapsed = (time.perf_counter() - start) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append(best)
+    return timings
+
+
+def load_queries(path: str) -> list:
+    """Load SQL statements from a ``.json`` list, ``.jsonl`` log or ``.sql`` file."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".jsonl"):
+        queries = [json.loads(line)["sql"] for line in text.splitlines() if line.strip()]
+    elif path.endswith(".json"):
+        queries = json.loads(text)
+    else:
+        queries = [q.strip() for q in text.split(";") if q.strip()]
+    # Keep the order but drop repeated statements
+    return list(dict.fromkeys(queries))
+
+
+def main():
+    from nl2sql_app import DB_PATH, get_schema_details
+
+    parser = argparse.ArgumentParser(description="Propose and build SQLite indexes.")
+    parser.add_argument("--db", default=DB_PATH, help="database file")
+    parser.add_argument("--queries", help="SQL to analyse (.sql, .json or .jsonl log)")
+    parser.add_argument("--apply", action="store_true", help="build the proposed indexes")
+    parser.add_argument("--no-defaults", action="store_true", help="skip FK/date defaults")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions per query")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else DEFAULT_QUERIES
+    with sqlite3.connect(args.db) as conn:
+        advisor = IndexAdvisor(get_schema_details(conn.cursor()))
+        for sql in queries:
+            advisor.observe(conn, sql)
+    proposals = advisor.proposals(include_defaults=not args.no_defaults)
+
+    print(f"{len(proposals)} index proposals:")
+    for p in proposals:
+        print(f"  {p['name']:<45} {p['table']}({', '.join(p['columns'])})  [{p['reason']}]")
+
+    if not args.apply:
+        return
+
+    before = time_queries(args.db, queries, args.repeat)
+    with sqlite3.connect(args.db) as conn:
+        created = build_indexes(conn, proposals)
+    after = time_queries(args.db, queries, args.repeat)
+    print(f"\nCreated {len(created)} indexes.\n")
+    print(f"{'before ms':>10} {'after ms':>10} {'speedup':>8}  query")
+    for sql, b, a in zip(queries, before, after):
+        speedup = b / a if a else float("inf")
+        print(f"{b:>10.2f} {a:>10.2f} {speedup:>7.1f}x  {' '.join(sql.split())[:70]}")
+
+
+if __name__ == "__main__":
+    main()
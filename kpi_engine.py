@@ -0,0 +1,268 @@
+"""Incrementally refreshed KPI summary tables.
+
+``LLM_Guide.md`` defines SMM, GGP, Kar, Genel Gider and Stok Devir Hızı as
+formulas over ``Satislar``, ``SatinAlma``, ``Uretim``, ``Urunler`` and
+``Finans``. Computing them in every generated query means multi-JOIN CTEs over
+the fact tables. This module keeps them precomputed per product, customer and
+month:
+
+* ``KPI_GenelGider_Aylik`` – monthly overhead (``Finans`` rows with
+  ``tip = 'Genel Gider'``)
+* ``KPI_Urun_Aylik`` – per product and month: sales, production, purchases,
+  GGP per unit, allocated overhead, SMM and Kar
+* ``KPI_Musteri_Aylik`` – per customer, product and month sales
+* ``KPI_Musteri_Kar`` (view) – per customer and month sales, SMM and Kar
+* ``KPI_Stok_Devir`` (view) – per product and year stock turnover
+
+``KPI_Watermark`` stores the highest ``id`` and ``tarih`` processed for each
+fact table. A refresh only looks at rows above the ``id`` watermark and
+recomputes the months (``substr(tarih, 1, 7)``) those rows fall into. Updates
+or deletes of already processed rows are not detected; use ``--full`` after
+such changes.
+
+Run ``python kpi_engine.py`` to refresh the summaries.
+"""
+
+import argparse
+import sqlite3
+import time
+
+FACT_TABLES = ["Satislar", "Uretim", "SatinAlma", "Finans"]
+
+# Marker used to detect whether the summaries are part of a schema text
+SUMMARY_TABLE = "KPI_Urun_Aylik"
+
+PROMPT_HINT = (
+    "KPI özet tabloları mevcuttur; SMM, GGP, Kar, Genel Gider ve Stok Devir Hızı "
+    "sorularında ham tabloları JOIN etmek yerine bu tabloları kullan. "
+    "ay kolonu 'YYYY-AA' biçimindedir. "
+    "KPI_Urun_Aylik: ay ve urun_id başına satis_adet, satis_tutar, uretim_adet, "
+    "satinalma_miktar, satinalma_tutar, w_carpani, genel_gider, ggp_birim "
+    "(genel_gider * w_carpani / uretim_adet), gg_payi (ggp_birim * satis_adet), "
+    "smm (satinalma_tutar + gg_payi) ve kar (satis_tutar - smm). "
+    "KPI_Musteri_Kar: ay ve musteri_id başına satis_tutar, smm ve kar. "
+    "KPI_Musteri_Aylik: ay, musteri_id ve urun_id başına satis_adet ve satis_tutar. "
+    "KPI_GenelGider_Aylik: ay başına genel gider tutarı. "
+    "KPI_Stok_Devir: yil ve urun_id başına smm, stok_degeri ve stok_devir_hizi."
+)
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS KPI_Watermark (
+    tablo TEXT PRIMARY KEY,
+    son_id INTEGER NOT NULL,
+    son_tarih TEXT,
+    guncelleme TEXT
+)""",
+    """CREATE TABLE IF NOT EXISTS KPI_GenelGider_Aylik (
+    ay TEXT PRIMARY KEY,
+    tutar REAL
+)""",
+    """CREATE TABLE IF NOT EXISTS KPI_Urun_Aylik (
+    ay TEXT,
+    urun_id INTEGER,
+    satis_adet INTEGER,
+    satis_tutar REAL,
+    uretim_adet INTEGER,
+    satinalma_miktar INTEGER,
+    satinalma_tutar REAL,
+    w_carpani REAL,
+    genel_gider REAL,
+    ggp_birim REAL,
+    gg_payi REAL,
+    smm REAL,
+    kar REAL,
+    PRIMARY KEY (ay, urun_id),
+    FOREIGN KEY (urun_id) REFERENCES Urunler(id)
+)""",
+    """CREATE TABLE IF NOT EXISTS KPI_Musteri_Aylik (
+    ay TEXT,
+    musteri_id INTEGER,
+    urun_id INTEGER,
+    satis_adet INTEGER,
+    satis_tutar REAL,
+    PRIMARY KEY (ay, musteri_id, urun_id),
+    FOREIGN KEY (musteri_id) REFERENCES Musteriler(id),
+    FOREIGN KEY (urun_id) REFERENCES Urunler(id)
+)""",
+    """CREATE VIEW IF NOT EXISTS KPI_Musteri_Kar AS
+SELECT ay, musteri_id, satis_tutar, smm, satis_tutar - smm AS kar
+FROM (
+    SELECT m.ay, m.musteri_id,
+           SUM(m.satis_tutar) AS satis_tutar,
+           SUM(CASE WHEN u.satis_adet > 0 THEN u.smm * m.satis_adet / u.satis_adet ELSE 0 END) AS smm
+    FROM KPI_Musteri_Aylik m
+    JOIN KPI_Urun_Aylik u ON u.ay = m.ay AND u.urun_id = m.urun_id
+    GROUP BY m.ay, m.musteri_id
+)""",
+    """CREATE VIEW IF NOT EXISTS KPI_Stok_Devir AS
+SELECT substr(u.ay, 1, 4) AS yil, u.urun_id,
+       SUM(u.smm) AS smm,
+       st.stok_degeri,
+       SUM(u.smm) / NULLIF(st.stok_degeri, 0) AS stok_devir_hizi
+FROM KPI_Urun_Aylik u
+JOIN (
+    SELECT s.urun_id, SUM(s.miktar * r.birim_fiyat) AS stok_degeri
+    FROM Stoklar s JOIN Urunler r ON r.id = s.urun_id
+    GROUP BY s.urun_id
+) st ON st.urun_id = u.urun_id
+GROUP BY yil, u.urun_id""",
+]
+
+_GENEL_GIDER_SQL = """
+INSERT INTO KPI_GenelGider_Aylik (ay, tutar)
+SELECT :ay, COALESCE(SUM(tutar), 0) FROM Finans
+WHERE tip = 'Genel Gider' AND tarih >= :lo AND tarih < :hi
+"""
+
+_URUN_SQL = """
+INSERT INTO KPI_Urun_Aylik (
+    ay, urun_id, satis_adet, satis_tutar, uretim_adet, satinalma_miktar,
+    satinalma_tutar, w_carpani, genel_gider, ggp_birim, gg_payi, smm, kar
+)
+WITH s AS (
+    SELECT urun_id, SUM(adet) AS adet, SUM(toplam_fiyat) AS tutar
+    FROM Satislar WHERE tarih >= :lo AND tarih < :hi GROUP BY urun_id
+), u AS (
+    SELECT urun_id, SUM(adet) AS adet
+    FROM Uretim WHERE tarih >= :lo AND tarih < :hi GROUP BY urun_id
+), p AS (
+    SELECT urun_id, SUM(miktar) AS miktar, SUM(toplam_tutar) AS tutar
+    FROM SatinAlma WHERE tarih >= :lo AND tarih < :hi GROUP BY urun_id
+), ids AS (
+    SELECT urun_id FROM s UNION SELECT urun_id FROM u UNION SELECT urun_id FROM p
+), base AS (
+    SELECT ids.urun_id,
+           COALESCE(s.adet, 0) AS satis_adet,
+           COALESCE(s.tutar, 0) AS satis_tutar,
+           COALESCE(u.adet, 0) AS uretim_adet,
+           COALESCE(p.miktar, 0) AS satinalma_miktar,
+           COALESCE(p.tutar, 0) AS satinalma_tutar,
+           r.w_carpani,
+           (SELECT tutar FROM KPI_GenelGider_Aylik WHERE ay = :ay) AS genel_gider
+    FROM ids
+    LEFT JOIN s ON s.urun_id = ids.urun_id
+    LEFT JOIN u ON u.urun_id = ids.urun_id
+    LEFT JOIN p ON p.urun_id = ids.urun_id
+    LEFT JOIN Urunler r ON r.id = ids.urun_id
+), ggp AS (
+    SELECT *,
+           CASE WHEN uretim_adet > 0 THEN genel_gider * w_carpani / uretim_adet END AS ggp_birim
+    FROM base
+)
+SELECT :ay, urun_id, satis_adet, satis_tutar, uretim_adet, satinalma_miktar,
+       satinalma_tutar, w_carpani, genel_gider, ggp_birim,
+       COALESCE(ggp_birim * satis_adet, 0),
+       satinalma_tutar + COALESCE(ggp_birim * satis_adet, 0),
+       satis_tutar - (satinalma_tutar + COALESCE(ggp_birim * satis_adet, 0))
+FROM ggp
+"""
+
+_MUSTERI_SQL = """
+INSERT INTO KPI_Musteri_Aylik (ay, musteri_id, urun_id, satis_adet, satis_tutar)
+SELECT :ay, musteri_id, urun_id, SUM(adet), SUM(toplam_fiyat)
+FROM Satislar WHERE tarih >= :lo AND tarih < :hi
+GROUP BY musteri_id, urun_id
+"""
+
+
+def month_bounds(ay: str) -> tuple[str, str]:
+    """Return the ``[start, end)`` date strings of month ``ay`` ('YYYY-MM')."""
+    year, month = int(ay[:4]), int(ay[5:7])
+    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{ay}-01", f"{year:04d}-{month:02d}-01"
+
+
+def ensure_schema(conn) -> None:
+    """Create the summary tables, views and watermark table if missing."""
+    for stmt in SCHEMA:
+        conn.execute(stmt)
+
+
+def watermarks(conn) -> dict:
+    """Return ``{table: (son_id, son_tarih)}`` for the processed fact tables."""
+    rows = conn.execute("SELECT tablo, son_id, son_tarih FROM KPI_Watermark").fetchall()
+    return {t: (i, d) for t, i, d in rows}
+
+
+def pending_months(conn, full: bool = False) -> tuple[set, dict]:
+    """Return the months to recompute and the new watermarks.
+
+    Only rows with an ``id`` above the stored watermark are inspected unless
+    ``full`` is set.
+    """
+    marks = {} if full else watermarks(conn)
+    months = set()
+    new_marks = {}
+    for table in FACT_TABLES:
+        last_id = marks.get(table, (0, None))[0]
+        rows = conn.execute(
+            f"SELECT DISTINCT substr(tarih, 1, 7) FROM {table} WHERE id > ? AND tarih IS NOT NULL",
+            (last_id,),
+        ).fetchall()
+        months.update(r[0] for r in rows)
+        max_id, max_tarih = conn.execute(
+            f"SELECT MAX(id), MAX(tarih) FROM {table} WHERE id > ?", (last_id,)
+        ).fetchone()
+        if max_id is not None:
+            new_marks[table] = (max_id, max_tarih)
+    return months, new_marks
+
+
+def refresh(conn, full: bool = False) -> dict:
+    """Bring the KPI summaries up to date and return refresh statistics.
+
+    ``conn`` must be a read-write connection. All changes are made in a
+    single transaction so readers never see a partially refreshed month.
+    """
+    start = time.perf_counter()
+    ensure_schema(conn)
+    if full:
+        for table in ("KPI_GenelGider_Aylik", "KPI_Urun_Aylik", "KPI_Musteri_Aylik", "KPI_Watermark"):
+            conn.execute(f"DELETE FROM {table}")
+    months, new_marks = pending_months(conn, full)
+    for ay in sorted(months):
+        lo, hi = month_bounds(ay)
+        params = {"ay": ay, "lo": lo, "hi": hi}
+        for table in ("KPI_GenelGider_Aylik", "KPI_Urun_Aylik", "KPI_Musteri_Aylik"):
+            conn.execute(f"DELETE FROM {table} WHERE ay = ?", (ay,))
+        # Overhead first: the product summary reads it for the GGP
+        conn.execute(_GENEL_GIDER_SQL, params)
+        conn.execute(_URUN_SQL, params)
+        conn.execute(_MUSTERI_SQL, params)
+    for table, (max_id, max_tarih) in new_marks.items():
+        conn.execute(
+            "INSERT INTO KPI_Watermark (tablo, son_id, son_tarih, guncelleme) "
+            "VALUES (?, ?, ?, datetime('now')) "
+            "ON CONFLICT(tablo) DO UPDATE SET son_id = excluded.son_id, "
+            "son_tarih = MAX(COALESCE(son_tarih, ''), excluded.son_tarih), "
+            "guncelleme = excluded.guncelleme",
+            (table, max_id, max_tarih),
+        )
+    conn.commit()
+    return {"months": len(months), "seconds": time.perf_counter() - start}
+
+
+def refresh_database(path: str, full: bool = False) -> dict:
+    """Refresh the KPI summaries of the database at ``path``."""
+    with sqlite3.connect(path) as conn:
+        return refresh(conn, full)
+
+
+def has_summaries(schema_text: str) -> bool:
+    """Return ``True`` if ``schema_text`` describes the KPI summary tables."""
+    return SUMMARY_TABLE in schema_text
+
+
+def main():
+    from nl2sql_app import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Refresh the KPI summary tables.")
+    parser.add_argument("--db", default=DB_PATH, help="database file")
+    parser.add_argument("--full", action="store_true", help="rebuild all months")
+    args = parser.parse_args()
+    stats = refresh_database(args.db, args.full)
+    print(f"KPI özetleri güncellendi: {stats['months']} ay, {stats['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
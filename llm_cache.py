@@ -0,0 +1,164 @@
+"""Cache for LLM generated SQL/visual instructions.
+
+Answers from ``nl2sql_app.ask_llm`` are stored under a key built from the
+normalised question, the selected context fields, the model name and hashes
+of the schema text and LLM guide.  Any change to the schema or the guide
+therefore produces a new key and stale answers are never reused.
+
+Two tiers are available: an in-memory LRU with a TTL and an optional SQLite
+file which survives restarts.  Entries are stored as JSON text so callers
+always receive a fresh object they are free to modify.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(question, context, model, schema, guide_text, extra=None) -> str:
+    """Return a stable cache key for an ``ask_llm`` call.
+
+    ``question`` and ``context`` are expected to already be normalised with
+    ``normalize_turkish_text`` and ``to_tech``.  The context list is sorted so
+    the order in which fields were selected in the UI does not matter.
+    ``extra`` may hold any additional prompt input that influences the answer.
+    """
+    if context is None:
+        ctx = []
+    elif isinstance(context, (list, tuple)):
+        ctx = sorted(str(c) for c in context)
+    else:
+        ctx = [str(context)]
+    payload = {
+        "question": question,
+        "context": ctx,
+        "model": model,
+        "schema": _digest(schema or ""),
+        "guide": _digest(guide_text or ""),
+    }
+    if extra:
+        payload["extra"] = extra
+    return _digest(json.dumps(payload, ensure_ascii=False, sort_keys=True))
+
+
+class LLMCache:
+    """Two tier LRU cache for parsed LLM responses.
+
+    ``max_entries`` and ``ttl`` (seconds) control the memory tier.  When
+    ``path`` is given a SQLite database at that location is used as a second
+    tier; entries read from disk are promoted to memory.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0, path: str | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._disk = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._disk.commit()
+
+    def get(self, key: str):
+        """Return the cached instruction for ``key`` or ``None``."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(value)
+                del self._memory[key]
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created = row
+                    if now - created <= self.ttl:
+                        self._store_memory(key, created, value)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return json.loads(value)
+                    self._disk.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._disk.commit()
+            self.misses += 1
+            return None
+
+    def set(self, key: str, instruction: dict) -> None:
+        """Store ``instruction`` under ``key`` in all configured tiers."""
+        value = json.dumps(instruction, ensure_ascii=False)
+        created = time.time()
+        with self._lock:
+            self._store_memory(key, created, value)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created) VALUES (?, ?, ?)",
+                    (key, value, created),
+                )
+                self._disk.commit()
+
+    def _store_memory(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM llm_cache")
+                self._disk.commit()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current memory tier size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "persistent": self._disk is not None,
+            }
+
+
+def cache_from_env():
+    """Build an ``LLMCache`` from environment settings.
+
+    ``LLM_CACHE_ENABLED`` (default ``1``) switches the cache on or off,
+    ``LLM_CACHE_SIZE`` and ``LLM_CACHE_TTL`` configure the memory tier and
+    ``LLM_CACHE_PATH`` enables the on-disk tier.  Returns ``None`` when the
+    cache is disabled.
+    """
+    if os.getenv("LLM_CACHE_ENABLED", "1").lower() in {"0", "false", "no"}:
+        return None
+    return LLMCache(
+        max_entries=int(os.getenv("LLM_CACHE_SIZE", "512")),
+        ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+        path=os.getenv("LLM_CACHE_PATH") or None,
+    )
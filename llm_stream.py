@@ -0,0 +1,164 @@
+"""Incremental parsing of streamed LLM answers.
+
+The answer is a JSON object such as ``{"sql": "...", "visuals": [...]}``,
+sometimes wrapped in a Markdown fence or a sentence. ``AnswerParser`` is fed
+the completion as it streams in. It reports every top-level field the moment
+its value is complete, so the SQL can run while the model is still writing
+the visuals. Structural errors (a missing colon, a bad escape, mismatched
+brackets) raise ``ValueError`` as soon as they arrive, and the request can
+be aborted without waiting for the rest of the completion.
+
+Every character is looked at once; text before the first ``{`` is skipped
+and nothing after the closing ``}`` is read.
+"""
+
+import json
+
+_WHITESPACE = " \t\r\n"
+_CLOSING = {"}": "{", "]": "["}
+
+# Answers that have not started their object after this many characters are given up
+MAX_PREAMBLE = 2000
+
+
+class AnswerParser:
+    """Parse one JSON object from text chunks, see the module docs.
+
+    ``on_field(key, value)`` is called for every completed top-level field;
+    ``fields`` holds them and ``result`` the whole object once ``done``.
+    """
+
+    def __init__(self, on_field=None):
+        self.on_field = on_field
+        self.fields = {}
+        self.result = None
+        self.text = ""
+        self._pos = 0
+        self._start = None
+        self._state = "key"
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._token_start = None
+        self._key = None
+        self._literal = False
+        self._comma = False
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def _fail(self, reason: str):
+        raise ValueError(f"Invalid JSON from LLM: {reason} at offset {self._pos}")
+
+    def _complete(self, end: int) -> None:
+        raw = self.text[self._token_start:end]
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            self._fail(f"invalid value for {self._key!r}")
+        self.fields[self._key] = value
+        self._state = "after"
+        if self.on_field is not None:
+            self.on_field(self._key, value)
+
+    def feed(self, chunk: str) -> None:
+        """Consume the next part of the completion."""
+        if self.done or not chunk:
+            return
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            ch = text[self._pos]
+            if self._start is None:
+                if ch == "{":
+                    self._start = self._pos
+                    self._stack.append("{")
+                elif self._pos >= MAX_PREAMBLE:
+                    self._fail("no JSON object")
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        if self._state == "key":
+                            try:
+                                self._key = json.loads(text[self._token_start:self._pos + 1])
+                            except json.JSONDecodeError:
+                                self._fail("invalid key")
+                            self._state = "colon"
+                        else:
+                            self._complete(self._pos + 1)
+                elif ch in "\n\r" and len(self._stack) == 1:
+                    self._fail("line break in string")
+            elif self._literal:
+                if ch in _WHITESPACE or ch in ",}":
+                    self._literal = False
+                    self._complete(self._pos)
+                    continue  # the delimiter is handled in the ``after`` state
+            elif len(self._stack) > 1:
+                # Inside a nested value only strings and brackets matter
+                if ch == '"':
+                    self._in_string = True
+                elif ch in "{[":
+                    self._stack.append(ch)
+                elif ch in "}]":
+                    if self._stack.pop() != _CLOSING[ch]:
+                        self._fail("mismatched bracket")
+                    if len(self._stack) == 1:
+                        self._complete(self._pos + 1)
+            elif ch in _WHITESPACE:
+                pass
+            elif self._state == "key":
+                if ch == '"':
+                    self._in_string = True
+                    self._token_start = self._pos
+                elif ch == "}" and not self._comma:
+                    self._close()
+                else:
+                    self._fail("expected a key")
+            elif self._state == "colon":
+                if ch != ":":
+                    self._fail("expected ':'")
+                self._state = "value"
+            elif self._state == "value":
+                self._token_start = self._pos
+                if ch == '"':
+                    self._in_string = True
+                elif ch in "{[":
+                    self._stack.append(ch)
+                elif ch in "]}":
+                    self._fail("expected a value")
+                else:
+                    self._literal = True
+            elif self._state == "after":
+                if ch == ",":
+                    self._state = "key"
+                    self._comma = True
+                elif ch == "}":
+                    self._close()
+                else:
+                    self._fail("expected ',' or '}'")
+            if ch not in _WHITESPACE and self._state != "key":
+                self._comma = False
+            self._pos += 1
+
+    def _close(self) -> None:
+        self._stack.pop()
+        self.result = dict(self.fields)
+
+    def finish(self) -> dict:
+        """Return the parsed object; raise ``ValueError`` if it never completed."""
+        if not self.done:
+            self._fail("incomplete answer")
+        return self.result
+
+
+def parse_answer(text: str) -> dict:
+    """Return the first JSON object in ``text``, parsed in a single pass."""
+    parser = AnswerParser()
+    parser.feed(text)
+    return parser.finish()
@@ -0,0 +1,47 @@
+"""Logging setup shared by the CLI and the API server.
+
+``LOG_LEVEL`` (default ``INFO``) gates the output. Full payload dumps (raw LLM
+answers, result rows, response bodies) are logged at ``DEBUG`` so they can be
+switched off in production. ``LOG_FORMAT=json`` writes one JSON object per
+line including any ``extra`` fields passed to the logging call.
+"""
+
+import json
+import logging
+import os
+import sys
+
+# Attributes present on every LogRecord; anything else came from ``extra``
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single line JSON objects."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str | None = None, fmt: str | None = None) -> None:
+    """Configure the root logger from arguments or ``LOG_LEVEL``/``LOG_FORMAT``."""
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+    handler = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
@@ -0,0 +1,253 @@
+"""In-process metrics and per-request stage tracing.
+
+Counters and histograms are kept in memory and rendered in the Prometheus
+text exposition format by ``render()`` for the ``/metrics`` endpoint; no
+client library is needed.
+
+``timed(stage)`` measures one pipeline stage. The duration is always added to
+the ``nl2sql_stage_seconds`` histogram and, when a ``Trace`` is active in the
+current context (see ``start_trace``), also recorded on that trace so the
+request log line and the ``Server-Timing`` header show where the time went.
+"""
+
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+logger = logging.getLogger(__name__)
+
+
+def _label_text(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _label_text(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets and optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                yield f"{self.name}_bucket", _label_text(names, key + (_number(bound),)), running
+            yield f"{self.name}_sum", _label_text(self.labelnames, key), total
+            yield f"{self.name}_count", _label_text(self.labelnames, key), count
+
+
+class Registry:
+    """Collection of metrics plus callbacks reporting gauges on demand.
+
+    A collector is a callable returning ``(name, help, {labels_tuple: value})``
+    entries where ``labels_tuple`` holds ``(label, value)`` pairs.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn) -> None:
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        for collector in self._collectors:
+            for name, help, values in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in values.items():
+                    text = _label_text([k for k, _ in labels], [v for _, v in labels])
+                    lines.append(f"{name}{text} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "nl2sql_stage_seconds", "Duration of pipeline stages in seconds.", ["stage"]))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "nl2sql_http_request_seconds", "HTTP request latency in seconds.", ["path", "status"]))
+REQUESTS = REGISTRY.register(Counter(
+    "nl2sql_http_requests_total", "HTTP requests by path and status.", ["path", "status"]))
+RESULT_ROWS = REGISTRY.register(Histogram(
+    "nl2sql_result_rows", "Rows returned by generated SQL.", buckets=SIZE_BUCKETS))
+RESPONSE_BYTES = REGISTRY.register(Histogram(
+    "nl2sql_response_bytes", "Size of query response bodies in bytes.", ["encoding"], buckets=SIZE_BUCKETS))
+SQL_REPAIRS = REGISTRY.register(Counter(
+    "nl2sql_sql_repairs_total", "Generated statements that did not compile, by how they were repaired.", ["result"]))
+
+
+class Trace:
+    """Stage durations of one request, in the order they were recorded."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = []
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages.append((stage, seconds))
+
+    def as_dict(self) -> dict:
+        """Return stage durations in milliseconds, summing repeated stages."""
+        out = {}
+        for stage, seconds in self.stages:
+            out[stage] = round(out.get(stage, 0.0) + seconds * 1000, 3)
+        return out
+
+    def server_timing(self) -> str:
+        """Return the value of a ``Server-Timing`` header for this trace."""
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in self.as_dict().items())
+
+
+_TRACE = contextvars.ContextVar("nl2sql_trace", default=None)
+
+
+def start_trace() -> Trace:
+    """Start a trace for the current context and return it."""
+    trace = Trace()
+    _TRACE.set(trace)
+    return trace
+
+
+def current_trace() -> Trace | None:
+    return _TRACE.get()
+
+
+@contextmanager
+def timed(stage: str):
+    """Measure the enclosed block as ``stage``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def record(stage: str, seconds: float) -> None:
+    """Record ``seconds`` spent in ``stage`` for blocks ``timed`` cannot wrap."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _TRACE.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+class MetricsMiddleware:
+    """ASGI middleware tracing every HTTP request.
+
+    A ``Trace`` is started per request, its stages are returned in a
+    ``Server-Timing`` header and logged with the request, and the request
+    latency is recorded per route path and status. Being plain ASGI it does
+    not buffer streaming responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = start_trace()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = trace.server_timing()
+                if timing:
+                    headers = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            seconds = time.perf_counter() - trace.start
+            # Label by route template so unknown paths cannot grow the series
+            path = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(seconds, path=path, status=status)
+            REQUESTS.inc(path=path, status=status)
+            logger.info(
+                "%s %s %s %.1fms", scope["method"], scope["path"], status, seconds * 1000,
+                extra={"status": status, "duration_ms": round(seconds * 1000, 3), "stages": trace.as_dict()},
+            )
+
+
+def render() -> str:
+    """Return all metrics in the Prometheus text format."""
+    return REGISTRY.render()
@@ -1,12 +1,20 @@
+import asyncio
+import logging
 import os
-import sqlite3
 import json
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-import openai
+import time
 from dotenv import load_dotenv
 import re
+import kpi_engine
+from db_pool import get_pool
+from llm_cache import cache_from_env, make_cache_key
+from llm_stream import AnswerParser, parse_answer
+from log_config import configure_logging
+from metrics import RESULT_ROWS, record, timed
+from query_guard import QueryRejected, guard_from_env
+from schema_registry import registry_for
+
+logger = logging.getLogger(__name__)
 
 def normalize_turkish_text(text: str) -> str:
     """Return a cleaned version of the user input for Turkish compatibility."""
@@ -16,15 +24,21 @@ def normalize_turkish_text(text: str) -> str:
     text = text.casefold()
     return text
 
-# Path to the database
-DB_PATH = os.path.join(os.path.dirname(__file__), 'Database', 'demo_sirket.db')
+# Path to the database, overridable with ``NL2SQL_DB_PATH`` (used by the
+# benchmarks to point the API at generated databases of other sizes)
+DB_PATH = os.getenv(
+    "NL2SQL_DB_PATH", os.path.join(os.path.dirname(__file__), 'Database', 'demo_sirket.db')
+)
+
+# SQL dialect requested from the LLM and an optional extra instruction for
+# it, set from ``engines.EngineRouter`` when another engine runs the SQL
+SQL_DIALECT = "SQLite"
+DIALECT_HINT = ""
 
 # Path to the LLM guide which is included in every system prompt. The location
 # can be overridden with the ``LLM_GUIDE_PATH`` environment variable.
 LLM_GUIDE_PATH = os.path.join(os.path.dirname(__file__), "LLM_Guide.md")
 
-SCHEMA_CACHE = None
-SCHEMA_DETAILS_CACHE = None
 GUIDE_TEXT_CACHE = None
 
 
@@ -34,7 +48,7 @@ def load_llm_guide(path: str | None = None) -> str:
     When ``path`` is ``None`` the location specified by ``LLM_GUIDE_PATH`` is
     used. The guide text is cached after the first successful read so repeated
     calls avoid disk access. If the file cannot be read an empty string is
-    returned and a warning is printed.
+    returned and a warning is logged.
     """
     global GUIDE_TEXT_CACHE
     guide_file = path or os.getenv("LLM_GUIDE_PATH", LLM_GUIDE_PATH)
@@ -44,7 +58,7 @@ def load_llm_guide(path: str | None = None) -> str:
         with open(guide_file, "r", encoding="utf-8") as f:
             text = f.read()
     except OSError as e:
-        print(f"[WARN] Unable to load LLM guide from {guide_file}: {e}")
+        logger.warning("Unable to load LLM guide from %s: %s", guide_file, e)
         text = ""
     if path is None:
         GUIDE_TEXT_CACHE = text
@@ -55,63 +69,32 @@ def parse_llm_response(content: str) -> dict:
     """Return JSON object extracted from raw LLM string.
 
     Logs the raw value for debugging and attempts to parse the first JSON
-    object found. Raises ``ValueError`` if parsing fails.
+    object found, see ``llm_stream.parse_answer``. Raises ``ValueError`` if
+    parsing fails.
     """
-    print("[LLM RAW RESPONSE]", content)
+    logger.debug("LLM raw response: %s", content)
     text = content.strip()
     try:
         return json.loads(text)
     except json.JSONDecodeError:
-        match = re.search(r"\{.*\}", text, re.S)
-        if match:
-            try:
-                return json.loads(match.group(0))
-            except json.JSONDecodeError:
-                pass
-    raise ValueError("Invalid JSON from LLM")
+        return parse_answer(text)
 
 def get_schema(cursor):
     """Return a textual description of the SQLite schema."""
-    global SCHEMA_CACHE
-    if SCHEMA_CACHE is not None:
-        return SCHEMA_CACHE
-    tables = cursor.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"
-    ).fetchall()
-    schema_lines = []
-    for (tbl,) in tables:
-        cols = cursor.execute(f'PRAGMA table_info({tbl});').fetchall()
-        col_defs = ', '.join([f"{c[1]} ({c[2]})" for c in cols])
-        schema_lines.append(f"{tbl}: {col_defs}")
-    SCHEMA_CACHE = '\n'.join(schema_lines)
-    return SCHEMA_CACHE
+    conn = cursor.connection
+    return registry_for(conn).snapshot(conn).text
 
 
 def get_schema_details(cursor):
-    """Return structured schema details including columns and foreign keys."""
-    global SCHEMA_DETAILS_CACHE
-    if SCHEMA_DETAILS_CACHE is not None:
-        return SCHEMA_DETAILS_CACHE
-    tables = cursor.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"
-    ).fetchall()
-    result = {"tables": []}
-    for (tbl,) in tables:
-        cols = cursor.execute(f'PRAGMA table_info({tbl});').fetchall()
-        fks = cursor.execute(f'PRAGMA foreign_key_list({tbl});').fetchall()
-        fk_map = {fk[3]: {"table": fk[2], "column": fk[4]} for fk in fks}
-        columns = []
-        for c in cols:
-            col = {"name": c[1], "type": c[2]}
-            if c[1] in fk_map:
-                col["fk"] = fk_map[c[1]]
-            columns.append(col)
-        result["tables"].append({"name": tbl, "columns": columns})
-    SCHEMA_DETAILS_CACHE = result
-    return result
-
-def ask_llm(question, schema, model, context=None):
-    """Use OpenAI to translate a question into SQL and chart instructions.
+    """Return structured schema details including columns and foreign keys.
+
+    The result is shared with the schema registry and must not be modified.
+    """
+    conn = cursor.connection
+    return registry_for(conn).snapshot(conn).details
+
+def build_messages(question, schema, context=None):
+    """Return the chat messages sent to the LLM for ``question``.
 
     ``context`` may contain a list of field names that the user selected in the
     UI. When provided this is added to the system prompt so the LLM can focus on
@@ -119,7 +102,7 @@ def ask_llm(question, schema, model, context=None):
     """
     system_prompt = (
         "You are a data analyst expert in SQL. "
-        "Translate the user's question into an SQLite compatible SQL query using the provided schema. "
+        f"Translate the user's question into a {SQL_DIALECT} compatible SQL query using the provided schema. "
         "Decide whether the user wants a chart, a table or both. "
         "For charts specify the type (bar, line or scatter) and which column is used for x and which column or columns are used for y. "
         "When multiple series are requested return all y columns as a JSON array. "
@@ -139,61 +122,315 @@ def ask_llm(question, schema, model, context=None):
     guide_text = load_llm_guide()
     if guide_text:
         system_prompt += "\n\n" + guide_text
+    # Steer KPI questions to the precomputed summaries when they are available
+    if kpi_engine.has_summaries(schema):
+        system_prompt += "\n\n" + kpi_engine.PROMPT_HINT
+    if DIALECT_HINT:
+        system_prompt += "\n\n" + DIALECT_HINT
     user_prompt = f"Schema:\n{schema}\n\nQuestion: {question}"
-    response = openai.chat.completions.create(
-        model=model,
-        messages=[{"role": "system", "content": system_prompt},
-                 {"role": "user", "content": user_prompt}],
-        temperature=0
-    )
+    return [{"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}]
+
+
+def build_repair_messages(question, schema, instruction, error, context=None):
+    """Return the messages asking the LLM to fix ``instruction`` after ``error``.
+
+    The original conversation is replayed so the answer keeps its visuals.
+    """
+    messages = build_messages(question, schema, context)
+    messages.append({"role": "assistant", "content": json.dumps(instruction, ensure_ascii=False)})
+    messages.append({"role": "user", "content": (
+        f"Bu SQL SQLite üzerinde derlenemedi: {error}\n"
+        "Yalnızca şemadaki tablo ve kolon adlarını kullanarak sorguyu düzelt ve yanıtı aynı JSON biçiminde döndür."
+    )})
+    return messages
+
+
+def store_answer(cache, question, schema, model, context, instruction):
+    """Replace the cached answer for ``question``, e.g. with a repaired one."""
+    if cache is not None:
+        key, _ = _cache_lookup(cache, question, schema, model, context)
+        _cache_store(cache, key, instruction)
+
+
+def _cache_lookup(cache, question, schema, model, context):
+    """Return ``(key, cached_instruction)`` for ``cache`` or ``(None, None)``."""
+    if cache is None:
+        return None, None
+    with timed("llm_cache"):
+        # Answers for another dialect must not be served from the same entry
+        extra = {"dialect": SQL_DIALECT} if SQL_DIALECT != "SQLite" else None
+        key = make_cache_key(question, context, model, schema, load_llm_guide(), extra)
+        return key, cache.get(key)
+
+
+def _cache_store(cache, key, instruction):
+    if key is not None and "error" not in instruction:
+        cache.set(key, instruction)
+
+
+def ask_llm(question, schema, model, context=None, cache=None):
+    """Use OpenAI to translate a question into SQL and chart instructions.
+
+    See ``build_messages`` for the meaning of ``context``.
+
+    ``cache`` may be an object with ``get(key)`` and ``set(key, value)``
+    methods such as ``llm_cache.LLMCache``. Repeated questions are then served
+    from the cache without calling the LLM. Error answers are not cached.
+    """
+    import openai
+
+    key, cached = _cache_lookup(cache, question, schema, model, context)
+    if cached is not None:
+        return cached
+    with timed("llm_request"):
+        response = openai.chat.completions.create(
+            model=model,
+            messages=build_messages(question, schema, context),
+            temperature=0
+        )
     content = response.choices[0].message.content
-    return parse_llm_response(content)
+    with timed("llm_parse"):
+        instruction = parse_llm_response(content)
+    _cache_store(cache, key, instruction)
+    return instruction
 
-def execute_sql(conn, sql):
-    """Run the SQL and print the query and first rows for debugging."""
-    df = pd.read_sql_query(sql, conn)
-    # Explicit logging so API callers can see exactly what was run
-    print("[SQL]:", sql)
-    # Convert first 5 rows to a list of dicts for readable output
-    rows = df.head().to_dict(orient="records")
-    print("[Rows]:", rows)
-    # Example output:
-    # [SQL]: SELECT * FROM Calisanlar LIMIT 2
-    # [Rows]: [{"id": 1, "isim": "Ahmet"}, {"id": 2, "isim": "Mehmet"}]
-    return df
 
-def display_result(df, chart_type, x=None, y=None):
-    if chart_type == 'table' or df.empty:
-        print(df)
-        return
+def ask_llm_repair(question, schema, model, instruction, error, context=None):
+    """Ask the LLM once to fix the SQL of ``instruction`` that failed with ``error``."""
+    import openai
 
-    sns.set(style="whitegrid")
-    plt.figure(figsize=(10, 6))
+    with timed("llm_repair"):
+        response = openai.chat.completions.create(
+            model=model,
+            messages=build_repair_messages(question, schema, instruction, error, context),
+            temperature=0
+        )
+    with timed("llm_parse"):
+        return parse_llm_response(response.choices[0].message.content)
 
-    if chart_type == 'bar':
-        if isinstance(y, (list, tuple)):
-            df_melt = df.melt(id_vars=[x], value_vars=list(y), var_name='series', value_name='value')
-            sns.barplot(data=df_melt, x=x, y='value', hue='series')
-        else:
-            sns.barplot(data=df, x=x, y=y)
-    elif chart_type == 'line':
-        if isinstance(y, (list, tuple)):
-            df_melt = df.melt(id_vars=[x], value_vars=list(y), var_name='series', value_name='value')
-            sns.lineplot(data=df_melt, x=x, y='value', hue='series', marker='o')
-        else:
-            sns.lineplot(data=df, x=x, y=y, marker='o')
-    elif chart_type == 'scatter':
-        sns.scatterplot(data=df, x=x, y=y)
-    else:
-        print(df)
-        return
 
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    plt.show()
+# Shared async client and concurrency limit for ``ask_llm_async``. Both are
+# created on first use so the API key configured at startup is picked up.
+ASYNC_CLIENT = None
+LLM_SEMAPHORE = None
+
+
+def get_async_client():
+    """Return the shared ``openai.AsyncOpenAI`` client.
+
+    The request timeout is read from ``LLM_TIMEOUT`` (seconds, default 60).
+    """
+    global ASYNC_CLIENT
+    if ASYNC_CLIENT is None:
+        import openai
+
+        ASYNC_CLIENT = openai.AsyncOpenAI(
+            api_key=openai.api_key or os.getenv("OPENAI_API_KEY"),
+            timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        )
+    return ASYNC_CLIENT
+
+
+def get_llm_semaphore():
+    """Return the semaphore bounding concurrent LLM requests.
+
+    The limit is read from ``LLM_MAX_CONCURRENCY`` (default 8).
+    """
+    global LLM_SEMAPHORE
+    if LLM_SEMAPHORE is None:
+        LLM_SEMAPHORE = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+    return LLM_SEMAPHORE
+
+
+async def ask_llm_async(question, schema, model, context=None, cache=None):
+    """Async variant of ``ask_llm`` that never blocks the event loop.
+
+    Requests go through the shared ``AsyncOpenAI`` client and at most
+    ``LLM_MAX_CONCURRENCY`` of them are in flight at once. Cache hits return
+    immediately without waiting for the semaphore.
+    """
+    key, cached = _cache_lookup(cache, question, schema, model, context)
+    if cached is not None:
+        return cached
+    semaphore = get_llm_semaphore()
+    with timed("llm_queue"):
+        await semaphore.acquire()
+    try:
+        with timed("llm_request"):
+            response = await get_async_client().chat.completions.create(
+                model=model,
+                messages=build_messages(question, schema, context),
+                temperature=0
+            )
+    finally:
+        semaphore.release()
+    content = response.choices[0].message.content
+    with timed("llm_parse"):
+        instruction = parse_llm_response(content)
+    _cache_store(cache, key, instruction)
+    return instruction
+
+async def ask_llm_stream_async(question, schema, model, context=None, cache=None, on_sql=None):
+    """Streaming variant of ``ask_llm_async``.
+
+    The completion is parsed while it arrives (``llm_stream.AnswerParser``).
+    ``on_sql(sql)`` is called as soon as the ``sql`` field is complete, so the
+    caller can start executing it while the visuals are still generated; on a
+    cache hit it is called with the cached statement. A malformed answer
+    raises ``ValueError`` at the first bad token and the stream is closed
+    without reading the rest.
+    """
+    key, cached = _cache_lookup(cache, question, schema, model, context)
+    if cached is not None:
+        if on_sql is not None and "error" not in cached and cached.get("sql"):
+            on_sql(cached["sql"])
+        return cached
+    semaphore = get_llm_semaphore()
+    with timed("llm_queue"):
+        await semaphore.acquire()
+    try:
+        start = time.perf_counter()
+
+        def on_field(name, value):
+            if name == "sql" and "error" not in parser.fields and isinstance(value, str):
+                record("llm_sql", time.perf_counter() - start)
+                if on_sql is not None:
+                    on_sql(value)
+
+        parser = AnswerParser(on_field)
+        # Server-sent events are decoded with ``json.loads``; the SDK would
+        # build a typed model for every token. Leaving the block closes the
+        # connection, also when the parser gives up early.
+        with timed("llm_request"):
+            async with get_async_client().chat.completions.with_streaming_response.create(
+                model=model,
+                messages=build_messages(question, schema, context),
+                temperature=0,
+                stream=True,
+            ) as response:
+                async for line in response.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices")
+                    content = choices[0].get("delta", {}).get("content") if choices else None
+                    if content:
+                        parser.feed(content)
+                        if parser.done:
+                            break
+    finally:
+        semaphore.release()
+    logger.debug("LLM raw response: %s", parser.text)
+    instruction = parser.finish()
+    _cache_store(cache, key, instruction)
+    return instruction
+
+async def ask_llm_repair_async(question, schema, model, instruction, error, context=None):
+    """Ask the LLM once to fix the SQL of ``instruction`` that failed with ``error``.
+
+    Shares the concurrency limit of ``ask_llm_async``; the answer is not
+    cached here, see ``store_answer``.
+    """
+    semaphore = get_llm_semaphore()
+    with timed("llm_queue"):
+        await semaphore.acquire()
+    try:
+        with timed("llm_repair"):
+            response = await get_async_client().chat.completions.create(
+                model=model,
+                messages=build_repair_messages(question, schema, instruction, error, context),
+                temperature=0
+            )
+    finally:
+        semaphore.release()
+    with timed("llm_parse"):
+        return parse_llm_response(response.choices[0].message.content)
+
+async def run_batch(questions, model, schema_for, execute, context=None, cache=None,
+                    concurrency=8, prepare=normalize_turkish_text, validate=None):
+    """Answer many questions concurrently and yield each result as it finishes.
+
+    Questions that are identical after ``prepare`` are asked and executed
+    only once. At most ``concurrency`` of them are in flight; the LLM calls
+    are additionally bounded by ``LLM_MAX_CONCURRENCY``. ``schema_for(question)``
+    is awaited for the prompt schema and ``execute(sql)`` to run the SQL, e.g.
+    on a pooled connection in a thread pool. ``validate(question, schema,
+    instruction)``, when given, is awaited before execution and returns the
+    instruction to run, e.g. with repaired SQL.
+
+    Every yielded dict holds ``question`` (the prepared text), ``indexes``
+    (positions in ``questions``), ``instruction``, ``result`` and ``error``.
+    Answers carrying an ``error`` key are yielded without running SQL; other
+    failures are returned as the exception in ``error``.
+    """
+    groups = {}
+    for i, question in enumerate(questions):
+        groups.setdefault(prepare(question), []).append(i)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def answer(question, indexes):
+        item = {"question": question, "indexes": indexes, "instruction": None, "result": None, "error": None}
+        async with semaphore:
+            try:
+                schema = await schema_for(question)
+                item["instruction"] = await ask_llm_async(question, schema, model, context, cache)
+                if validate is not None and "error" not in item["instruction"]:
+                    item["instruction"] = await validate(question, schema, item["instruction"])
+                if "error" not in item["instruction"]:
+                    item["result"] = await execute(item["instruction"].get("sql"))
+            except Exception as e:
+                item["error"] = e
+        return item
+
+    tasks = [asyncio.ensure_future(answer(q, idx)) for q, idx in groups.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Stop outstanding work when the consumer goes away early
+        for task in tasks:
+            task.cancel()
+
+def execute_sql(conn, sql, guard=None):
+    """Run the SQL and log the query and, at debug level, the first rows.
+
+    With a ``query_guard.QueryGuard`` the statement is cost checked, limited
+    and time-boxed; a refused statement raises ``QueryRejected``.
+    """
+    import pandas as pd
+
+    with timed("sql"):
+        if guard is None:
+            df = pd.read_sql_query(sql, conn)
+        else:
+            guarded = guard.prepare(conn, sql)
+            with guard.budget(conn):
+                df = pd.read_sql_query(guarded, conn)
+            df = guard.cap(df)
+    RESULT_ROWS.observe(len(df))
+    # Explicit logging so API callers can see exactly what was run
+    logger.info("SQL: %s", sql, extra={"sql": sql, "rows": len(df)})
+    if logger.isEnabledFor(logging.DEBUG):
+        # First 5 rows as a list of dicts for readable output, e.g.
+        # Rows: [{"id": 1, "isim": "Ahmet"}, {"id": 2, "isim": "Mehmet"}]
+        logger.debug("Rows: %s", df.head().to_dict(orient="records"))
+    return df
 
 def main():
+    global SQL_DIALECT, DIALECT_HINT
+    import openai
+    from chart_render import CHART_TYPES, renderer_from_env
+    from engines import router_from_env
+    from shards import shards_from_env
+    from sql_repair import repair
+    from value_index import hint_text, value_index_from_env
+
     load_dotenv()
+    configure_logging()
     api_key = os.getenv('OPENAI_API_KEY')
     model = os.getenv('OPENAI_MODEL', 'gpt-4-turbo')
     repo_url = os.getenv('REPO_URL')
@@ -203,9 +440,23 @@ def main():
     if repo_url:
         print(f'Using repository: {repo_url}')
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    schema = get_schema(cursor)
+    # With NL2SQL_SHARDS set the first shard provides the schema
+    shard_set = shards_from_env()
+    pool = shard_set.pools[0] if shard_set is not None else get_pool(DB_PATH)
+    conn = pool.acquire()
+    router = router_from_env(DB_PATH) if shard_set is None else None
+    if router is not None:
+        SQL_DIALECT, DIALECT_HINT = router.dialect, router.prompt_hint
+    schemas = registry_for(conn)
+    retrieval = os.getenv("SCHEMA_RETRIEVAL", "1").lower() not in {"0", "false", "no"}
+    top_k = int(os.getenv("SCHEMA_TOP_K", "5"))
+    values = value_index_from_env(shard_set.paths[0] if shard_set is not None else DB_PATH)
+    cache = cache_from_env()
+    guard = guard_from_env()
+    # Charts are written to files by worker processes instead of blocking windows
+    renderer = renderer_from_env()
+    chart_dir = os.getenv("CHART_DIR", "charts")
+    chart_format = os.getenv("CHART_FORMAT", "png")
 
     print("Ask me about the company database. Type 'exit' to quit.")
     while True:
@@ -216,25 +467,65 @@ def main():
         # Normalize Turkish input to reduce user-side mistakes
         question = normalize_turkish_text(question_raw)
         try:
-            instruction = ask_llm(question, schema, model)
+            # Picks up schema changes made while the CLI is running
+            snapshot = schemas.snapshot(conn)
+            matches = []
+            if values is not None:
+                values.update(snapshot.details)
+                matches = values.lookup(question)
+            if retrieval:
+                prompt_schema = snapshot.index.schema_for(question, top_k, fallback=snapshot.text,
+                                                          extra=[m.table for m in matches])
+            else:
+                prompt_schema = snapshot.text
+            if matches:
+                prompt_schema += "\n\n" + hint_text(matches)
+            instruction = ask_llm(question, prompt_schema, model, cache=cache)
             if 'error' in instruction:
                 print('LLM error:', instruction['error'])
                 continue
             sql = instruction.get('sql')
+            if sql and SQL_DIALECT == "SQLite":
+                # Fix misspelt names locally, otherwise ask the LLM once
+                repaired, error, fixes = repair(conn, sql, snapshot.details)
+                if error is not None:
+                    print("SQL does not compile, asking the LLM to repair it:", error)
+                    instruction = ask_llm_repair(question, prompt_schema, model, instruction, error)
+                    if 'error' in instruction:
+                        print('LLM error:', instruction['error'])
+                        continue
+                    repaired, error, fixes = repair(conn, instruction.get('sql', ''), snapshot.details)
+                if fixes:
+                    print("Repaired:", ", ".join(fixes))
+                if error is None and repaired != sql:
+                    store_answer(cache, question, prompt_schema, model, None, {**instruction, "sql": repaired})
+                sql = repaired
             visuals = instruction.get('visuals', [])
             print("Executing SQL:\n", sql)
-            df = execute_sql(conn, sql)
-            for vis in visuals:
-                vtype = vis.get('type', 'table')
-                x = vis.get('x')
-                y = vis.get('y')
-                display_result(df, vtype, x, y)
+            if shard_set is not None:
+                df = shard_set.execute(sql, guard)
+            else:
+                df = router.execute(sql, guard) if router is not None else None
+                if df is None:
+                    df = execute_sql(conn, sql, guard)
+            if df.attrs.get("truncated"):
+                print(f"Result truncated to {guard.max_rows} rows")
+            charts = [vis for vis in visuals if vis.get('type', 'table') in CHART_TYPES]
+            if len(charts) < len(visuals) or (charts and df.empty):
+                print(df)
+            if charts and not df.empty:
+                name = time.strftime("%Y%m%d-%H%M%S")
+                for path in renderer.export([(name, df, charts)], chart_dir, chart_format):
+                    print("Chart saved:", path)
+        except QueryRejected as e:
+            print('Query rejected:', e.to_dict())
         except ValueError as e:
             print('LLM JSON error:', e)
         except Exception as e:
             print('Error:', e)
 
-    conn.close()
+    renderer.close()
+    pool.close_all()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,334 @@
+"""Columnar Parquet mirror of the fact tables.
+
+Analytical questions over ``Satislar``, ``Uretim``, ``SatinAlma`` and
+``Finans`` usually touch a date range and two or three columns, yet SQLite
+reads every page of the table, whole rows at a time. ``ParquetMirror`` keeps
+a copy of these tables as Parquet files partitioned by the month of
+``tarih``::
+
+    <root>/Satislar/ay=2024-01/part-000000000001-000000004211.parquet
+    <root>/Satislar/ay=2024-02/...
+    <root>/_mirror.json
+
+``sync`` appends the rows whose ``id`` is above the stored watermark, one
+file per touched month and batch, and merges partitions that collected more
+than ``max_parts`` files. Like the KPI summaries the mirror assumes the fact
+tables are append-only: updated or deleted rows are only picked up by a
+``--full`` rebuild. A table whose columns changed, or whose largest ``id``
+went below the watermark, is rebuilt automatically.
+
+Reads go through ``pyarrow.dataset`` on memory-mapped files: only the
+requested columns are decoded, months outside a range filter are skipped on
+their directory name (``scan``) or their footer statistics (filters pushed
+down by DuckDB), so a yearly total of ``toplam_fiyat`` touches a fraction of
+the bytes SQLite would. ``engines.DuckDBEngine`` queries the mirror directly
+when ``PARQUET_MIRROR_DIR`` is set. Run the sync job with::
+
+    python parquet_mirror.py [--full]
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from db_pool import sqlite_uri
+from engines import column_array
+from kpi_engine import FACT_TABLES
+
+logger = logging.getLogger(__name__)
+
+PARTITION = "ay"
+# pyarrow's name for the partition of rows whose ``tarih`` is NULL
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+STATE_FILE = "_mirror.json"
+TRASH_DIR = "_trash"
+
+
+def _month(value) -> str:
+    if isinstance(value, str) and len(value) >= 7:
+        return value[:7]
+    return NULL_PARTITION
+
+
+def _part_ids(name: str) -> tuple[int, int]:
+    first, last = name[len("part-"):-len(".parquet")].split("-")
+    return int(first), int(last)
+
+
+class ParquetMirror:
+    """Month-partitioned Parquet copy of ``tables`` below ``root``.
+
+    ``batch_rows`` bounds the rows held in memory while syncing and
+    ``max_parts`` the files per month before they are merged into one.
+    """
+
+    def __init__(self, root: str, tables=None, batch_rows: int = 250_000, max_parts: int = 8):
+        self.root = root
+        self.tables = list(tables) if tables else list(FACT_TABLES)
+        self.batch_rows = batch_rows
+        self.max_parts = max_parts
+        self.syncs = 0
+        self.sync_seconds = 0.0
+        self._lock = threading.RLock()
+        self.state = self._read_state()
+
+    # -- files --------------------------------------------------------------
+
+    def _table_dir(self, table: str) -> str:
+        return os.path.join(self.root, table)
+
+    def _read_state(self) -> dict:
+        try:
+            with open(os.path.join(self.root, STATE_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"tables": {}}
+
+    def _write_state(self) -> None:
+        path = os.path.join(self.root, STATE_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def parts(self, table: str) -> dict:
+        """Return ``{month: [file, ...]}`` of ``table`` ordered by ``id``."""
+        result = {}
+        base = self._table_dir(table)
+        if not os.path.isdir(base):
+            return result
+        for entry in sorted(os.listdir(base)):
+            if not entry.startswith(PARTITION + "="):
+                continue
+            directory = os.path.join(base, entry)
+            files = sorted((f for f in os.listdir(directory) if f.startswith("part-") and f.endswith(".parquet")),
+                           key=_part_ids)
+            if files:
+                result[entry.split("=", 1)[1]] = [os.path.join(directory, f) for f in files]
+        return result
+
+    def _discard(self, path: str) -> None:
+        # Readers may still hold the old file list, so files are deleted one sync later
+        trash = os.path.join(self.root, TRASH_DIR)
+        os.makedirs(trash, exist_ok=True)
+        os.replace(path, os.path.join(trash, f"{time.time_ns()}-{os.path.basename(path)}"))
+
+    def _write(self, table: str, month: str, frame) -> str:
+        import pyarrow.parquet as pq
+
+        directory = os.path.join(self._table_dir(table), f"{PARTITION}={month}")
+        os.makedirs(directory, exist_ok=True)
+        ids = frame.column("id")
+        name = f"part-{ids[0].as_py():012d}-{ids[-1].as_py():012d}.parquet"
+        # Dot files are ignored by dataset discovery until renamed
+        tmp = os.path.join(directory, "." + name + ".tmp")
+        pq.write_table(frame, tmp, compression="zstd")
+        path = os.path.join(directory, name)
+        os.replace(tmp, path)
+        return path
+
+    # -- sync ---------------------------------------------------------------
+
+    def _frame(self, rows, columns, schema):
+        import pyarrow as pa
+
+        data = list(zip(*rows))
+        frame = pa.Table.from_arrays(
+            [column_array(list(values), declared) for values, (_, declared) in zip(data, columns)],
+            names=[c for c, _ in columns],
+        )
+        if schema is None:
+            return frame
+        try:
+            return frame.cast(schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f"Yeni satırlar Parquet aynasının şemasına uymuyor, --full ile yeniden "
+                             f"oluşturun: {e}") from e
+
+    def _schema(self, table: str):
+        import pyarrow.parquet as pq
+
+        for files in self.parts(table).values():
+            return pq.read_schema(files[0]).remove_metadata()
+        return None
+
+    def sync_table(self, conn, table: str, full: bool = False) -> int:
+        """Append the new rows of ``table`` and return how many were written."""
+        columns = [list(c) for c in conn.execute(f'SELECT name, type FROM pragma_table_info("{table}")')]
+        if not any(name == "id" for name, _ in columns):
+            raise ValueError(f"{table} tablosunda id kolonu yok, Parquet aynasına alınamaz")
+        id_index = next(i for i, (name, _) in enumerate(columns) if name == "id")
+        tarih_index = next((i for i, (name, _) in enumerate(columns) if name == "tarih"), None)
+        entry = self.state["tables"].get(table)
+        max_id = conn.execute(f'SELECT MAX(id) FROM "{table}"').fetchone()[0] or 0
+        if full or entry is None or entry["columns"] != columns or max_id < entry["last_id"]:
+            for files in self.parts(table).values():
+                for path in files:
+                    self._discard(path)
+            entry = {"columns": columns, "last_id": 0, "rows": 0}
+        # Files of an interrupted sync lie above the watermark
+        for files in self.parts(table).values():
+            for path in files:
+                if _part_ids(os.path.basename(path))[0] > entry["last_id"]:
+                    self._discard(path)
+        schema = self._schema(table)
+        touched = set()
+        written = 0
+        cursor = conn.execute(f'SELECT * FROM "{table}" WHERE id > ? ORDER BY id', (entry["last_id"],))
+        while True:
+            rows = cursor.fetchmany(self.batch_rows)
+            if not rows:
+                break
+            months = {}
+            for row in rows:
+                month = _month(row[tarih_index]) if tarih_index is not None else NULL_PARTITION
+                months.setdefault(month, []).append(row)
+            for month, month_rows in months.items():
+                frame = self._frame(month_rows, columns, schema)
+                if schema is None:
+                    schema = frame.schema
+                self._write(table, month, frame)
+                touched.add(month)
+            written += len(rows)
+            entry["last_id"] = rows[-1][id_index]
+        entry["rows"] += written
+        self.state["tables"][table] = entry
+        self._write_state()
+        parts = self.parts(table)
+        for month in touched:
+            if len(parts.get(month, [])) > self.max_parts:
+                self.compact(table, month)
+        return written
+
+    def sync(self, source, full: bool = False) -> dict:
+        """Bring the mirror up to date with ``source`` and return sync statistics.
+
+        ``source`` is a database path or an open connection; only reads are
+        made. Tables missing from the database are skipped.
+        """
+        start = time.perf_counter()
+        conn = sqlite3.connect(sqlite_uri(source), uri=True) if isinstance(source, str) else source
+        try:
+            with self._lock:
+                os.makedirs(self.root, exist_ok=True)
+                shutil.rmtree(os.path.join(self.root, TRASH_DIR), ignore_errors=True)
+                existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                rows = {t: self.sync_table(conn, t, full) for t in self.tables if t in existing}
+                seconds = time.perf_counter() - start
+                self.syncs += 1
+                self.sync_seconds = seconds
+        finally:
+            if isinstance(source, str):
+                conn.close()
+        return {"rows": rows, "seconds": seconds}
+
+    def compact(self, table: str, month: str) -> None:
+        """Merge the files of one month of ``table`` into a single file."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        with self._lock:
+            files = self.parts(table).get(month, [])
+            if len(files) < 2:
+                return
+            frame = pa.concat_tables(pq.read_table(f, partitioning=None) for f in files)
+            self._write(table, month, frame)
+            for path in files:
+                self._discard(path)
+
+    # -- reads --------------------------------------------------------------
+
+    def dataset(self, table: str):
+        """Return ``table`` as a memory-mapped ``pyarrow.dataset.Dataset``.
+
+        The month is exposed as the string column ``ay``.
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        from pyarrow import fs
+
+        partitioning = ds.partitioning(pa.schema([(PARTITION, pa.string())]), flavor="hive")
+        files = [f for month_files in self.parts(table).values() for f in month_files]
+        if not files:
+            entry = self.state["tables"].get(table, {"columns": []})
+            empty = pa.table({name: column_array([], declared) for name, declared in entry["columns"]})
+            return ds.dataset(empty.append_column(PARTITION, pa.array([], pa.string())))
+        return ds.dataset(files, format="parquet", partitioning=partitioning, partition_base_dir=self._table_dir(table),
+                          filesystem=fs.LocalFileSystem(use_mmap=True))
+
+    def scan(self, table: str, columns=None, start: str | None = None, end: str | None = None):
+        """Read ``columns`` of the rows with ``start <= tarih < end`` as a ``pyarrow.Table``.
+
+        ``start`` and ``end`` are ISO dates; months outside the range are
+        skipped without opening their files.
+        """
+        import pyarrow.dataset as ds
+
+        dataset = self.dataset(table)
+        conditions = []
+        if start:
+            conditions += [ds.field(PARTITION) >= start[:7], ds.field("tarih") >= date.fromisoformat(start)]
+        if end:
+            conditions += [ds.field(PARTITION) <= end[:7], ds.field("tarih") < date.fromisoformat(end)]
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        if columns is None:
+            columns = [name for name in dataset.schema.names if name != PARTITION]
+        return dataset.to_table(columns=list(columns), filter=expression)
+
+    def rows(self, table: str) -> int:
+        return self.state["tables"].get(table, {}).get("rows", 0)
+
+    def stats(self) -> dict:
+        tables = {}
+        for table in self.tables:
+            files = [f for month_files in self.parts(table).values() for f in month_files]
+            entry = self.state["tables"].get(table, {})
+            tables[table] = {
+                "rows": entry.get("rows", 0),
+                "last_id": entry.get("last_id", 0),
+                "files": len(files),
+                "bytes": sum(os.path.getsize(f) for f in files),
+            }
+        return {"root": self.root, "syncs": self.syncs, "sync_seconds": round(self.sync_seconds, 3),
+                "tables": tables}
+
+
+def _env_tables():
+    return [t.strip() for t in os.getenv("PARQUET_MIRROR_TABLES", "").split(",") if t.strip()] or None
+
+
+def mirror_from_env():
+    """Create a ``ParquetMirror`` from environment variables or return ``None``.
+
+    ``PARQUET_MIRROR_DIR`` enables the mirror; ``PARQUET_MIRROR_TABLES``
+    (comma separated) overrides the fact tables it holds.
+    """
+    root = os.getenv("PARQUET_MIRROR_DIR", "")
+    if not root:
+        return None
+    return ParquetMirror(root, _env_tables())
+
+
+def main():
+    from nl2sql_app import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Sync the Parquet mirror of the fact tables.")
+    parser.add_argument("--db", default=DB_PATH, help="database file")
+    parser.add_argument("--dir", default=os.getenv("PARQUET_MIRROR_DIR", "parquet_mirror"), help="mirror directory")
+    parser.add_argument("--full", action="store_true", help="rebuild the mirror from scratch")
+    args = parser.parse_args()
+    mirror = ParquetMirror(args.dir, _env_tables())
+    stats = mirror.sync(args.db, args.full)
+    rows = ", ".join(f"{t} +{n}" for t, n in stats["rows"].items())
+    print(f"Parquet aynası güncellendi: {rows}, {stats['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
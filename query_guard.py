@@ -0,0 +1,288 @@
+"""Execution guardrails for LLM generated SQL.
+
+A single runaway statement (an accidental cartesian JOIN, an unbounded scan
+of a large table) would otherwise keep a worker thread busy for as long as it
+runs. ``QueryGuard`` bounds every statement in three ways:
+
+* a cost check on ``EXPLAIN QUERY PLAN`` rejects nested full scans whose
+  estimated row product exceeds ``max_scan_product`` before anything runs;
+* a ``LIMIT`` is appended when the statement has none at the top level;
+* a progress handler aborts the statement when it exceeds its wall-clock
+  (``timeout``) or virtual machine step (``max_steps``) budget.
+
+Every rejection is raised as ``QueryRejected`` whose ``to_dict()`` is returned
+to API clients as a structured error.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from index_advisor import table_aliases
+
+# Number of SQLite VM instructions between progress handler calls
+PROGRESS_INTERVAL = 10000
+
+# Row estimate for scanned CTEs and subqueries whose size is unknown
+UNKNOWN_ROWS = 1000
+
+# Seconds a table's row estimate is reused; bulk loads are seen after this
+ROW_COUNT_TTL = 30.0
+
+_SCAN_RE = re.compile(r"^SCAN (\w+)")
+_LIMIT_RE = re.compile(r"\bLIMIT\b", re.I)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+
+
+class QueryRejected(ValueError):
+    """Raised when a statement is refused or aborted by ``QueryGuard``.
+
+    ``code`` is one of ``plan_cost``, ``timeout`` or ``step_budget``.
+    """
+
+    def __init__(self, code: str, detail: str, **info):
+        super().__init__(detail)
+        self.code = code
+        self.detail = detail
+        self.info = info
+
+    def to_dict(self) -> dict:
+        return {"code": self.code, "detail": self.detail, **self.info}
+
+
+def _top_level(sql: str) -> str:
+    """Return ``sql`` without string literals and parenthesised parts."""
+    sql = _STRING_RE.sub("''", sql)
+    out, depth = [], 0
+    for ch in sql:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            out.append(ch)
+    return "".join(out)
+
+
+def has_limit(sql: str) -> bool:
+    """Return ``True`` if ``sql`` has a ``LIMIT`` clause outside subqueries."""
+    return bool(_LIMIT_RE.search(_top_level(sql)))
+
+
+def ensure_limit(sql: str, max_rows: int) -> str:
+    """Append ``LIMIT max_rows`` to ``sql`` unless it already limits its rows."""
+    sql = sql.strip().rstrip(";").rstrip()
+    if max_rows <= 0 or has_limit(sql):
+        return sql
+    return f"{sql}\nLIMIT {int(max_rows)}"
+
+
+class Budget:
+    """Progress handler state for one statement.
+
+    ``on_reject`` is called with the rejection code whenever ``translate``
+    turns an abort into ``QueryRejected``.
+    """
+
+    def __init__(self, timeout: float, max_steps: int, on_reject=None):
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.on_reject = on_reject
+        self.steps = 0
+        self.reason = None
+        self.restart()
+
+    def restart(self) -> None:
+        """Start a new wall-clock window, e.g. before fetching the next chunk."""
+        self.deadline = time.monotonic() + self.timeout if self.timeout > 0 else None
+
+    def tick(self) -> int:
+        self.steps += PROGRESS_INTERVAL
+        if self.max_steps and self.steps > self.max_steps:
+            self.reason = "step_budget"
+            return 1
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.reason = "timeout"
+            return 1
+        return 0
+
+    def translate(self, exc: BaseException) -> BaseException:
+        """Return ``QueryRejected`` for an abort caused by this budget, else ``exc``."""
+        if self.reason == "timeout":
+            err = QueryRejected("timeout", f"Sorgu {self.timeout:g} saniyelik süre sınırını aştı",
+                                timeout=self.timeout)
+        elif self.reason == "step_budget":
+            err = QueryRejected("step_budget", "Sorgu işlem adımı sınırını aştı",
+                                max_steps=self.max_steps)
+        else:
+            return exc
+        if self.on_reject is not None:
+            self.on_reject(err.code)
+        return err
+
+
+class QueryGuard:
+    """Check, limit and time-box statements before and while they run.
+
+    Table sizes for the cost check are cached for ``row_count_ttl`` seconds.
+    """
+
+    def __init__(self, timeout: float = 10.0, max_steps: int = 0, max_rows: int = 100000,
+                 max_scan_product: int = 50_000_000, row_count_ttl: float = ROW_COUNT_TTL):
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.max_rows = max_rows
+        self.max_scan_product = max_scan_product
+        self.row_count_ttl = row_count_ttl
+        self._lock = threading.Lock()
+        self._row_counts = {}
+        self.rejected = defaultdict(int)
+
+    def _count(self, code: str) -> None:
+        with self._lock:
+            self.rejected[code] += 1
+
+    def _rows(self, conn, table: str) -> int:
+        # MAX(rowid) is a single b-tree lookup; exact counts are not needed
+        now = time.monotonic()
+        with self._lock:
+            cached = self._row_counts.get(table)
+            if cached is not None and now - cached[1] <= self.row_count_ttl:
+                return cached[0]
+        try:
+            rows = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+        except sqlite3.Error:
+            rows = UNKNOWN_ROWS
+        with self._lock:
+            self._row_counts[table] = (rows, now)
+        return rows
+
+    def estimate(self, conn, sql: str) -> dict:
+        """Return the largest nested full-scan row product in the plan of ``sql``.
+
+        Plan lines sharing a parent form one nested loop; the row counts of
+        the ``SCAN`` lines in such a group are multiplied. Index lookups
+        (``SEARCH``) are treated as constant cost.
+        """
+        plan = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+        tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        aliases = table_aliases(sql, tables)
+        groups = defaultdict(list)
+        for _id, parent, _unused, detail in plan:
+            match = _SCAN_RE.match(detail)
+            if match:
+                table = aliases.get(match.group(1).lower())
+                rows = self._rows(conn, table) if table else UNKNOWN_ROWS
+                groups[parent].append((table or match.group(1), rows))
+        worst = {"scans": [], "product": 0}
+        for scans in groups.values():
+            if len(scans) < 2:
+                continue
+            product = 1
+            for _table, rows in scans:
+                product *= max(rows, 1)
+            if product > worst["product"]:
+                worst = {"scans": [t for t, _ in scans], "product": product}
+        return worst
+
+    def check_plan(self, conn, sql: str) -> None:
+        """Raise ``QueryRejected`` when ``sql`` would run expensive nested scans."""
+        if not self.max_scan_product:
+            return
+        worst = self.estimate(conn, sql)
+        if worst["product"] > self.max_scan_product:
+            self._count("plan_cost")
+            raise QueryRejected(
+                "plan_cost",
+                "Sorgu indekssiz iç içe tablo taramaları içeriyor ve çok maliyetli",
+                tables=worst["scans"],
+                estimated_rows=worst["product"],
+                limit=self.max_scan_product,
+            )
+
+    def prepare(self, conn, sql: str) -> str:
+        """Check the plan of ``sql`` and return it with a row limit applied.
+
+        One row more than ``max_rows`` is requested so ``cap`` can tell
+        whether the result was truncated.
+        """
+        self.check_plan(conn, sql)
+        return ensure_limit(sql, self.max_rows + 1 if self.max_rows > 0 else 0)
+
+    def cap(self, df):
+        """Trim ``df`` to ``max_rows`` and mark it with ``attrs['truncated']``."""
+        if self.max_rows > 0 and len(df) > self.max_rows:
+            df = df.iloc[: self.max_rows]
+            df.attrs["truncated"] = True
+        return df
+
+    @contextmanager
+    def budget(self, conn):
+        """Enforce the time and step budget on statements run inside the block.
+
+        Aborted statements surface as ``QueryRejected``.
+        """
+        state = Budget(self.timeout, self.max_steps, self._count)
+        if self.timeout > 0 or self.max_steps:
+            conn.set_progress_handler(state.tick, PROGRESS_INTERVAL)
+        try:
+            yield state
+        except Exception as e:
+            err = state.translate(e)
+            if err is e:
+                raise
+            raise err from e
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    @contextmanager
+    def deadline(self, interrupt):
+        """Enforce the time budget by calling ``interrupt()`` when it runs out.
+
+        For engines without a progress handler, such as DuckDB. Aborted
+        statements surface as ``QueryRejected``.
+        """
+        state = Budget(self.timeout, 0, self._count)
+        timer = None
+        if self.timeout > 0:
+            def expire():
+                state.reason = "timeout"
+                interrupt()
+
+            timer = threading.Timer(self.timeout, expire)
+            timer.daemon = True
+            timer.start()
+        try:
+            yield state
+        except Exception as e:
+            err = state.translate(e)
+            if err is e:
+                raise
+            raise err from e
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "timeout": self.timeout,
+                "max_steps": self.max_steps,
+                "max_rows": self.max_rows,
+                "max_scan_product": self.max_scan_product,
+                "rejected": dict(self.rejected),
+            }
+
+
+def guard_from_env() -> QueryGuard:
+    """Create a ``QueryGuard`` configured through environment variables."""
+    return QueryGuard(
+        timeout=float(os.getenv("QUERY_TIMEOUT", "10")),
+        max_steps=int(float(os.getenv("QUERY_MAX_STEPS", "1e9"))),
+        max_rows=int(os.getenv("QUERY_MAX_ROWS", "100000")),
+        max_scan_product=int(float(os.getenv("QUERY_MAX_SCAN_PRODUCT", "5e7"))),
+    )
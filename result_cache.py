@@ -0,0 +1,318 @@
+"""Cache of SQL query results with table-level invalidation.
+
+Results are keyed on the canonical form of the statement (comments removed,
+whitespace collapsed, literals and identifiers untouched) together with the
+row cap of the query guard, and stored as the DataFrame returned by
+``execute_sql``, i.e. one numpy array per column. Memory is bounded by
+``max_bytes`` measured with ``DataFrame.memory_usage(deep=True)`` and the
+least recently used entries are evicted first.
+
+The tables a statement reads are taken from the ``OpenRead`` opcodes of its
+``EXPLAIN`` program, so views, CTEs and subqueries resolve to the base tables.
+A dedicated connection polls ``PRAGMA data_version``, which changes whenever
+another connection commits. Without further information any commit drops
+every entry. When the change counters from ``install_triggers`` are present
+(the ``_table_versions`` table maintained by triggers), only entries reading
+a table whose counter moved are dropped.
+
+Statements whose result depends on the clock or on chance (``'now'``,
+``CURRENT_DATE``, ``random()`` ...) change without any write and are never
+cached, see ``volatile``. Every other entry expires ``ttl`` seconds after it
+was stored.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from db_pool import sqlite_uri
+
+VERSIONS_TABLE = "_table_versions"
+
+_TOKENS = re.compile(
+    r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])|(?:\s|--[^\n]*|/\*.*?(?:\*/|$))+""", re.S
+)
+# Calls and keywords whose value changes between runs of the same statement
+_VOLATILE = re.compile(r"\b(?:random|randomblob|current_date|current_time|current_timestamp|now|today)\b", re.I)
+
+
+def canonical_sql(sql: str) -> str:
+    """Return ``sql`` without comments, with collapsed whitespace and no trailing ``;``."""
+    text = _TOKENS.sub(lambda m: m.group(1) or " ", sql)
+    return text.strip().rstrip(";").strip()
+
+
+def volatile(sql: str) -> bool:
+    """Return whether ``sql`` reads the clock or random numbers."""
+    # Quoted text only matters as the ``'now'`` argument of the date functions
+    text = _TOKENS.sub(lambda m: "now" if (m.group(1) or "").lower() == "'now'" else " ", sql)
+    return _VOLATILE.search(text) is not None
+
+
+def root_pages(conn) -> dict:
+    """Return ``{rootpage: table}`` for the tables and indexes of ``conn``."""
+    return dict(conn.execute("SELECT rootpage, tbl_name FROM sqlite_master WHERE rootpage > 0").fetchall())
+
+
+def read_tables(conn, sql: str, roots: dict) -> frozenset | None:
+    """Return the tables ``sql`` reads according to its ``EXPLAIN`` program.
+
+    ``roots`` comes from ``root_pages``. ``None`` means the set could not be
+    determined, e.g. because a virtual table is read.
+    """
+    tables = set()
+    for row in conn.execute(f"EXPLAIN {sql}"):
+        opcode, p2, p3 = row[1], row[3], row[4]
+        if opcode == "VOpen":
+            return None
+        if opcode == "OpenRead":
+            if p3 != 0 or p2 not in roots:
+                return None
+            tables.add(roots[p2])
+    return frozenset(tables)
+
+
+def frame_bytes(df) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class ResultCache:
+    """LRU cache of result DataFrames invalidated by table changes.
+
+    ``lookup`` returns the cached frame or ``None`` together with a snapshot
+    of the change counters taken *before* the query runs; ``store`` only
+    keeps the result when the tables it read did not change since then.
+    Entries older than ``ttl`` seconds are dropped on lookup; ``0`` keeps them
+    until a change invalidates them.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 2**20, max_entry_bytes: int | None = None,
+                 ttl: float = 3600.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.skipped = 0
+        self.expired = 0
+        self.volatile = 0
+        self._watch = sqlite3.connect(sqlite_uri(path), uri=True, check_same_thread=False)
+        self._data_version = None
+        self._versions = {}
+        self._roots = (None, {})
+        self._poll()
+
+    def _table_versions(self) -> dict | None:
+        try:
+            return dict(self._watch.execute(f"SELECT tablo, surum FROM {VERSIONS_TABLE}").fetchall())
+        except sqlite3.OperationalError:
+            return None
+
+    def _poll(self) -> None:
+        """Invalidate entries whose tables changed since the last poll.
+
+        Must be called with ``_lock`` held (or from ``__init__``).
+        """
+        data_version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        versions = self._table_versions()
+        if self._data_version is not None:
+            if versions is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self.bytes = 0
+            else:
+                changed = {t for t in set(versions) | set(self._versions or {})
+                           if versions.get(t) != (self._versions or {}).get(t)}
+                for key, (df, tables, size, _) in list(self._entries.items()):
+                    if tables is None or tables & changed:
+                        del self._entries[key]
+                        self.bytes -= size
+                        self.invalidations += 1
+        self._data_version = data_version
+        self._versions = versions
+
+    def tables_read(self, conn, sql: str) -> frozenset | None:
+        """Return the tables ``sql`` reads, see ``read_tables``.
+
+        ``None`` entries are invalidated by any change. This includes
+        statements SQLite cannot compile, such as DuckDB SQL.
+        """
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        if self._roots[0] != schema_version:
+            self._roots = (schema_version, root_pages(conn))
+        try:
+            return read_tables(conn, sql, self._roots[1])
+        except sqlite3.Error:
+            return None
+
+    def key(self, sql: str, max_rows: int | None = None) -> str | None:
+        """Return the cache key of ``sql``, ``None`` when it must not be cached.
+
+        ``lookup`` and ``store`` accept the ``None`` key and never find or
+        keep anything under it.
+        """
+        if volatile(sql):
+            return None
+        text = f"{max_rows}\n{canonical_sql(sql)}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str | None):
+        """Return ``(frame or None, snapshot)`` for ``key``."""
+        with self._lock:
+            self._poll()
+            entry = self._entries.get(key)
+            snapshot = (self._data_version, self._versions)
+            if key is None:
+                self.volatile += 1
+                return None, snapshot
+            if entry is not None and self.ttl and time.monotonic() - entry[3] > self.ttl:
+                del self._entries[key]
+                self.bytes -= entry[2]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None, snapshot
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Shallow copy so callers may add columns without touching the cache
+        return entry[0].copy(deep=False), snapshot
+
+    def store(self, key: str | None, df, tables, snapshot) -> bool:
+        """Cache ``df`` read from ``tables`` if nothing changed since ``snapshot``."""
+        if key is None:
+            return False
+        size = frame_bytes(df)
+        if size > self.max_entry_bytes:
+            with self._lock:
+                self.skipped += 1
+            return False
+        with self._lock:
+            self._poll()
+            data_version, versions = snapshot
+            if data_version != self._data_version:
+                if versions is None or self._versions is None or tables is None:
+                    return False
+                if any(versions.get(t) != self._versions.get(t) for t in tables):
+                    return False
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[key] = (df, tables, size, time.monotonic())
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._entries:
+                _, (_, _, evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "skipped": self.skipped,
+                "expired": self.expired,
+                "volatile": self.volatile,
+                "ttl": self.ttl,
+                "table_versions": self._versions is not None,
+            }
+
+
+def result_cache_from_env(path: str):
+    """Build a ``ResultCache`` for ``path`` from environment settings.
+
+    ``RESULT_CACHE_ENABLED`` (default ``1``) switches the cache on or off and
+    ``RESULT_CACHE_MB`` sets its memory budget and ``RESULT_CACHE_TTL`` the
+    lifetime of an entry in seconds. Returns ``None`` when the cache is
+    disabled.
+    """
+    if os.getenv("RESULT_CACHE_ENABLED", "1").lower() in {"0", "false", "no"}:
+        return None
+    return ResultCache(
+        path,
+        max_bytes=int(float(os.getenv("RESULT_CACHE_MB", "64")) * 2**20),
+        ttl=float(os.getenv("RESULT_CACHE_TTL", "3600")),
+    )
+
+
+def install_triggers(conn) -> list:
+    """Create ``_table_versions`` and triggers bumping it on every write.
+
+    Returns the tables that received triggers. Every inserted, updated or
+    deleted row costs one extra write, so bulk loads are slower afterwards.
+    """
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} (tablo TEXT PRIMARY KEY, surum INTEGER NOT NULL)"
+    )
+    tables = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name != ?",
+        (VERSIONS_TABLE,),
+    )]
+    for table in tables:
+        conn.execute(
+            f"INSERT OR IGNORE INTO {VERSIONS_TABLE} (tablo, surum) VALUES (?, 0)", (table,)
+        )
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(
+                f'CREATE TRIGGER IF NOT EXISTS "_tv_{table}_{event.lower()}" AFTER {event} ON "{table}" '
+                f"BEGIN UPDATE {VERSIONS_TABLE} SET surum = surum + 1 WHERE tablo = '{table}'; END"
+            )
+    conn.commit()
+    return tables
+
+
+def remove_triggers(conn) -> None:
+    """Drop the triggers and table created by ``install_triggers``."""
+    names = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '\\_tv\\_%' ESCAPE '\\'"
+    )]
+    for name in names:
+        conn.execute(f'DROP TRIGGER "{name}"')
+    conn.execute(f"DROP TABLE IF EXISTS {VERSIONS_TABLE}")
+    conn.commit()
+
+
+def main():
+    from nl2sql_app import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Manage per-table change counters for the result cache.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--remove", action="store_true", help="drop the triggers instead")
+    args = parser.parse_args()
+    with sqlite3.connect(args.db) as conn:
+        if args.remove:
+            remove_triggers(conn)
+            print("Change counters removed.")
+        else:
+            tables = install_triggers(conn)
+            print(f"Change counters installed on {len(tables)} tables.")
+
+
+if __name__ == "__main__":
+    main()
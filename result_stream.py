@@ -0,0 +1,164 @@
+"""Chunked, paginated delivery of query results.
+
+Results are read from a cursor with ``fetchmany`` and written as NDJSON so the
+first rows reach the client while the rest of the result is still being read.
+Each response is capped at a server-side row limit; when more rows exist the
+last line carries an opaque continuation token which resumes the same SQL at
+the next offset without asking the LLM again.
+
+Stream format (one JSON object per line)::
+
+    {"type": "meta", "sql": "...", "columns": [...], "visuals": [...]}
+    {"type": "rows", "rows": [[...], ...]}
+    ...
+    {"type": "visual", "index": 1, "columns": [...], "rows": [[...], ...]}
+    {"type": "end", "rows": 1234, "next": "<token>" | null}
+
+``visual`` lines are optional and written by the caller's ``trailer``; the
+API uses them for the reduced data of chart visuals.
+
+A ``{"type": "error", "detail": "..."}`` line is written if execution fails
+after the stream has started. Rejections by ``query_guard`` also carry their
+``code``.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+
+from result_cache import canonical_sql
+
+
+def paged_sql(sql: str) -> str:
+    """Wrap ``sql`` so it accepts ``LIMIT ? OFFSET ?`` parameters.
+
+    Comments are removed first; a trailing ``-- ...`` would otherwise hide
+    the closing parenthesis.
+    """
+    return f"SELECT * FROM ({canonical_sql(sql)}) LIMIT ? OFFSET ?"
+
+
+def open_cursor(conn, sql: str, offset: int = 0, limit: int = -1):
+    """Execute ``sql`` on ``conn`` for one page and return the cursor."""
+    return conn.execute(paged_sql(sql), (limit, offset))
+
+
+def iter_chunks(cursor, chunk_size: int):
+    """Yield lists of at most ``chunk_size`` rows from ``cursor``."""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+
+class ContinuationTokens:
+    """Create and verify signed continuation tokens.
+
+    A token holds the SQL text and the next offset. It is signed with an
+    HMAC so clients cannot use it to run arbitrary SQL. The secret is read
+    from ``STREAM_TOKEN_SECRET`` or generated per process, in which case
+    tokens are only valid until the server restarts.
+    """
+
+    def __init__(self, secret: str | bytes | None = None):
+        secret = secret or os.getenv("STREAM_TOKEN_SECRET") or secrets.token_bytes(32)
+        self.secret = secret.encode("utf-8") if isinstance(secret, str) else secret
+
+    def _sign(self, payload: bytes) -> str:
+        digest = hmac.new(self.secret, payload, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+    def encode(self, sql: str, offset: int) -> str:
+        """Return a token resuming ``sql`` at ``offset``."""
+        payload = json.dumps({"sql": sql, "offset": offset}, ensure_ascii=False).encode("utf-8")
+        body = base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+        return f"{body}.{self._sign(payload)}"
+
+    def decode(self, token: str) -> tuple[str, int]:
+        """Return ``(sql, offset)`` from ``token``.
+
+        Raises ``ValueError`` when the token is malformed or its signature
+        does not match.
+        """
+        try:
+            body, signature = token.split(".", 1)
+            payload = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid continuation token")
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            raise ValueError("Invalid continuation token")
+        data = json.loads(payload)
+        return data["sql"], int(data["offset"])
+
+
+def error_line(exc: BaseException) -> bytes:
+    """Encode ``exc`` as an NDJSON error line."""
+    to_dict = getattr(exc, "to_dict", None)
+    info = to_dict() if to_dict else {"detail": str(exc)}
+    return ndjson_line({"type": "error", **info})
+
+
+def ndjson_line(obj) -> bytes:
+    """Encode ``obj`` as one NDJSON line."""
+    return (json.dumps(obj, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+def stream_result(conn, sql: str, tokens: ContinuationTokens, meta: dict,
+                  offset: int = 0, page_rows: int = 10000, chunk_size: int = 500, label=None,
+                  budget=None, query: str | None = None, trailer=None):
+    """Yield NDJSON lines for one page of ``sql`` starting at ``offset``.
+
+    ``meta`` is merged into the first line and ``label`` optionally maps
+    column names to display names. One extra row is requested to
+    find out whether a continuation token is needed, so memory use is bounded
+    by ``chunk_size`` regardless of the result size.
+
+    ``budget`` is the ``query_guard.Budget`` active on ``conn``. Its clock is
+    restarted for every chunk so time spent waiting for the client does not
+    count against the query.
+
+    ``query`` is the statement reported in the first line and resumed by the
+    continuation token when ``sql`` only reads a materialized copy of its
+    result; it defaults to ``sql``.
+
+    ``trailer`` is called once the rows of the page are sent and returns
+    further lines to write before the end line.
+    """
+    query = sql if query is None else query
+    translate = budget.translate if budget is not None else (lambda e: e)
+    try:
+        cursor = open_cursor(conn, sql, offset, page_rows + 1)
+    except Exception as e:
+        yield error_line(translate(e))
+        return
+    columns = [d[0] for d in cursor.description or []]
+    if label is not None:
+        columns = [label(c) for c in columns]
+    yield ndjson_line({"type": "meta", "sql": query, "columns": columns, **meta})
+    sent = 0
+    has_more = False
+    try:
+        for rows in iter_chunks(cursor, chunk_size):
+            if sent + len(rows) > page_rows:
+                rows = rows[: page_rows - sent]
+                has_more = True
+            if rows:
+                yield ndjson_line({"type": "rows", "rows": rows})
+                sent += len(rows)
+            if has_more:
+                break
+            if budget is not None:
+                budget.restart()
+        if trailer is not None:
+            yield from trailer()
+    except Exception as e:
+        yield error_line(translate(e))
+        return
+    finally:
+        cursor.close()
+    next_token = tokens.encode(query, offset + sent) if has_more else None
+    yield ndjson_line({"type": "end", "rows": sent, "next": next_token})
@@ -0,0 +1,168 @@
+"""Lexical index for picking the tables relevant to a question.
+
+Sending the whole schema in every prompt makes prompt size, latency and cost
+grow with the number of tables. ``SchemaIndex`` scores each table against
+the question using its name, column names and the friendly Turkish labels
+from ``field_mapping`` and returns a schema text limited to the best matches
+plus the tables they reference through foreign keys.
+
+The index is built locally from ``get_schema_details()`` output; no network
+access or embedding model is needed.
+"""
+
+import math
+import re
+import unicodedata
+from collections import defaultdict
+
+from field_mapping import TECH_TO_FRIENDLY, TRANSLATION_TABLE
+
+# Turkish words are heavily suffixed ("satışları", "müşterilerin") and table
+# names are plural, so a question token and an index term match when one is
+# a prefix of the other and the shorter one is at least this long.
+MIN_PREFIX = 4
+
+# Weight of table name/label terms relative to column terms
+TABLE_WEIGHT = 3.0
+
+# Tables scoring below this fraction of the best table are dropped
+RELATIVE_CUTOFF = 0.5
+
+# Words that point at tables without naming them, mostly the KPI terms from
+# LLM_Guide.md whose formulas need several fact tables. The KPI_* summaries
+# from kpi_engine are only used when they exist in the database.
+KEYWORD_TABLES = {
+    "kar": ["Satislar", "SatinAlma", "Uretim", "Urunler", "Finans", "KPI_Urun_Aylik", "KPI_Musteri_Kar"],
+    "smm": ["SatinAlma", "Uretim", "Urunler", "Finans", "KPI_Urun_Aylik", "KPI_Musteri_Kar"],
+    "maliyet": ["SatinAlma", "Uretim", "Urunler", "Finans", "KPI_Urun_Aylik"],
+    "ggp": ["Uretim", "Urunler", "Finans", "KPI_Urun_Aylik"],
+    "genel gider": ["Uretim", "Urunler", "Finans", "KPI_GenelGider_Aylik", "KPI_Urun_Aylik"],
+    "devir": ["Stoklar", "SatinAlma", "Uretim", "Urunler", "Finans", "KPI_Stok_Devir"],
+    "ciro": ["Satislar"],
+    "satan": ["Satislar"],
+    "satil": ["Satislar"],
+    "satti": ["Satislar"],
+    "gelir": ["Finans", "Satislar"],
+    "personel": ["Calisanlar", "Departmanlar"],
+}
+
+_CAMEL_RE = re.compile(r"(?<=[a-z])(?=[A-Z])")
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def fold(text: str) -> str:
+    """Casefold ``text``, strip combining marks and fold Turkish letters to ASCII."""
+    text = unicodedata.normalize("NFD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return text.translate(TRANSLATION_TABLE)
+
+
+def tokenize(text: str) -> list:
+    """Return folded word tokens of ``text``, splitting CamelCase and ``_``."""
+    text = _CAMEL_RE.sub(" ", text)
+    return _TOKEN_RE.findall(fold(text))
+
+
+def _terms(name: str) -> set:
+    terms = set(tokenize(name))
+    terms.add(fold(name))
+    label = TECH_TO_FRIENDLY.get(name)
+    if label:
+        terms.update(tokenize(label))
+        terms.add(fold(label).replace(" ", ""))
+    return {t for t in terms if len(t) > 1}
+
+
+class SchemaIndex:
+    """Score tables against a question and build a reduced schema text."""
+
+    def __init__(self, schema_details: dict):
+        self.tables = {}
+        self.fks = defaultdict(set)
+        self.table_terms = {}
+        self.column_terms = {}
+        doc_freq = defaultdict(int)
+        for table in schema_details.get("tables", []):
+            name = table["name"]
+            self.tables[name] = table["columns"]
+            tterms = _terms(name)
+            cterms = set()
+            for col in table["columns"]:
+                cterms |= _terms(col["name"])
+                if "fk" in col:
+                    self.fks[name].add(col["fk"]["table"])
+            self.table_terms[name] = tterms
+            self.column_terms[name] = cterms - tterms
+            for term in tterms | cterms:
+                doc_freq[term] += 1
+        n = max(len(self.tables), 1)
+        self.idf = {t: math.log(1 + n / df) for t, df in doc_freq.items()}
+
+    @staticmethod
+    def _matches(token: str, term: str) -> bool:
+        if token == term:
+            return True
+        if len(token) < len(term):
+            token, term = term, token
+        return len(term) >= MIN_PREFIX and token.startswith(term)
+
+    def score(self, question: str) -> dict:
+        """Return a relevance score for every table."""
+        tokens = set(tokenize(question))
+        joined = " ".join(tokenize(question))
+        scores = defaultdict(float)
+        for name in self.tables:
+            for weight, terms in ((TABLE_WEIGHT, self.table_terms[name]), (1.0, self.column_terms[name])):
+                for term in terms:
+                    if any(self._matches(tok, term) for tok in tokens):
+                        scores[name] += weight * self.idf.get(term, 1.0)
+        for keyword, tables in KEYWORD_TABLES.items():
+            # Short keywords ("kar") must be whole words, longer ones may carry suffixes
+            end = "" if len(keyword) >= MIN_PREFIX else r"\b"
+            if re.search(rf"\b{re.escape(keyword)}{end}", joined):
+                for name in tables:
+                    if name in self.tables:
+                        scores[name] += TABLE_WEIGHT
+        return dict(scores)
+
+    def select(self, question: str, top_k: int = 5, extra=()) -> list:
+        """Return the names of the relevant tables for ``question``.
+
+        At most ``top_k`` tables scoring at least ``RELATIVE_CUTOFF`` of the
+        best score are returned together with the ``extra`` tables (e.g. those
+        holding values the question mentions) and the tables they reference
+        through foreign keys, in schema order. An empty list means nothing
+        matched and the full schema should be used.
+        """
+        scores = self.score(question)
+        extra = {n for n in extra if n in self.tables}
+        if not scores and not extra:
+            return []
+        best = max(scores.values(), default=0)
+        ranked = sorted(
+            (n for n, s in scores.items() if s >= best * RELATIVE_CUTOFF),
+            key=lambda n: -scores[n],
+        )
+        chosen = set(ranked[:top_k]) | extra
+        for name in list(chosen):
+            chosen |= self.fks.get(name, set())
+        return [n for n in self.tables if n in chosen]
+
+    def schema_text(self, tables) -> str:
+        """Return the ``get_schema`` style text for ``tables``."""
+        lines = []
+        for name in tables:
+            col_defs = ', '.join(f"{c['name']} ({c.get('type')})" for c in self.tables[name])
+            lines.append(f"{name}: {col_defs}")
+        return '\n'.join(lines)
+
+    def schema_for(self, question: str, top_k: int = 5, fallback: str | None = None, extra=()) -> str:
+        """Return the schema text to send with ``question``.
+
+        ``fallback`` (usually the full schema) is returned when no table
+        matches the question.
+        """
+        tables = self.select(question, top_k, extra)
+        if not tables:
+            return fallback if fallback is not None else self.schema_text(self.tables)
+        return self.schema_text(tables)
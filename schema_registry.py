@@ -0,0 +1,209 @@
+"""Schema introspection with cheap change detection.
+
+``SchemaRegistry.snapshot(conn)`` returns a ``SchemaSnapshot`` describing the
+tables and views of the database. Columns and foreign keys of all tables are
+read with two batched queries joining ``sqlite_master`` with the
+``pragma_table_info`` and ``pragma_foreign_key_list`` table-valued functions
+instead of two ``PRAGMA`` statements per table.
+
+Every call first compares ``PRAGMA schema_version`` (a read of the database
+header) with the version the snapshot was built from. When it moved, the
+``CREATE`` statements in ``sqlite_master`` tell which tables were added,
+dropped or altered, and only those (plus all views, whose columns follow
+their tables) are introspected again. Changes that leave every table
+definition alone, such as a new index, keep the current snapshot.
+
+Snapshots are immutable and carry a ``version`` that increases with every
+rebuild. Derived artifacts (prompt text, friendly overview, retrieval index)
+are computed lazily on the snapshot, so they are versioned with it and
+anything keyed on the schema text, like the LLM cache, follows automatically.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from functools import cached_property
+
+from field_mapping import apply_friendly_labels
+from schema_index import SchemaIndex
+
+logger = logging.getLogger(__name__)
+
+# Internal tables (``sqlite_*`` and names starting with ``_``) are hidden
+_VISIBLE = "m.type IN ('table', 'view') AND m.name NOT LIKE 'sqlite_%' AND m.name NOT LIKE '\\_%' ESCAPE '\\'"
+
+
+class SchemaSnapshot:
+    """Immutable description of the schema at one ``schema_version``.
+
+    ``tables`` maps table names to ``{"name", "columns"}`` entries in
+    ``sqlite_master`` order; they must not be modified.
+    """
+
+    def __init__(self, version: int, schema_version: int, tables: dict, definitions: dict):
+        self.version = version
+        self.schema_version = schema_version
+        self.tables = tables
+        self.definitions = definitions
+
+    @cached_property
+    def text(self) -> str:
+        """Schema text used in the LLM prompt."""
+        return "\n".join(
+            f"{name}: " + ", ".join(f"{c['name']} ({c['type']})" for c in table["columns"])
+            for name, table in self.tables.items()
+        )
+
+    @cached_property
+    def digest(self) -> str:
+        return hashlib.sha256(self.text.encode("utf-8")).hexdigest()[:16]
+
+    @cached_property
+    def details(self) -> dict:
+        """Tables with columns and foreign keys, see ``get_schema_details``."""
+        return {"tables": list(self.tables.values())}
+
+    @cached_property
+    def friendly_details(self) -> dict:
+        return apply_friendly_labels(self.details)
+
+    @cached_property
+    def overview(self) -> dict:
+        """Table and column names, types, foreign keys and friendly labels."""
+        overview = {"tables": []}
+        for table in self.friendly_details["tables"]:
+            entry = {"name": table["name"], "columns": []}
+            if "friendly" in table:
+                entry["friendly"] = table["friendly"]
+            for col in table["columns"]:
+                col_entry = {"name": col["name"], "type": col.get("type")}
+                if "fk" in col:
+                    col_entry["fk"] = col["fk"]
+                if "friendly" in col:
+                    col_entry["friendly"] = col["friendly"]
+                entry["columns"].append(col_entry)
+            overview["tables"].append(entry)
+        return overview
+
+    @cached_property
+    def index(self) -> SchemaIndex:
+        """Lexical retrieval index over the tables."""
+        return SchemaIndex(self.details)
+
+
+def _placeholders(names) -> str:
+    return ", ".join("?" for _ in names)
+
+
+def introspect(conn, names=None) -> dict:
+    """Return ``{name: {"name", "columns"}}`` for ``names`` (all when ``None``)."""
+    where = _VISIBLE
+    params = ()
+    if names is not None:
+        names = list(names)
+        if not names:
+            return {}
+        where += f" AND m.name IN ({_placeholders(names)})"
+        params = tuple(names)
+    tables = {}
+    for table, name, ctype in conn.execute(
+        f"SELECT m.name, p.name, p.type FROM sqlite_master m JOIN pragma_table_info(m.name) p "
+        f"WHERE {where} ORDER BY m.rowid, p.cid",
+        params,
+    ):
+        tables.setdefault(table, {"name": table, "columns": []})["columns"].append({"name": name, "type": ctype})
+    fks = {}
+    for table, col, ref_table, ref_col in conn.execute(
+        f"SELECT m.name, f.\"from\", f.\"table\", f.\"to\" FROM sqlite_master m "
+        f"JOIN pragma_foreign_key_list(m.name) f WHERE {where}",
+        params,
+    ):
+        fks[(table, col)] = {"table": ref_table, "column": ref_col}
+    for table in tables.values():
+        for col in table["columns"]:
+            fk = fks.get((table["name"], col["name"]))
+            if fk is not None:
+                col["fk"] = fk
+    return tables
+
+
+class SchemaRegistry:
+    """Keep a ``SchemaSnapshot`` up to date with the database.
+
+    ``check_interval`` seconds may pass between two ``schema_version``
+    checks; ``0`` checks on every call. Thread-safe.
+    """
+
+    def __init__(self, check_interval: float = 0.0):
+        self.check_interval = check_interval
+        self.rebuilds = 0
+        self._snapshot = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> SchemaSnapshot | None:
+        return self._snapshot
+
+    def snapshot(self, conn) -> SchemaSnapshot:
+        """Return the snapshot for ``conn``'s database, refreshing it if needed."""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked < self.check_interval:
+            return snapshot
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        self._checked = now
+        if snapshot is not None and snapshot.schema_version == schema_version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.schema_version != schema_version:
+                snapshot = self._snapshot = self._rebuild(conn, snapshot, schema_version)
+        return snapshot
+
+    def _rebuild(self, conn, old, schema_version) -> SchemaSnapshot:
+        definitions = {
+            name: (kind, sql) for name, kind, sql in conn.execute(
+                f"SELECT m.name, m.type, m.sql FROM sqlite_master m WHERE {_VISIBLE} ORDER BY m.rowid"
+            )
+        }
+        if old is None:
+            fresh = introspect(conn)
+            changed = set(definitions)
+        else:
+            changed = {
+                name for name, (kind, sql) in definitions.items()
+                if old.definitions.get(name) != (kind, sql)
+            }
+            removed = set(old.definitions) - set(definitions)
+            if not changed and not removed:
+                # Same tables and views, e.g. only an index was added
+                return SchemaSnapshot(old.version, schema_version, old.tables, old.definitions)
+            views = {name for name, (kind, _) in definitions.items() if kind == "view"}
+            fresh = introspect(conn, changed | views)
+        tables = {}
+        for name in definitions:
+            entry = fresh.get(name)
+            if entry is None and old is not None:
+                entry = old.tables.get(name)
+            if entry is not None:
+                tables[name] = entry
+        self.rebuilds += 1
+        version = 1 if old is None else old.version + 1
+        logger.info("Schema version %d: %d tables and views, %d introspected", version, len(tables), len(fresh))
+        return SchemaSnapshot(version, schema_version, tables, definitions)
+
+
+_REGISTRIES = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+
+def registry_for(conn) -> SchemaRegistry:
+    """Return the process-wide registry of the database ``conn`` is attached to."""
+    path = conn.execute("PRAGMA database_list").fetchone()[2] or f":memory:{id(conn)}"
+    with _REGISTRIES_LOCK:
+        registry = _REGISTRIES.get(path)
+        if registry is None:
+            registry = _REGISTRIES[path] = SchemaRegistry()
+        return registry
@@ -0,0 +1,650 @@
+"""Run generated SQL across several SQLite files with identical schemas.
+
+``ShardSet`` holds one database file per shard (e.g. per plant or year).
+The LLM sees the schema of the first shard as the single logical schema and
+every statement is planned in one of three ways:
+
+``single``
+    The statement only reads tables that hold the same rows in every shard
+    (replicated dimension tables), so it runs on the first shard.
+
+``fanout``
+    A plain ``SELECT`` over at most one partitioned table runs on all
+    shards in parallel, one connection per shard and thread. The partial
+    results are combined in an in-memory SQLite database: aggregates are
+    split into mergeable parts (``SUM``/``COUNT``/``TOTAL`` are summed,
+    ``MIN``/``MAX`` reapplied and ``AVG`` rebuilt from a sum and a count) and
+    ``GROUP BY``, ``HAVING``, ``DISTINCT``, ``ORDER BY`` and ``LIMIT`` are
+    applied again to the combined rows.
+
+``attach``
+    Everything else (subqueries, CTEs, compound selects, window functions,
+    ``DISTINCT`` aggregates, joins of two partitioned tables) runs once on a
+    connection that attaches every shard and exposes each partitioned table
+    as a ``UNION ALL`` view. This is exact but serial and limited to
+    ``MAX_ATTACHED`` shards.
+
+Replicated tables are found by comparing row counts and contents across the
+shards at startup; ``NL2SQL_REPLICATED_TABLES`` lists them explicitly.
+"""
+
+import glob
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from db_pool import get_pool, sqlite_uri
+from metrics import RESULT_ROWS, timed
+from query_guard import QueryRejected, ensure_limit
+from result_cache import canonical_sql, read_tables, root_pages
+from schema_registry import introspect
+
+logger = logging.getLogger(__name__)
+
+# SQLite's compile-time default for SQLITE_MAX_ATTACHED
+MAX_ATTACHED = 10
+
+_QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]")
+_CLAUSE = re.compile(
+    r"\b(SELECT|FROM|WHERE|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT|WINDOW|UNION|INTERSECT|EXCEPT|WITH|VALUES)\b", re.I
+)
+_AGG = re.compile(
+    r"\b(SUM|TOTAL|COUNT|AVG|MIN|MAX|GROUP_CONCAT|STRING_AGG|JSON_GROUP_ARRAY|JSON_GROUP_OBJECT)\s*\(", re.I
+)
+_ALIAS_AS = re.compile(r"\s+AS\s+(\"[^\"]*\"|\[[^\]]*\]|`[^`]*`|\w+)\s*$", re.I)
+_ALIAS_BARE = re.compile(r"(?<=[\w)\]\"'`])\s+(\"[^\"]*\"|\w+)\s*$")
+_COLUMN_REF = re.compile(r"^(?:(?:\"[^\"]*\"|\w+)\.)?(\"[^\"]*\"|\[[^\]]*\]|`[^`]*`|\w+)$")
+_DIRECTION = re.compile(r"(\s+(?:ASC|DESC))?(\s+NULLS\s+(?:FIRST|LAST))?\s*$", re.I)
+_LIMIT = re.compile(r"^LIMIT\s+(\d+)(?:\s+OFFSET\s+(\d+)|\s*,\s*(\d+))?$", re.I)
+# Delimits the placeholders of partial aggregates in merge queries
+_PARTIAL = "\x00"
+# Words that end an expression rather than name it
+_NOT_ALIAS = {
+    "END", "ASC", "DESC", "NULL", "AND", "OR", "NOT", "IS", "IN", "LIKE", "GLOB", "THEN", "ELSE",
+    "WHEN", "CASE", "COLLATE", "DISTINCT", "TRUE", "FALSE",
+}
+
+
+class Unsupported(Exception):
+    """The statement cannot be split into shard and merge queries."""
+
+
+def _mask(sql: str) -> str:
+    """Return ``sql`` with the content of quoted parts replaced by ``x``.
+
+    Quote characters and positions are kept so matches on the mask can be
+    used to slice the original text.
+    """
+    return _QUOTED.sub(lambda m: m.group(0)[0] + "x" * (len(m.group(0)) - 2) + m.group(0)[-1], sql)
+
+
+def _depths(masked: str) -> list:
+    depth, out = 0, []
+    for ch in masked:
+        if ch == "(":
+            depth += 1
+        out.append(depth)
+        if ch == ")":
+            depth = max(depth - 1, 0)
+    return out
+
+
+def _split(text: str, masked: str, sep: str = ",") -> list:
+    """Split ``text`` at top-level occurrences of ``sep``."""
+    depths = _depths(masked)
+    parts, start = [], 0
+    for i, ch in enumerate(masked):
+        if ch == sep and depths[i] == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _unquote(name: str) -> str:
+    if name[:1] in "\"[`" and len(name) > 1:
+        return name[1:-1]
+    return name
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _norm(expr: str) -> str:
+    return re.sub(r"\s+", " ", expr.strip()).lower()
+
+
+def clauses(sql: str) -> dict:
+    """Split a simple ``SELECT`` into its top-level clauses.
+
+    Raises ``Unsupported`` for CTEs, compound selects, subqueries and
+    window functions.
+    """
+    masked = _mask(sql)
+    depths = _depths(masked)
+    if re.search(r"\bOVER\b", masked, re.I):
+        raise Unsupported("window function")
+    found = []
+    for m in _CLAUSE.finditer(masked):
+        word = re.sub(r"\s+", " ", m.group(1).upper())
+        if depths[m.start()] > 0:
+            if word == "SELECT":
+                raise Unsupported("subquery")
+            continue
+        found.append((word, m.start(), m.end()))
+    if not found or found[0][0] != "SELECT" or masked[: found[0][1]].strip():
+        raise Unsupported("not a SELECT")
+    order = ["SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT"]
+    parts, last = {}, -1
+    for i, (word, start, end) in enumerate(found):
+        if word not in order or word in parts or order.index(word) < last:
+            raise Unsupported(f"{word} clause")
+        last = order.index(word)
+        stop = found[i + 1][1] if i + 1 < len(found) else len(sql)
+        parts[word] = (sql[end:stop].strip(), start)
+    if "FROM" not in parts:
+        raise Unsupported("no FROM clause")
+    return {word: text for word, (text, _) in parts.items()}
+
+
+def split_alias(item: str):
+    """Return ``(expression, alias or None)`` of a select list item."""
+    item = item.strip()
+    masked = _mask(item)
+    m = _ALIAS_AS.search(masked)
+    if m is None:
+        m = _ALIAS_BARE.search(masked)
+        if m is not None:
+            word = masked[m.start(1):m.end(1)]
+            before = masked[: m.start()].split()
+            if word.upper() in _NOT_ALIAS or (before and before[-1].upper() in _NOT_ALIAS):
+                m = None
+    if m is None or _depths(masked)[m.start()] > 0:
+        return item, None
+    return item[: m.start()].strip(), _unquote(item[m.start(1):m.end(1)])
+
+
+def output_name(expr: str, alias) -> str:
+    """Return the column name SQLite gives to ``expr``."""
+    if alias is not None:
+        return alias
+    m = _COLUMN_REF.match(expr)
+    return _unquote(m.group(1)) if m else expr
+
+
+class _Aggregates:
+    """Collect the per-shard parts of the aggregates of one statement."""
+
+    def __init__(self):
+        self.partials = []
+
+    def _partial(self, expr: str) -> str:
+        # NUL cannot occur in the statement (see ``plan_fanout``), so the
+        # placeholder never matches an alias, a column or a literal
+        self.partials.append(expr)
+        return f"{_PARTIAL}{len(self.partials) - 1}{_PARTIAL}"
+
+    def rewrite(self, expr: str):
+        """Return ``expr`` with aggregates replaced by merge expressions.
+
+        The second value tells whether any aggregate was found.
+        """
+        masked = _mask(expr)
+        depths = _depths(masked)
+        out, pos, found = [], 0, False
+        for m in _AGG.finditer(masked):
+            if m.start() < pos:
+                continue
+            name = m.group(1).upper()
+            open_at = m.end() - 1
+            close = next((i for i in range(open_at + 1, len(masked))
+                          if masked[i] == ")" and depths[i] == depths[open_at]), None)
+            if close is None:
+                raise Unsupported("unbalanced parentheses")
+            inner, inner_masked = expr[open_at + 1:close], masked[open_at + 1:close]
+            args = _split(inner, inner_masked)
+            if name in ("MIN", "MAX") and len(args) > 1:
+                continue  # scalar min/max
+            if name not in ("SUM", "TOTAL", "COUNT", "AVG", "MIN", "MAX"):
+                raise Unsupported(f"{name} aggregate")
+            if re.match(r"\s*DISTINCT\b", inner_masked, re.I):
+                raise Unsupported("DISTINCT aggregate")
+            if _AGG.search(inner_masked):
+                raise Unsupported("nested aggregate")
+            call = expr[m.start():close + 1]
+            if name == "AVG":
+                total = self._partial(f"TOTAL({inner})")
+                count = self._partial(f"COUNT({inner})")
+                merged = f"(SUM({total}) / NULLIF(SUM({count}), 0))"
+            elif name == "COUNT":
+                merged = f"SUM({self._partial(call)})"
+            elif name == "TOTAL":
+                merged = f"TOTAL({self._partial(call)})"
+            else:
+                merged = f"{name}({self._partial(call)})"
+            out.append(expr[pos:m.start()])
+            out.append(merged)
+            pos = close + 1
+            found = True
+        out.append(expr[pos:])
+        return "".join(out), found
+
+
+class ShardPlan:
+    """How one statement is executed: ``kind`` plus the queries involved."""
+
+    def __init__(self, kind: str, shard_sql: str | None = None, merge=None, reason: str = ""):
+        self.kind = kind
+        self.shard_sql = shard_sql
+        # ``merge(names)`` returns the SQL run on the combined ``parts`` table
+        # (columns ``c0``, ``c1``, ...) or ``None`` to concatenate the parts.
+        self.merge = merge
+        self.reason = reason
+
+
+def _limit(text: str | None):
+    if text is None:
+        return None
+    m = _LIMIT.match(f"LIMIT {text}")
+    if m is None:
+        raise Unsupported("LIMIT expression")
+    if m.group(3) is not None:  # LIMIT offset, count
+        return int(m.group(3)), int(m.group(1))
+    return int(m.group(1)), int(m.group(2) or 0)
+
+
+def _limit_sql(limit) -> str:
+    if limit is None:
+        return ""
+    count, offset = limit
+    return f" LIMIT {count}" + (f" OFFSET {offset}" if offset else "")
+
+
+def _order_terms(order: str | None):
+    """Return ``[(expression, direction suffix)]`` of an ``ORDER BY`` clause."""
+    if not order:
+        return []
+    terms = []
+    for term in _split(order, _mask(order)):
+        m = _DIRECTION.search(_mask(term))
+        terms.append((term[: m.start()].strip(), term[m.start():].strip()))
+    return terms
+
+
+@lru_cache(maxsize=256)
+def plan_fanout(sql: str) -> ShardPlan:
+    """Split ``sql`` into a per-shard query and a merge query.
+
+    Raises ``Unsupported`` when the statement cannot be combined exactly.
+    """
+    if _PARTIAL in sql:
+        raise Unsupported("NUL character")
+    parts = clauses(sql)
+    select = parts["SELECT"]
+    distinct = bool(re.match(r"DISTINCT\b", select, re.I))
+    select = re.sub(r"^(DISTINCT|ALL)\b", "", select, flags=re.I).strip()
+    items = [split_alias(item) for item in _split(select, _mask(select))]
+    aggregates = _Aggregates()
+    merged_items = [aggregates.rewrite(expr) for expr, _ in items]
+    limit = _limit(parts.get("LIMIT"))
+    order = _order_terms(parts.get("ORDER BY"))
+    names = [output_name(expr, alias) for expr, alias in items]
+    lowered = {n.lower(): i for i, n in reversed(list(enumerate(names)))}
+    body = f"FROM {parts['FROM']}" + (f" WHERE {parts['WHERE']}" if "WHERE" in parts else "")
+
+    if "GROUP BY" not in parts and not any(found for _, found in merged_items):
+        if "HAVING" in parts:
+            raise Unsupported("HAVING without aggregates")
+        # Plain rows: every shard sorts and limits, the merge repeats both.
+        shard_sql = f"SELECT {'DISTINCT ' if distinct else ''}{select} {body}"
+        if order:
+            shard_sql += f" ORDER BY {parts['ORDER BY']}"
+        if limit is not None:
+            shard_sql += f" LIMIT {limit[0] + limit[1]}"
+        if not (distinct or order or limit):
+            return ShardPlan("fanout", shard_sql, None)
+        exprs = {_norm(expr): i for i, (expr, _) in reversed(list(enumerate(items)))}
+
+        def merge(columns):
+            by_name = {c.lower(): i for i, c in reversed(list(enumerate(columns)))}
+            terms = []
+            for expr, direction in order:
+                if expr.isdigit():
+                    index = int(expr) - 1
+                elif _norm(expr) in exprs and "*" not in select:
+                    index = exprs[_norm(expr)]
+                else:
+                    m = _COLUMN_REF.match(expr)
+                    index = by_name.get(_unquote(m.group(1)).lower()) if m else None
+                if index is None or index >= len(columns):
+                    raise Unsupported(f"ORDER BY {expr}")
+                terms.append(f"c{index} {direction}".strip())
+            listing = ", ".join(f"c{i} AS {_quote(c)}" for i, c in enumerate(columns))
+            sql = f"SELECT {'DISTINCT ' if distinct else ''}{listing} FROM parts"
+            if terms:
+                sql += " ORDER BY " + ", ".join(terms)
+            return sql + _limit_sql(limit)
+
+        return ShardPlan("fanout", shard_sql, merge)
+
+    # Aggregation: shards return group keys and partial aggregates.
+    shard_columns = []  # expressions, selected as c0, c1, ...
+
+    def column(expr):
+        shard_columns.append(expr)
+        return f"c{len(shard_columns) - 1}"
+
+    item_columns = {}
+    merge_items = []
+    for i, ((expr, _), (merged, found)) in enumerate(zip(items, merged_items)):
+        if expr == "*" or expr.endswith(".*"):
+            raise Unsupported("* with aggregates")
+        if found:
+            merge_items.append(f"{merged} AS {_quote(names[i])}")
+        else:
+            item_columns[i] = column(expr)
+            merge_items.append(f"{item_columns[i]} AS {_quote(names[i])}")
+    exprs = {_norm(expr): i for i, (expr, _) in reversed(list(enumerate(items)))}
+
+    keys, shard_group = [], []
+    for term in _split(parts.get("GROUP BY", ""), _mask(parts.get("GROUP BY", ""))) if "GROUP BY" in parts else []:
+        term = term.strip()
+        index = None
+        if term.isdigit():
+            index = int(term) - 1
+        elif _unquote(term).lower() in lowered:
+            index = lowered[_unquote(term).lower()]
+            # A plain column that happens to share a result name is still a column
+            if _COLUMN_REF.match(term) and _norm(items[index][0]) != _norm(term) and items[index][1] is None:
+                index = None
+        elif _norm(term) in exprs:
+            index = exprs[_norm(term)]
+        if index is not None:
+            if index not in item_columns:
+                raise Unsupported("GROUP BY an aggregate")
+            keys.append(item_columns[index])
+            shard_group.append(items[index][0])
+        else:
+            keys.append(column(term))
+            shard_group.append(term)
+
+    having = None
+    if "HAVING" in parts:
+        having, _ = aggregates.rewrite(parts["HAVING"])
+    order_sql = []
+    for expr, direction in order:
+        if expr.isdigit():
+            target = expr
+        elif _unquote(expr).lower() in lowered:
+            target = _quote(names[lowered[_unquote(expr).lower()]])
+        elif _norm(expr) in exprs:
+            target = _quote(names[exprs[_norm(expr)]])
+        else:
+            target, found = aggregates.rewrite(expr)
+            if not found:
+                raise Unsupported(f"ORDER BY {expr}")
+        order_sql.append(f"{target} {direction}".strip())
+
+    offset = len(shard_columns)
+    listing = [f"{expr} AS c{i}" for i, expr in enumerate(shard_columns)]
+    listing += [f"{expr} AS c{offset + i}" for i, expr in enumerate(aggregates.partials)]
+    shard_sql = f"SELECT {', '.join(listing)} {body}"
+    if shard_group:
+        shard_sql += " GROUP BY " + ", ".join(shard_group)
+
+    def partial_column(m):
+        return f"c{offset + int(m.group(1))}"
+
+    merge_sql = f"SELECT {'DISTINCT ' if distinct else ''}{', '.join(merge_items)} FROM parts"
+    if keys:
+        merge_sql += " GROUP BY " + ", ".join(keys)
+    if having:
+        merge_sql += f" HAVING {having}"
+    if order_sql:
+        merge_sql += " ORDER BY " + ", ".join(order_sql)
+    merge_sql = re.sub(f"{_PARTIAL}(\\d+){_PARTIAL}", partial_column, merge_sql + _limit_sql(limit))
+    return ShardPlan("fanout", shard_sql, lambda columns: merge_sql)
+
+
+def _row_limit(sql: str, guard) -> str:
+    """Apply the guard's row limit plus one, so ``cap`` can mark truncation."""
+    return ensure_limit(sql, guard.max_rows + 1 if guard.max_rows > 0 else 0)
+
+
+def table_fingerprint(conn, table: str):
+    """Return a digest of the rows of ``table`` in rowid order."""
+    digest = hashlib.sha256()
+    try:
+        cursor = conn.execute(f'SELECT * FROM "{table}" ORDER BY rowid')
+    except sqlite3.OperationalError:  # WITHOUT ROWID table
+        cursor = conn.execute(f'SELECT * FROM "{table}" ORDER BY 1')
+    for rows in iter(lambda: cursor.fetchmany(1000), []):
+        digest.update(repr(rows).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ShardSet:
+    """A set of SQLite files with identical schemas queried as one database."""
+
+    def __init__(self, paths, workers: int | None = None, replicated=None):
+        if not paths:
+            raise ValueError("No shard databases given")
+        self.paths = list(paths)
+        self.pools = [get_pool(p) for p in self.paths]
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or min(len(self.paths), os.cpu_count() or 1), thread_name_prefix="shard"
+        )
+        self.plans = {"single": 0, "fanout": 0, "attach": 0}
+        self._lock = threading.Lock()
+        self._roots = (None, {})
+        self._check_schemas()
+        self.replicated = frozenset(replicated) if replicated is not None else self.detect_replicated()
+        logger.info("Loaded %d shards, replicated tables: %s", len(self.paths), ", ".join(sorted(self.replicated)))
+
+    def _check_schemas(self) -> None:
+        with self.pools[0].connection() as conn:
+            expected = introspect(conn)
+        for path, pool in zip(self.paths[1:], self.pools[1:]):
+            with pool.connection() as conn:
+                if introspect(conn) != expected:
+                    raise ValueError(f"Shard {path} has a different schema than {self.paths[0]}")
+
+    def detect_replicated(self) -> frozenset:
+        """Return the tables whose rows are identical in every shard."""
+        with self.pools[0].connection() as conn:
+            tables = [r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            )]
+        if len(self.paths) == 1:
+            return frozenset(tables)
+        replicated = set()
+        for table in tables:
+            counts = set()
+            for pool in self.pools:
+                with pool.connection() as conn:
+                    counts.add(conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0])
+            if len(counts) != 1:
+                continue
+            prints = set()
+            for pool in self.pools:
+                with pool.connection() as conn:
+                    prints.add(table_fingerprint(conn, table))
+            if len(prints) == 1:
+                replicated.add(table)
+        return frozenset(replicated)
+
+    def plan(self, sql: str) -> ShardPlan:
+        """Return the ``ShardPlan`` for ``sql``."""
+        sql = canonical_sql(sql)
+        with self.pools[0].connection() as conn:
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if self._roots[0] != schema_version:
+                self._roots = (schema_version, root_pages(conn))
+            tables = read_tables(conn, sql, self._roots[1])
+        if tables is not None:
+            partitioned = tables - self.replicated
+            if not partitioned:
+                return ShardPlan("single", sql)
+            if len(partitioned) > 1:
+                return ShardPlan("attach", sql, reason="joins partitioned tables " + ", ".join(sorted(partitioned)))
+        try:
+            return plan_fanout(sql)
+        except Unsupported as e:
+            return ShardPlan("attach", sql, reason=str(e))
+
+    def execute(self, sql: str, guard=None):
+        """Run ``sql`` over all shards and return the combined DataFrame.
+
+        With a ``query_guard.QueryGuard`` the plan of the statement is checked
+        on the first shard, every shard query is time-boxed and the merged
+        result is capped.
+        """
+        plan = self.plan(sql)
+        if guard is not None:
+            with self.pools[0].connection() as conn:
+                guard.check_plan(conn, plan.shard_sql)
+        if plan.kind == "fanout":
+            try:
+                df = self._fanout(plan, guard)
+            except Unsupported as e:
+                plan = ShardPlan("attach", canonical_sql(sql), reason=str(e))
+            except sqlite3.OperationalError as e:
+                # The merge query could not be built from the parts
+                plan = ShardPlan("attach", canonical_sql(sql), reason=str(e))
+        if plan.kind == "single":
+            with timed("sql"), self.pools[0].connection() as conn:
+                df = self._run(conn, plan.shard_sql, guard)
+        elif plan.kind == "attach":
+            logger.info("Running attached over %d shards: %s", len(self.paths), plan.reason)
+            with timed("sql"), self._attached() as conn:
+                df = self._run(conn, plan.shard_sql, guard)
+        with self._lock:
+            self.plans[plan.kind] += 1
+        RESULT_ROWS.observe(len(df))
+        logger.info("SQL: %s", sql, extra={"sql": sql, "rows": len(df), "shard_plan": plan.kind})
+        return df
+
+    def _run(self, conn, sql, guard):
+        import pandas as pd
+
+        if guard is None:
+            return pd.read_sql_query(sql, conn)
+        with guard.budget(conn):
+            df = pd.read_sql_query(_row_limit(sql, guard), conn)
+        return guard.cap(df)
+
+    def _scan(self, pool, sql, guard):
+        with pool.connection() as conn:
+            if guard is None:
+                cursor = conn.execute(sql)
+                return [d[0] for d in cursor.description], cursor.fetchall()
+            with guard.budget(conn):
+                cursor = conn.execute(sql)
+                return [d[0] for d in cursor.description], cursor.fetchall()
+
+    def _fanout(self, plan, guard):
+        import pandas as pd
+
+        shard_sql = plan.shard_sql
+        if guard is not None and plan.merge is None:
+            shard_sql = _row_limit(shard_sql, guard)
+        with timed("shard_scan"):
+            futures = [self.executor.submit(self._scan, pool, shard_sql, guard) for pool in self.pools]
+            results = [f.result() for f in futures]
+        columns = results[0][0]
+        with timed("shard_merge"):
+            if plan.merge is None:
+                rows = [row for _, part in results for row in part]
+                df = pd.DataFrame.from_records(rows, columns=columns)
+            else:
+                merge_sql = plan.merge(columns)
+                if guard is not None:
+                    merge_sql = _row_limit(merge_sql, guard)
+                conn = sqlite3.connect(":memory:")
+                try:
+                    names = ", ".join(f"c{i}" for i in range(len(columns)))
+                    conn.execute(f"CREATE TABLE parts ({names})")
+                    marks = ", ".join("?" for _ in columns)
+                    for _, part in results:
+                        conn.executemany(f"INSERT INTO parts VALUES ({marks})", part)
+                    df = pd.read_sql_query(merge_sql, conn)
+                finally:
+                    conn.close()
+        return guard.cap(df) if guard is not None else df
+
+    def _attached(self):
+        """Return a connection exposing the union of all shards."""
+        if len(self.paths) > MAX_ATTACHED:
+            raise QueryRejected(
+                "shard_fanout",
+                f"Bu sorgu parçalara bölünemiyor ve {MAX_ATTACHED} veritabanından fazlası birleştirilemiyor",
+                shards=len(self.paths),
+            )
+        conn = sqlite3.connect("file::memory:", uri=True, check_same_thread=False)
+        for i, path in enumerate(self.paths):
+            conn.execute(f"ATTACH DATABASE ? AS s{i}", (sqlite_uri(path),))
+        objects = conn.execute(
+            "SELECT name, type, sql FROM s0.sqlite_master WHERE type IN ('table', 'view') "
+            "AND name NOT LIKE 'sqlite_%' ORDER BY type DESC"
+        ).fetchall()
+        for name, kind, definition in objects:
+            if kind == "view":
+                # Views are recreated so they read the combined tables
+                conn.execute(re.sub(r"^\s*CREATE\s+VIEW", "CREATE TEMP VIEW", definition, flags=re.I))
+            elif name in self.replicated:
+                conn.execute(f'CREATE TEMP VIEW "{name}" AS SELECT * FROM s0."{name}"')
+            else:
+                union = " UNION ALL ".join(f'SELECT * FROM s{i}."{name}"' for i in range(len(self.paths)))
+                conn.execute(f'CREATE TEMP VIEW "{name}" AS {union}')
+        return _closing(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"shards": len(self.paths), "replicated": sorted(self.replicated), "plans": dict(self.plans)}
+
+
+class _closing:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, *exc):
+        self.conn.close()
+
+
+def shard_paths(spec: str) -> list:
+    """Expand a comma separated list of paths and glob patterns."""
+    paths = []
+    for part in (p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        matches = sorted(glob.glob(part))
+        paths.extend(matches if matches else [part])
+    return paths
+
+
+def shards_from_env():
+    """Build a ``ShardSet`` from ``NL2SQL_SHARDS`` or return ``None``.
+
+    ``NL2SQL_SHARDS`` is a comma separated list of files or glob patterns,
+    ``SHARD_WORKERS`` the number of threads and ``NL2SQL_REPLICATED_TABLES``
+    an optional comma separated list overriding the detection of replicated
+    tables.
+    """
+    spec = os.getenv("NL2SQL_SHARDS")
+    if not spec:
+        return None
+    replicated = os.getenv("NL2SQL_REPLICATED_TABLES")
+    return ShardSet(
+        shard_paths(spec),
+        workers=int(os.getenv("SHARD_WORKERS", "0")) or None,
+        replicated=[t.strip() for t in replicated.split(",") if t.strip()] if replicated else None,
+    )
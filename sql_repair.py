@@ -0,0 +1,168 @@
+"""Validation and repair of generated SQL before it runs.
+
+A statement naming a table or column that does not exist used to fail in
+``execute_sql`` and cost the user another question and LLM round-trip.
+``repair`` compiles the statement with ``EXPLAIN`` on a read-only
+connection, which checks every identifier without running anything. When
+SQLite reports ``no such table`` or ``no such column``, the name is looked
+up in ``get_schema_details()``. Only typos are repaired locally: folded the
+way ``schema_index`` folds names (casefold, Turkish letters to ASCII), the
+replacement must have the same ``_``-separated words, each at most one edit
+away (two for long words), or differ by a plural suffix or an underscore
+only. It must also be the only such match. ``Satışlar``, ``Musteri`` and
+``S.tarh`` are repaired this way, outside string literals; the statement is
+checked again after every fix. A name that only resembles another one, such as ``urun_adi``
+and ``urun_id``, changes what the query means. So does any other change to
+an ``_id`` column, and both are left to the LLM.
+
+Errors that cannot be fixed locally are returned so the caller can make one
+targeted repair request to the LLM with the error message, see
+``nl2sql_app.ask_llm_repair_async``.
+"""
+
+import re
+import sqlite3
+from difflib import SequenceMatcher
+
+from index_advisor import table_aliases
+from schema_index import fold
+
+# Names scoring below this similarity to every schema name are not replaced
+MIN_SIMILARITY = 0.85
+# Words at least this long may be two edits away instead of one
+LONG_WORD = 8
+PLURAL_SUFFIXES = ("lar", "ler")
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_MISSING_RE = re.compile(r"no such (table|column): (\S+)")
+
+
+def check(conn, sql: str) -> str | None:
+    """Return SQLite's error message for ``sql`` or ``None`` when it compiles."""
+    try:
+        conn.execute("EXPLAIN " + sql).fetchone()
+    except sqlite3.Error as e:
+        return str(e)
+    return None
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Return the edits (insert, delete, replace, swap neighbours) turning ``a`` into ``b``."""
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def typo_of(name: str, candidate: str) -> bool:
+    """Tell whether the folded ``name`` is a misspelling of the folded ``candidate``."""
+    if name == candidate:
+        return True
+    if name.endswith("_id") or candidate.endswith("_id") or "id" in (name, candidate):
+        return False  # another key column joins or groups by something else
+    if any(candidate == name + s or name == candidate + s for s in PLURAL_SUFFIXES):
+        return True
+    if name.replace("_", "") == candidate.replace("_", ""):
+        return True
+    words, others = name.split("_"), candidate.split("_")
+    if len(words) != len(others):
+        return False
+    return all(edit_distance(w, o) <= (2 if len(o) >= LONG_WORD else 1) for w, o in zip(words, others))
+
+
+def closest(name: str, candidates) -> str | None:
+    """Return the candidate ``name`` is a typo of, or ``None``.
+
+    Ties between two candidates are not guessed.
+    """
+    folded = fold(name)
+    scored = []
+    for candidate in candidates:
+        other = fold(candidate)
+        if not typo_of(folded, other):
+            continue
+        if other == folded:
+            score = 1.0
+        elif any(other == folded + s or folded == other + s for s in PLURAL_SUFFIXES) \
+                or folded.replace("_", "") == other.replace("_", ""):
+            score = 0.9
+        else:
+            score = SequenceMatcher(None, folded, other).ratio()
+        scored.append((score, candidate))
+    scored.sort(key=lambda s: -s[0])
+    if not scored or scored[0][0] < MIN_SIMILARITY:
+        return None
+    if len(scored) > 1 and scored[1][0] == scored[0][0] and fold(scored[1][1]) != fold(scored[0][1]):
+        return None
+    return scored[0][1]
+
+
+def _replace(sql: str, pattern: str, replacement: str) -> str:
+    """Replace ``pattern`` in ``sql`` outside string literals."""
+    regex = re.compile(pattern, re.I)
+    parts = []
+    last = 0
+    for match in _STRING_RE.finditer(sql):
+        parts.append(regex.sub(replacement, sql[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(regex.sub(replacement, sql[last:]))
+    return "".join(parts)
+
+
+def _identifier(name: str) -> str:
+    # The name as written, bare or quoted
+    return rf"(?:\b{re.escape(name)}\b|\"{re.escape(name)}\"|`{re.escape(name)}`|\[{re.escape(name)}\])"
+
+
+def fix(sql: str, error: str, details: dict):
+    """Return ``(sql, description)`` with the identifier of ``error`` repaired, or ``None``."""
+    match = _MISSING_RE.search(error)
+    if not match:
+        return None
+    kind, name = match.groups()
+    tables = {t["name"]: [c["name"] for c in t["columns"]] for t in details.get("tables", [])}
+    if kind == "table":
+        name = name.split(".")[-1]
+        target = closest(name, tables)
+        if target is None:
+            return None
+        return _replace(sql, rf"(?<![\w.]){_identifier(name)}", target), f"{name} -> {target}"
+    qualifier, _, column = name.rpartition(".")
+    aliases = table_aliases(sql, tables)
+    if qualifier and qualifier.lower() in aliases:
+        candidates = tables[aliases[qualifier.lower()]]
+    else:
+        # Columns of the tables the statement reads, or of every table
+        used = set(aliases.values())
+        candidates = [c for t in used for c in tables[t]] or [c for cols in tables.values() for c in cols]
+    target = closest(column, candidates)
+    if target is None:
+        return None
+    if qualifier:
+        pattern = rf"\b{re.escape(qualifier)}\s*\.\s*{_identifier(column)}"
+        return _replace(sql, pattern, f"{qualifier}.{target}"), f"{name} -> {qualifier}.{target}"
+    return _replace(sql, rf"(?<![\w.]){_identifier(column)}", target), f"{column} -> {target}"
+
+
+def repair(conn, sql: str, details: dict, max_fixes: int = 3) -> tuple[str, str | None, list]:
+    """Validate ``sql`` and repair misspelt identifiers locally.
+
+    Returns ``(sql, error, fixes)``: the possibly repaired statement, the
+    remaining SQLite error (``None`` when it compiles) and the applied fixes
+    as ``"old -> new"`` descriptions.
+    """
+    fixes = []
+    while True:
+        error = check(conn, sql)
+        if error is None or len(fixes) >= max_fixes:
+            return sql, error, fixes
+        fixed = fix(sql, error, details)
+        if fixed is None or fixed[0] == sql:
+            return sql, error, fixes
+        sql = fixed[0]
+        fixes.append(fixed[1])
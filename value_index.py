@@ -0,0 +1,319 @@
+"""Index of the text values questions refer to.
+
+Users name entities ("Ankara'daki müşteriler", a product, a supplier) that
+the LLM has never seen, so it guesses spellings and writes
+``LIKE '%...%'`` scans. ``ValueIndex`` keeps the distinct values of the
+name-like and low-cardinality text columns from ``get_schema_details()`` in
+an FTS5 trigram index (a plain ``LIKE`` search when SQLite lacks FTS5). At
+question time every word is looked up and matched against the values the
+same way ``schema_index`` matches table names: casefolded and folded to
+ASCII with ``TRANSLATION_TABLE``. Turkish case suffixes ("Ankara'daki",
+"Gecenin") and small typos ("Ankra") are tolerated. The matches go into the
+prompt with the exact spelling so the SQL can filter with equality.
+
+Columns are indexed incrementally: a ``rowid`` watermark per column means
+only rows added since the last update are read. Dropped columns leave the
+index, and a column whose largest ``rowid`` went below the watermark is
+indexed again from scratch. Values of rows that are updated or deleted stay
+in the index until then. An update reads the source database first and only
+holds the lookup lock while it writes the new values, so lookups are not
+held up by the scans.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+from difflib import SequenceMatcher
+
+from db_pool import sqlite_uri
+from schema_index import MIN_PREFIX, fold, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Columns holding names of things are indexed whatever their cardinality
+NAME_COLUMN_RE = re.compile(r"(isim|^ad$|^adi$|unvan|lokasyon|sehir|konum|kategori|sektor|pozisyon|depo|marka)")
+
+# Folded Turkish case and possessive endings accepted after a value
+SUFFIXES = {
+    "a", "e", "i", "u", "ya", "ye", "yi", "yu", "in", "un", "nin", "nun", "da", "de", "ta", "te",
+    "dan", "den", "tan", "ten", "daki", "deki", "taki", "teki", "nda", "nde", "ndan", "nden", "ndaki",
+    "ndeki", "la", "le", "yla", "yle", "lar", "ler", "lari", "leri", "larin", "lerin", "si", "su",
+    "sinin", "sunun", "sindaki", "sindeki", "ca", "ce", "li", "lu",
+}
+
+# Minimum similarity of a misspelt word and of a whole match
+MIN_WORD_SCORE = 0.88
+MIN_SCORE = 0.85
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS DegerKolonlari (tablo TEXT, kolon TEXT, son_rowid INTEGER, "
+    "PRIMARY KEY (tablo, kolon))",
+    "CREATE TABLE IF NOT EXISTS Degerler (id INTEGER PRIMARY KEY, tablo TEXT, kolon TEXT, deger TEXT, "
+    "katlanmis TEXT, UNIQUE (tablo, kolon, deger))",
+    "CREATE INDEX IF NOT EXISTS Degerler_katlanmis ON Degerler (katlanmis)",
+]
+FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS Degerler_fts USING fts5(katlanmis, tokenize='trigram')"
+
+ValueMatch = namedtuple("ValueMatch", "mention table column value score")
+
+
+def _word_score(value_word: str, word: str) -> float:
+    """Return how well question ``word`` spells ``value_word``, ``0`` for no match.
+
+    Typos are only forgiven in words of five or more letters that start with
+    the same letter.
+    """
+    if word == value_word:
+        return 1.0
+    if len(value_word) >= MIN_PREFIX and word.startswith(value_word) and word[len(value_word):] in SUFFIXES:
+        return 0.95
+    if len(value_word) < 5 or word[0] != value_word[0]:
+        return 0.0
+    forms = [word] + [word[:-len(s)] for s in SUFFIXES if word.endswith(s) and len(word) - len(s) >= 4]
+    best = 0.0
+    for form in forms:
+        if abs(len(form) - len(value_word)) > 2:
+            continue
+        matcher = SequenceMatcher(None, value_word, form)
+        if matcher.quick_ratio() >= MIN_WORD_SCORE:
+            best = max(best, matcher.ratio())
+    return best if best >= MIN_WORD_SCORE else 0.0
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def hint_text(matches) -> str:
+    """Return the prompt lines telling the LLM the exact spelling of ``matches``."""
+    if not matches:
+        return ""
+    lines = ["Sorudaki değerlerin veritabanındaki karşılıkları (filtrelerde LIKE yerine bu değerlerle eşitlik kullan):"]
+    lines += [f'- "{m.mention}": {m.table}.{m.column} = {_quote(m.value)}' for m in matches]
+    return "\n".join(lines)
+
+
+class ValueIndex:
+    """Trigram index over the text values of the database at ``path``.
+
+    ``index_path`` keeps the index in a file between runs (in memory when
+    ``None``). Columns with at most ``max_distinct`` values in their first
+    ``sample_rows`` rows count as low-cardinality; longer values than
+    ``max_length`` characters (descriptions, e-mail text) are left out.
+    """
+
+    def __init__(self, path: str, index_path: str | None = None, max_distinct: int = 200,
+                 max_length: int = 64, sample_rows: int = 100_000):
+        self.path = path
+        self.max_distinct = max_distinct
+        self.max_length = max_length
+        self.sample_rows = sample_rows
+        self.updates = 0
+        self.lookups = 0
+        # ``_lock`` guards the index, ``_update_lock`` the source and watermarks
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._details = None
+        self._data_version = None
+        self._reserved = set()
+        self._source = sqlite3.connect(sqlite_uri(path), uri=True, check_same_thread=False)
+        self._db = sqlite3.connect(index_path or ":memory:", check_same_thread=False)
+        for stmt in SCHEMA:
+            self._db.execute(stmt)
+        try:
+            self._db.execute(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            logger.info("SQLite has no FTS5 trigram tokenizer, values are searched with LIKE")
+            self.fts = False
+        self._db.commit()
+
+    # -- building ------------------------------------------------------------
+
+    def _columns(self, details, existing) -> dict:
+        """Return ``{(table, column): definition}`` of the columns worth indexing.
+
+        Columns in ``existing`` were chosen before and stay indexed while they exist.
+        """
+        tables = {name for (name,) in self._source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        columns = {}
+        for table in details.get("tables", []):
+            name = table["name"]
+            if name not in tables:
+                continue
+            for col in table["columns"]:
+                declared = (col.get("type") or "").upper()
+                if "fk" in col or not any(t in declared for t in ("CHAR", "CLOB", "TEXT")):
+                    continue
+                key = (name, col["name"])
+                if key in existing or NAME_COLUMN_RE.search(fold(col["name"])) or self._low_cardinality(*key):
+                    columns[key] = declared
+        return columns
+
+    def _low_cardinality(self, table: str, column: str) -> bool:
+        distinct, length = self._source.execute(
+            f'SELECT COUNT(DISTINCT "{column}"), MAX(length("{column}")) FROM '
+            f'(SELECT "{column}" FROM "{table}" LIMIT ?)', (self.sample_rows,)).fetchone()
+        return distinct <= self.max_distinct and (length or 0) <= self.max_length
+
+    def _drop(self, table: str, column: str) -> None:
+        if self.fts:
+            self._db.execute("DELETE FROM Degerler_fts WHERE rowid IN "
+                             "(SELECT id FROM Degerler WHERE tablo = ? AND kolon = ?)", (table, column))
+        self._db.execute("DELETE FROM Degerler WHERE tablo = ? AND kolon = ?", (table, column))
+        self._db.execute("DELETE FROM DegerKolonlari WHERE tablo = ? AND kolon = ?", (table, column))
+
+    def _read_column(self, table: str, column: str, last_rowid: int):
+        """Return ``(max_rowid, reset, values)`` of the rows after ``last_rowid``.
+
+        ``reset`` means the column shrank below its watermark and is read from
+        the start.
+        """
+        max_rowid = self._source.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+        reset = max_rowid < last_rowid
+        values = [value for (value,) in self._source.execute(
+            f'SELECT DISTINCT "{column}" FROM "{table}" WHERE rowid > ? AND rowid <= ? '
+            f'AND typeof("{column}") = \'text\' AND length("{column}") BETWEEN 1 AND ?',
+            (0 if reset else last_rowid, max_rowid, self.max_length))]
+        return max_rowid, reset, values
+
+    def _index_column(self, table: str, column: str, max_rowid: int, reset: bool, values) -> int:
+        if reset:
+            self._drop(table, column)
+        added = 0
+        for value in values:
+            cursor = self._db.execute("INSERT OR IGNORE INTO Degerler (tablo, kolon, deger, katlanmis) "
+                                      "VALUES (?, ?, ?, ?)", (table, column, value, " ".join(tokenize(value))))
+            if cursor.rowcount and self.fts:
+                self._db.execute("INSERT INTO Degerler_fts (rowid, katlanmis) VALUES (?, ?)",
+                                 (cursor.lastrowid, " ".join(tokenize(value))))
+            added += cursor.rowcount
+        self._db.execute("INSERT INTO DegerKolonlari (tablo, kolon, son_rowid) VALUES (?, ?, ?) "
+                         "ON CONFLICT (tablo, kolon) DO UPDATE SET son_rowid = excluded.son_rowid",
+                         (table, column, max_rowid))
+        return added
+
+    def update(self, details) -> int:
+        """Index the rows added since the last update and return the new values.
+
+        ``details`` is the ``get_schema_details()`` output; the work is skipped
+        when neither it nor the data changed since the last call.
+        """
+        with self._update_lock:
+            version = self._source.execute("PRAGMA data_version").fetchone()[0]
+            if details is self._details and version == self._data_version:
+                return 0
+            reserved = self._reserved
+            if details is not self._details:
+                names = [t["name"] for t in details.get("tables", [])]
+                names += [c["name"] for t in details.get("tables", []) for c in t["columns"]]
+                reserved = {term for name in names for term in tokenize(name) + [fold(name)]}
+            with self._lock:
+                marks = {(t, c): r for t, c, r in self._db.execute(
+                    "SELECT tablo, kolon, son_rowid FROM DegerKolonlari")}
+            columns = self._columns(details, set(marks))
+            reads = {key: self._read_column(*key, marks.get(key, 0)) for key in columns}
+            added = 0
+            with self._lock:
+                try:
+                    for key in set(marks) - set(columns):
+                        self._drop(*key)
+                    for (table, column), read in reads.items():
+                        added += self._index_column(table, column, *read)
+                    self._db.commit()
+                except sqlite3.Error:
+                    self._db.rollback()
+                    raise
+                self._reserved = reserved
+                self.updates += 1
+            self._details = details
+            self._data_version = version
+        if added:
+            logger.info("Indexed %d new values of %d columns", added, len(columns))
+        return added
+
+    # -- lookup --------------------------------------------------------------
+
+    def _candidates(self, word: str) -> list:
+        if len(word) < 3:
+            return self._db.execute("SELECT id, tablo, kolon, deger, katlanmis FROM Degerler "
+                                    "WHERE katlanmis = ?", (word,)).fetchall()
+        if self.fts:
+            return self._db.execute(
+                "SELECT d.id, d.tablo, d.kolon, d.deger, d.katlanmis FROM Degerler_fts f "
+                "JOIN Degerler d ON d.id = f.rowid WHERE Degerler_fts MATCH ? LIMIT 500",
+                (f'"{word[:3]}"',)).fetchall()
+        return self._db.execute("SELECT id, tablo, kolon, deger, katlanmis FROM Degerler "
+                                "WHERE katlanmis LIKE ? LIMIT 500", (f"%{word[:3]}%",)).fetchall()
+
+    def _names_schema(self, word: str) -> bool:
+        # Case endings are stripped as in ``_word_score``: "satışı" names Satislar
+        forms = [word] + [word[:-len(s)] for s in SUFFIXES if word.endswith(s) and len(word) - len(s) >= MIN_PREFIX]
+        if any(form in self._reserved for form in forms):
+            return True
+        # Suffixed or shortened forms too, like ``schema_index`` matches them
+        return any(
+            len(form) >= MIN_PREFIX and len(term) >= MIN_PREFIX and (term.startswith(form) or form.startswith(term))
+            for form in forms for term in self._reserved)
+
+    def lookup(self, question: str, limit: int = 10) -> list:
+        """Return the ``ValueMatch`` list of values mentioned in ``question``, best first.
+
+        Words naming a table or column ("adet", "satış") are not taken as
+        values, and matches inside a longer match ("Bilge" in "Çorlu Bilge
+        Tic.") are dropped.
+        """
+        words = tokenize(question)
+        best = {}
+        with self._lock:
+            self.lookups += 1
+            for position, word in enumerate(words):
+                if self._names_schema(word):
+                    continue
+                for _id, table, column, value, folded in self._candidates(word):
+                    value_words = folded.split()
+                    for offset, value_word in enumerate(value_words):
+                        start = position - offset
+                        end = start + len(value_words)
+                        if start < 0 or end > len(words) or not _word_score(value_word, word):
+                            continue
+                        scores = [_word_score(v, w) for v, w in zip(value_words, words[start:end])]
+                        if min(scores) == 0:
+                            continue
+                        score = sum(scores) / len(scores)
+                        key = (table, column, value)
+                        if score >= MIN_SCORE and score > best.get(key, (0,))[0]:
+                            best[key] = (score, start, end)
+        ranked = sorted(best.items(), key=lambda item: (item[1][1] - item[1][2], -item[1][0], item[0]))
+        kept = []
+        for (table, column, value), (score, start, end) in ranked:
+            if any(s <= start and end <= e and (s, e) != (start, end) for _, (_, s, e) in kept):
+                continue
+            kept.append(((table, column, value), (score, start, end)))
+        matches = [ValueMatch(" ".join(words[start:end]), t, c, v, round(score, 3))
+                   for (t, c, v), (score, start, end) in kept]
+        matches.sort(key=lambda m: (-m.score, -len(m.mention), m.table, m.column))
+        return matches[:limit]
+
+    def stats(self) -> dict:
+        with self._lock:
+            columns, values = self._db.execute(
+                "SELECT (SELECT COUNT(*) FROM DegerKolonlari), (SELECT COUNT(*) FROM Degerler)").fetchone()
+            return {"columns": columns, "values": values, "fts": self.fts, "updates": self.updates,
+                    "lookups": self.lookups}
+
+
+def value_index_from_env(path: str):
+    """Create a ``ValueIndex`` for ``path`` or return ``None``.
+
+    ``VALUE_INDEX`` (default ``1``) switches value hints on or off,
+    ``VALUE_INDEX_PATH`` keeps the index in a file and
+    ``VALUE_INDEX_MAX_DISTINCT`` sets the low-cardinality limit.
+    """
+    if os.getenv("VALUE_INDEX", "1").lower() in {"0", "false", "no"}:
+        return None
+    return ValueIndex(path, os.getenv("VALUE_INDEX_PATH") or None,
+                      max_distinct=int(os.getenv("VALUE_INDEX_MAX_DISTINCT", "200")))